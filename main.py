@@ -3,14 +3,20 @@
 @author: Chang Min Park (cpark22@buffalo.edu)
 '''
 
+import os
 import random
 from argparse import ArgumentParser
+from functools import partial
 from threading import Thread
 
 # Local packages
 import src.commons as commons
-import src.adb_utils as adb
+import src.aapt_utils as aapt
 from src.device import DeviceDriver
+from src.budget import RunBudget
+from src.blitz import BlitzFuzzer
+from src.results_db import ResultsDB
+from src.checkpoint import Checkpoint, apk_hash, CHECKPOINT_FILE
 import src.config as conf
 from src.logger import Logger
 
@@ -19,23 +25,37 @@ from src.logger import Logger
 parser = ArgumentParser(description='Run a fuzz tester with given APKs')
 parser.add_argument('APK_PATH', action='store', \
         help='A directory containing APKs')
+parser.add_argument('--resume', metavar='LOG_DIR', \
+        help='Resume the test logged in the directory, skipping finished runs')
 args = parser.parse_args()
 apk_path = args.APK_PATH
+if args.resume and not os.path.isfile(os.path.join(args.resume, 
+        CHECKPOINT_FILE)):
+    parser.error('%s is not a test directory with %s' %(args.resume, 
+            CHECKPOINT_FILE))
 
 class FuzzTester:
 
-    def __init__(self, apk_path: str):
+    def __init__(self, apk_path: str, resume: str = None):
 
         # Create a DeviceDriver
-        self._device_driver = DeviceDriver.get_instance()
+        self._device_driver = DeviceDriver.get_instance(log_dir=resume)
         self._device_driver.print_settings()
         self._logger = Logger.get_instance()
+        self._budget = RunBudget()
+        self._results = ResultsDB()
+        self._checkpoint = Checkpoint(self._device_driver.get_log_dir())
+        if resume:
+            self._logger.info(" - Resuming the test in %s", resume)
 
         # Prepare APKs to test 
         self._apks = commons.prepare_apks(apk_path, exclude_tested = False)
-        self._logger.info(" - Number of APKs to test: %d" %(len(self._apks)))
-        self._logger.info(" - Number of runs per app: %d" \
-                            %(conf.NUM_RUNS_PER_APP))
+        self._logger.info(" - Number of APKs to test: %d", len(self._apks))
+        self._logger.info(" - Number of runs per app: %d", 
+                conf.NUM_RUNS_PER_APP)
+        if conf.ADAPTIVE_RUNS:
+            self._logger.info("   (adaptive: %d to %d runs)", 
+                    conf.MIN_RUNS_PER_APP, conf.MAX_RUNS_PER_APP)
 
     def run(self):
         '''
@@ -43,9 +63,9 @@ class FuzzTester:
         '''
         threads=[]
         for idx, apk in enumerate(self._apks):
-            msg = '================== %s (%d/%d) ==================' \
-                %(apk.split('/')[-1], idx+1, len(self._apks))
-            self._logger.info(msg)
+            self._logger.info('================== %s (%d/%d) ' \
+                    '==================', apk.split('/')[-1], idx+1, 
+                    len(self._apks))
             try:
                 if conf.MODE_FOLLOWER_LEADER:
                     self._run_follower_leader(apk, conf.MODE_RANDOM)
@@ -58,15 +78,34 @@ class FuzzTester:
                     t.start()
 
             except Exception as e:
-                msg = "Skipping %s due to the following exception: %s" %(apk, e)
-                self._logger.warning(msg)
+                self._logger.warning("Skipping %s due to the following " \
+                        "exception: %s", apk, e)
 
         commons.thread_join(threads)
+        self._results.close()
+        self._device_driver.close()
         self._logger.info('\nTesting completed.')
 
     # ----------------- #
     #   Local Methods   #
     # ----------------- #
+    def _record_results(self, d_serials: list, apk: str, sha: str, 
+                        nth_try: int) -> None:
+        '''
+        Add the results of the run on the devices to the results database
+        (again, if the run finished before the test was resumed), and check
+        the run off as finished on each device it finished on once its
+        results are written, so that a crash cannot skip runs never written
+        '''
+        d = DeviceDriver.get_instance()
+        app_version = aapt.get_version_name(apk)
+        for d_serial in d_serials:
+            record = d.get_run_record(d_serial, apk, nth_try)
+            if record is not None:
+                self._results.add_run(record, app_version, 
+                        partial(self._checkpoint.complete, sha, [d_serial], 
+                        nth_try))
+
     def _run_individual(self, d_serial: str, 
                         apk: str, random_mode: bool = False) -> None:
         '''
@@ -76,64 +115,121 @@ class FuzzTester:
             try:
                 d = DeviceDriver.get_instance()
 
+                # Run timer. If ends, it throws a timeout exception.
+                commons.run_signal_timer(conf.TESTING_TIMEOUT)
+
                 # Allow all permision popups and add the first activity to graph
                 d.init_test(d_serial)
 
-                # Root activity to start
-                d.root_activity[d_serial] = d.cur_activity[d_serial]
-                while True: 
-
-                    # If the app is not foreground raise exception
-                    if not d.check_foreground_package(d_serial):
-                        raise Exception(conf.NOT_FOREGROUND_EXCEPTION)
-
-                    # Find all nodes not tested yet.
-                    nodes = d.get_next_nodes(d_serial, d.cur_activity[d_serial])
-
-                    # If random mode, shuffle the found nodes
-                    if random_mode:
-                        random.shuffle(nodes)
+                # Fire random events on cached UI bounds until the time is up
+                if conf.MODE_BLITZ:
+                    BlitzFuzzer(d, d_serial, 
+                            d.get_run_log_path(d_serial, 'blitz_events.log')) \
+                        .run(conf.TESTING_TIMEOUT - conf.WAIT_AFTER_APP_LAUNCH)
+                else:
+                    # Root activity to start
+                    d.root_activity[d_serial] = d.cur_activity[d_serial]
+                    while True: 
+                        try:
+                            # If the app is not foreground raise exception
+                            if not d.check_foreground_package(d_serial):
+                                raise Exception(conf.NOT_FOREGROUND_EXCEPTION)
+
+                            # Find all nodes not tested yet.
+                            nodes = d.get_next_nodes(d_serial, 
+                                    d.cur_activity[d_serial])
+
+                            # If random mode, shuffle the found nodes
+                            if random_mode:
+                                random.shuffle(nodes)
+                            nodes = d.prioritize(d_serial, nodes)
                     
-                    prev_activity = adb.get_foreground_activity_name(d_serial)   
-                    for node in nodes:
-                        d.travel_node(d_serial, node, random_mode)
-
-                        # If an Activity was changed, break.
-                        # (cannot test previously found UIs on the new Activity)
-                        if not prev_activity == \
-                                adb.get_foreground_activity_name(d_serial):
-                            break
-
-                    #  If none, break.
-                    if not nodes:
-                        if not d.root_activity[d_serial] == \
-                            adb.get_foreground_activity_name(d_serial):
-                            d.press_back(d_serial)
-                        else:
-                            break
+                            prev_activity = d.get_current_state(d_serial)   
+                            for node in nodes:
+                                d.travel_node(d_serial, node, random_mode)
+
+                                # If a state was changed, break. (cannot
+                                # test previously found UIs on the new state)
+                                if not prev_activity == \
+                                        d.get_current_state(d_serial):
+                                    break
+
+                            #  If none, go to the nearest untested UIs or
+                            #  break.
+                            if not nodes:
+                                if (not random_mode and 
+                                        conf.NAVIGATION == "shortest_path" or 
+                                        d.is_exhausted(d_serial)) and \
+                                        d.navigate_to_frontier(d_serial):
+                                    continue
+                                if not d.is_root_activity(d_serial, 
+                                        d.root_activity[d_serial]):
+                                    d.press_back(d_serial)
+                                else:
+                                    break
+                        except Exception as e:
+                            # Relaunch the app and keep testing untested UIs
+                            if str(e) != conf.NOT_FOREGROUND_EXCEPTION or \
+                                    not d.recover(d_serial):
+                                raise
 
             except Exception as e:
                 print(e)
+            commons.cancel_signal_timer()
 
             # Save test results and clean device
-            d.clean_device(d_serial, last= nth_try == conf.NUM_RUNS_PER_APP-1)
-
-        for nth_try in range(conf.NUM_RUNS_PER_APP):
-            self._logger.info('[ Run: %d ]' %(nth_try))
+            d.clean_device(d_serial, last=False)
+
+        d = DeviceDriver.get_instance()
+        pkg_name = aapt.get_package_name(apk)
+        sha = apk_hash(apk)
+        nth_try = 0
+        while self._budget.should_continue(pkg_name, nth_try):
+            # The run finished on the device before the test was resumed
+            if self._checkpoint.is_done(sha, [d_serial], nth_try):
+                self._logger.info('[ Run: %d ] finished before', nth_try, 
+                        serial=d_serial)
+                self._budget.record(pkg_name, 
+                        *d.get_run_summary(d_serial, apk, nth_try))
+                self._record_results([d_serial], apk, sha, nth_try)
+                nth_try += 1
+                continue
+            self._logger.info('[ Run: %d ]', nth_try, serial=d_serial)
 
             # Prepare the device before testing
-            d = DeviceDriver.get_instance()
             d.prepare_device(d_serial, apk, nth_try=nth_try)
-            commons.run_thread_timer(conf.TESTING_TIMEOUT, run, args=())
+            commons.run_thread_timer(
+                    conf.TESTING_TIMEOUT + conf.CLEANING_TIMEOUT, run, args=())
+
+            # Count new UIs and SSIs to decide whether to run again
+            self._budget.record(pkg_name, 
+                    *d.get_run_summary(d_serial, apk, nth_try))
+            self._record_results([d_serial], apk, sha, nth_try)
+            nth_try += 1
+
+        self._logger.info('%s: %s', pkg_name, 
+                self._budget.get_summary(pkg_name))
+        d.release_device(d_serial)
   
     def _run_follower_leader(self, apk: str, random_mode: bool = False) -> None:
         '''
         Run the given app in follow-the-leader mode
         '''
         d = self._device_driver
+        pkg_name = aapt.get_package_name(apk)
+        sha = apk_hash(apk)
         
-        for nth_try in range(conf.NUM_RUNS_PER_APP):
-            self._logger.info('[ Run: %d ]' %(nth_try))
+        nth_try = 0
+        while self._budget.should_continue(pkg_name, nth_try):
+            # The run finished on all devices before the test was resumed
+            if self._checkpoint.is_done(sha, d.devices.keys(), nth_try):
+                self._logger.info('[ Run: %d ] finished before', nth_try)
+                self._budget.record(pkg_name, 
+                        *d.get_run_summary(d.leader_device, apk, nth_try))
+                self._record_results(d.devices.keys(), apk, sha, nth_try)
+                nth_try += 1
+                continue
+            self._logger.info('[ Run: %d ]', nth_try)
 
             # Prepare devices before testing
             d.prepare_device_all(apk, nth_try=nth_try)
@@ -147,50 +243,65 @@ class FuzzTester:
                 # Root activity to start
                 d.root_activity[d.leader_device] = d.cur_activity[d.leader_device]
                 while True: 
-
-                    # If the app is not foreground raise exception
-                    if not d.check_foreground_package(d.leader_device):
-                        raise Exception(conf.NOT_FOREGROUND_EXCEPTION)
-
-                    # Find all nodes not tested yet
-                    nodes = d.get_next_nodes(
-                            d.leader_device, d.cur_activity[d.leader_device])
-
-                    # If random mode, shuffle the found nodes
-                    if random_mode:
-                        random.shuffle(nodes)
-                    prev_activity = \
-                        adb.get_foreground_activity_name(d.leader_device)   
-
-                    for node in nodes:
-                        d.travel_node_all(node, random_mode)
+                    try:
+                        # If the app is not foreground raise exception
+                        if not d.check_foreground_package(d.leader_device):
+                            raise Exception(conf.NOT_FOREGROUND_EXCEPTION)
+
+                        # Find all nodes not tested yet
+                        nodes = d.get_next_nodes(d.leader_device, 
+                                d.cur_activity[d.leader_device])
+
+                        # If random mode, shuffle the found nodes
+                        if random_mode:
+                            random.shuffle(nodes)
+                        nodes = d.prioritize(d.leader_device, nodes)
+                        prev_activity = d.get_current_state(d.leader_device)   
+
+                        for node in nodes:
+                            d.travel_node_all(node, random_mode)
                         
-                        # If an Activity was changed, break.
-                        # (cannot test previously found UIs on the new Activity)
-                        if not prev_activity == \
-                                adb.get_foreground_activity_name(d.leader_device):
-                            break
-
-                    # If none, break.
-                    if not nodes:
-                        if not d.root_activity[d.leader_device] == \
-                            adb.get_foreground_activity_name(d.leader_device):   
-                            d.press_back_all()
-                        else:
-                            break
+                            # If a state was changed, break.
+                            # (cannot test previously found UIs on the new state)
+                            if not prev_activity == \
+                                    d.get_current_state(d.leader_device):
+                                break
+
+                        # If none, break.
+                        if not nodes:
+                            if not d.is_root_activity(d.leader_device, 
+                                    d.root_activity[d.leader_device]):   
+                                d.press_back_all()
+                            else:
+                                break
+                    except Exception as e:
+                        # Relaunch the app and keep testing untested UIs
+                        if str(e) != conf.NOT_FOREGROUND_EXCEPTION or \
+                                not d.recover_all():
+                            raise
                         
                 
             except Exception as e:
                 print(e)
+            commons.cancel_signal_timer()
         
             # Save test results and clean devices
             d.clean_device_all()
+
+            # Count new UIs and SSIs to decide whether to run again
+            self._budget.record(pkg_name, 
+                    *d.get_run_summary(d.leader_device, apk, nth_try))
+            self._record_results(d.devices.keys(), apk, sha, nth_try)
+            nth_try += 1
+
+        self._logger.info('%s: %s', pkg_name, 
+                self._budget.get_summary(pkg_name))
    
 
 
 def main():
 
-    fz = FuzzTester(apk_path=apk_path)
+    fz = FuzzTester(apk_path=apk_path, resume=args.resume)
     fz.run()
 
 
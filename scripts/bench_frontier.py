@@ -0,0 +1,99 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+
+Scaling benchmark of the exploration frontier against full graph scans
+'''
+
+import os
+import sys
+import random
+import timeit
+from argparse import ArgumentParser
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.config as conf
+from src.frontier import Frontier
+
+
+parser = ArgumentParser(description='Benchmark next-node lookups on ' \
+        'synthetic exploration graphs')
+parser.add_argument('--sizes', nargs='+', type=int,
+        default=[1000, 10000, 100000], help='Numbers of nodes per graph')
+parser.add_argument('--elements', type=int, default=20,
+        help='Elements per activity')
+parser.add_argument('--repeat', type=int, default=5,
+        help='Lookups measured per method')
+
+
+def build_graph(n_nodes: int, n_elements: int) -> tuple:
+    '''
+    Build a synthetic graph and its frontier with about n_nodes nodes
+    '''
+    graph = nx.DiGraph()
+    frontier = Frontier()
+    activities = []
+    graph.add_node('pkg', type="package", visited=True)
+    frontier.add('pkg', "package", True)
+    for a_idx in range(max(1, n_nodes // (n_elements + 1))):
+        activity = 'pkg.Activity%d' %(a_idx)
+        activities.append(activity)
+        visited = random.random() < 0.5
+        graph.add_node(activity, type="activity", visited=visited)
+        frontier.add(activity, "activity", visited)
+        for e_idx in range(n_elements):
+            node = activity + conf.DELIMITER + 'button%d' %(e_idx)
+            visited = random.random() < 0.5
+            graph.add_node(node, type="element", visited=visited)
+            frontier.add(node, "element", visited, activity=activity)
+    return graph, frontier, activities
+
+
+def scan_next_nodes(graph: nx.DiGraph, activity: str) -> list:
+    '''
+    Previous implementation of DeviceDriver.get_next_nodes
+    '''
+    nodes = []
+    for node, attr in sorted(graph.nodes(data=True)):
+        if not node.startswith(activity):
+            continue
+        if attr['visited']:
+            continue
+        nodes.append(node)
+    return nodes
+
+
+def scan_next_activity(graph: nx.DiGraph) -> str:
+    '''
+    Previous implementation of DeviceDriver._next_activity
+    '''
+    for node, attr in sorted(graph.nodes(data=True)):
+        if attr['type'] == "activity" and attr['visited'] == False:
+            return node
+    return None
+
+
+def main():
+    args = parser.parse_args()
+    random.seed(0)
+    print('%10s %14s %14s %14s %14s' %('nodes', 'scan next',
+            'index next', 'scan activity', 'index activity'))
+    for size in args.sizes:
+        graph, frontier, activities = build_graph(size, args.elements)
+        activity = random.choice(activities)
+        times = [
+            timeit.timeit(lambda: scan_next_nodes(graph, activity),
+                    number=args.repeat),
+            timeit.timeit(lambda: frontier.next_nodes(activity),
+                    number=args.repeat),
+            timeit.timeit(lambda: scan_next_activity(graph),
+                    number=args.repeat),
+            timeit.timeit(lambda: frontier.next_activity(),
+                    number=args.repeat)]
+        print('%10d %12.3fms %12.3fms %12.3fms %12.3fms' %(len(graph),
+                *[t * 1000 / args.repeat for t in times]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+
+Benchmark of parsing logcat files in scripts/log_parser.py
+
+The baseline logcat (logcat_base_8.1.0_r1) is copied into a fake log
+directory of packages and tries, each file scaled up the given times, and
+parsed by reading whole files with the regex on every line (as before),
+by streaming with the prefilter, and by the process pool. The pool is
+run again with an index of files parsed, empty and then filled, and once
+more after a try of a package was added.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+from time import perf_counter
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scripts.log_parser as log_parser
+from src.log_index import LogIndex
+from src.ssi import PATTERN
+
+
+BASE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        'logcat_base_8.1.0_r1')
+
+parser = ArgumentParser(description='Benchmark parsing of logcat files')
+parser.add_argument('--scale', type=int, default=20,
+        help='Times the baseline logcat is repeated in each file')
+parser.add_argument('--packages', type=int, default=4)
+parser.add_argument('--tries', type=int, default=4)
+parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+
+
+def find_ssi_readlines(log_file: str) -> set:
+    '''
+    Parsing before the prefilter
+    '''
+    found = set()
+    with open(log_file, 'r', errors='ignore') as f:
+        for line in f.readlines():
+            match = PATTERN.match(line.strip())
+            if match == None:
+                continue
+            found.add((match.group('transaction'), match.group('class'),
+                    match.group('code')))
+    return found
+
+
+def make_logs(log_path: str, args) -> None:
+    for n_pkg in range(args.packages):
+        for n_try in range(args.tries):
+            make_log(log_path, args, n_pkg, n_try)
+
+
+def make_log(log_path: str, args, n_pkg: int, n_try: int) -> None:
+    with open(BASE_LOG, 'r', errors='ignore') as f:
+        data = f.read() * args.scale
+    path_n_try = os.path.join(log_path, 'pkg%d' %(n_pkg), str(n_try))
+    os.makedirs(path_n_try)
+    with open(os.path.join(path_n_try, log_parser.ADB_LOG + '5554.log'),
+            'w') as f:
+        f.write(data)
+
+
+def parse_indexed(log_path: str, args, index_path: str) -> tuple:
+    '''
+    Parse with the index saved at the path, and the time it took
+    '''
+    start = perf_counter()
+    index = LogIndex(index_path)
+    _, all_ssi = log_parser.parse_logs(log_path, args.jobs, index)
+    index.save()
+    return all_ssi, perf_counter() - start
+
+
+def main():
+    args = parser.parse_args()
+    log_path = tempfile.mkdtemp()
+    try:
+        make_logs(log_path, args)
+        files = [job[3] for job in log_parser.find_jobs(log_path)]
+        size = sum(os.path.getsize(path) for path in files)
+        print('%d files, %.1f MB' %(len(files), size / 2**20))
+
+        start = perf_counter()
+        before = set()
+        for path in files:
+            before.update(find_ssi_readlines(path))
+        t_before = perf_counter() - start
+
+        start = perf_counter()
+        streamed = set()
+        for path in files:
+            streamed.update(log_parser.find_ssi(path))
+        t_streamed = perf_counter() - start
+
+        start = perf_counter()
+        _, all_ssi = log_parser.parse_logs(log_path, args.jobs)
+        pooled = set().union(*(ssi for tries in all_ssi.values()
+                for ssi in tries.values()))
+        t_pooled = perf_counter() - start
+
+        index_path = os.path.join(log_path, 'index.json.gz')
+        _, t_cold = parse_indexed(log_path, args, index_path)
+        all_ssi, t_warm = parse_indexed(log_path, args, index_path)
+        assert all_ssi == log_parser.parse_logs(log_path, args.jobs)[1], \
+                'Indexed SSIs differ'
+        make_log(log_path, args, 0, args.tries)
+        _, t_added = parse_indexed(log_path, args, index_path)
+
+        assert before == streamed == pooled, 'Parsed SSIs differ'
+        print('%d SSIs' %(len(before)))
+        for name, took in [('readlines + regex', t_before),
+                ('stream + prefilter', t_streamed),
+                ('pool of %d' %(args.jobs), t_pooled),
+                ('index, empty', t_cold), ('index, filled', t_warm),
+                ('index, 1 try added', t_added)]:
+            print('%-20s %7.3fs  %6.1f MB/s  x%.1f' %(name, took,
+                    size / 2**20 / took, t_before / took))
+    finally:
+        shutil.rmtree(log_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+
+Benchmark of logcat archives (src/logcat_archive.py) against plain dumps
+
+The baseline logcat (logcat_base_8.1.0_r1) is repeated the given times,
+each copy later than the one before, and written as a plain file and as an
+archive. Then the lines of a window of seconds in the middle are read,
+and SSIs of the whole dump are parsed as scripts/log_parser.py does.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+from time import perf_counter
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scripts.log_parser as log_parser
+from src.logcat_archive import ArchiveWriter, LogcatArchive, parse_head, \
+        ARCHIVE_SUFFIX, MONTH_DAYS
+
+
+BASE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        'logcat_base_8.1.0_r1')
+
+parser = ArgumentParser(description='Benchmark logcat archives')
+parser.add_argument('--scale', type=int, default=100,
+        help='Times the baseline logcat is repeated')
+parser.add_argument('--window', type=float, default=5,
+        help='Seconds of lines to read in the middle')
+
+
+def timestamp(time: int) -> str:
+    '''
+    Format a time of parse_head() as a logcat timestamp
+    '''
+    ms, time = time % 1000, time // 1000
+    seconds, time = time % 60, time // 60
+    minutes, time = time % 60, time // 60
+    hours, days = time % 24, time // 24
+    month = max(i for i, first in enumerate(MONTH_DAYS) if first <= days)
+    return '%02d-%02d %02d:%02d:%02d.%03d' %(month + 1,
+            days - MONTH_DAYS[month] + 1, hours, minutes, seconds, ms)
+
+
+def make_lines(scale: int) -> iter:
+    with open(BASE_LOG, 'r', errors='ignore') as f:
+        lines = f.readlines()
+    heads = [parse_head(line) for line in lines]
+    span = max(head[0] for head in heads if head) - \
+            min(head[0] for head in heads if head) + 1000
+    for n in range(scale):
+        for line, head in zip(lines, heads):
+            yield line if head is None else \
+                    timestamp(head[0] + n * span) + line[18:]
+
+
+def timed(function, *args) -> tuple:
+    start = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - start
+
+
+def write_plain(path: str, scale: int) -> None:
+    with open(path, 'w') as f:
+        f.writelines(make_lines(scale))
+
+
+def write_archive(path: str, scale: int) -> None:
+    with ArchiveWriter(path) as archive:
+        for line in make_lines(scale):
+            archive.write(line)
+
+
+def read_plain(path: str, start: int, end: int) -> list:
+    found = []
+    with open(path, 'r', errors='ignore') as f:
+        for line in f:
+            head = parse_head(line)
+            if head is not None and start <= head[0] < end:
+                found.append(line.rstrip('\n'))
+    return found
+
+
+def main():
+    args = parser.parse_args()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        plain = os.path.join(tmp_dir, 'adb_logcat.log')
+        archived = os.path.join(tmp_dir, 'adb_logcat' + ARCHIVE_SUFFIX)
+        _, t_plain = timed(write_plain, plain, args.scale)
+        _, t_archive = timed(write_archive, archived, args.scale)
+        size_plain = os.path.getsize(plain)
+        size_archive = os.path.getsize(archived) + \
+                os.path.getsize(archived + '.idx')
+        print('plain   %7.1f MB, written in %.2fs' %(size_plain / 2**20,
+                t_plain))
+        print('archive %7.1f MB, written in %.2fs (x%.1f smaller)'
+                %(size_archive / 2**20, t_archive, size_plain / size_archive))
+
+        times = [head[0] for head in map(parse_head, make_lines(1)) if head]
+        middle = (min(times) + max(times) * (2 * args.scale - 1)) // \
+                (2 * args.scale)
+        start, end = middle, middle + int(args.window * 1000)
+        window_plain, t_window_plain = timed(read_plain, plain, start, end)
+        window_archive, t_window_archive = timed(lambda: list(
+                LogcatArchive(archived).lines(start, end)))
+        assert window_plain == window_archive, 'Lines of the window differ'
+        print('%d lines in %.0fs: plain %.3fs, archive %.3fs' %(
+                len(window_plain), args.window, t_window_plain,
+                t_window_archive))
+
+        ssi_plain, t_ssi_plain = timed(log_parser.find_ssi, plain)
+        ssi_archive, t_ssi_archive = timed(log_parser.find_ssi, archived)
+        assert ssi_plain == ssi_archive, 'SSIs differ'
+        print('%d SSIs: plain %.3fs, archive %.3fs' %(len(ssi_plain),
+                t_ssi_plain, t_ssi_archive))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
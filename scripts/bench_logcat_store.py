@@ -0,0 +1,91 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+
+Benchmark of SSI queries on a columnar logcat store against parsing lines
+
+The baseline logcat (logcat_base_8.1.0_r1) is scaled up the given times
+and converted once; then SSIs of each process and SSIs not in the
+baseline are found by parsing the lines and by querying the store.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+from time import perf_counter
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.ssi import parse_ssi
+from src.logcat_store import LogcatStore, convert
+
+
+BASE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        'logcat_base_8.1.0_r1')
+
+parser = ArgumentParser(description='Benchmark queries of logcat stores')
+parser.add_argument('--scale', type=int, default=100,
+        help='Times the baseline logcat is repeated')
+
+
+def ssis_by_pid(log_path: str) -> dict:
+    '''
+    SSIs of each process, parsing lines
+    '''
+    found = {}
+    with open(log_path, 'r', errors='ignore') as f:
+        for line in f:
+            ssi = parse_ssi(line)
+            if ssi is not None:
+                found.setdefault(int(line.split(None, 3)[2]), set()).add(ssi)
+    return found
+
+
+def timed(function, *args) -> tuple:
+    start = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - start
+
+
+def main():
+    args = parser.parse_args()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        log_path = os.path.join(tmp_dir, 'adb_logcat.log')
+        with open(BASE_LOG, 'r', errors='ignore') as f:
+            data = f.read()
+        with open(log_path, 'w') as f:
+            for _ in range(args.scale):
+                f.write(data)
+        base_store = os.path.join(tmp_dir, 'base.cols')
+        convert(BASE_LOG, base_store)
+
+        n_lines, t_convert = timed(convert, log_path, log_path + '.cols')
+        print('%d lines, %.1f MB, converted in %.2fs' %(n_lines,
+                os.path.getsize(log_path) / 2**20, t_convert))
+
+        by_pid, t_lines = timed(ssis_by_pid, log_path)
+        before = set().union(*by_pid.values()) - \
+                set().union(*ssis_by_pid(BASE_LOG).values())
+
+        store, t_open = timed(LogcatStore, log_path + '.cols')
+        keys_by_pid, t_store = timed(store.ssis_by_pid)
+        baseline = LogcatStore(base_store)
+        keys, t_new = timed(store.new_keys, store.ssi_keys(), baseline)
+
+        assert by_pid == {pid: store.decode(keys) for pid, keys in
+                keys_by_pid.items()}, 'SSIs of processes differ'
+        assert before == store.decode(keys), 'New SSIs differ'
+        print('%d processes, %d new SSIs' %(len(by_pid), len(keys)))
+        print('%-22s %8.3fs' %('lines, per process', t_lines))
+        print('%-22s %8.3fs' %('store, open', t_open))
+        print('%-22s %8.3fs  x%.0f' %('store, per process', t_store,
+                t_lines / t_store))
+        print('%-22s %8.3fs' %('store, new SSIs', t_new))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
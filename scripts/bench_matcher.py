@@ -0,0 +1,171 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+
+Benchmark of matching the leader's UIs on followers against selectors
+
+Pairs are synthetic (a dump and its copy on another screen size, with some
+texts translated and classes renamed) or recorded by followers with
+conf.RECORD_MATCHES (matches_<serial>.jsonl in the run directories).
+'''
+
+import os
+import sys
+import json
+import glob
+import random
+import string
+from time import perf_counter
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.uiautomator_utils as ua_utils
+from src.matcher import ElementIndex
+
+
+parser = ArgumentParser(description='Benchmark matching of leader UIs on ' \
+        'follower dumps')
+parser.add_argument('--records', nargs='*', default=[],
+        help='matches_<serial>.jsonl files or log directories to search')
+parser.add_argument('--pairs', type=int, default=200,
+        help='Synthetic dump pairs')
+parser.add_argument('--uis', type=int, default=40, help='UIs per dump')
+parser.add_argument('--translated', type=float, default=0.3,
+        help='Ratio of texts changed on the follower')
+parser.add_argument('--renamed', type=float, default=0.1,
+        help='Ratio of classes changed on the follower')
+
+CLASSES = ['android.widget.Button', 'android.widget.TextView',
+        'android.widget.ImageButton', 'android.widget.EditText',
+        'android.widget.CheckBox']
+
+
+def random_word(length: int = 8) -> str:
+    return ''.join(random.choice(string.ascii_lowercase)
+            for _ in range(length))
+
+
+def build_pair(args) -> tuple:
+    '''
+    Build a leader dump on 1080x1920 and the same screen on a follower of
+    another size, where each UI keeps its index as 'uid'
+    '''
+    leader = []
+    for uid in range(args.uis):
+        left, top = random.randrange(0, 900), random.randrange(0, 1800)
+        rid = random.choice(['', 'pkg:id/item', 'pkg:id/' + random_word()])
+        leader.append({'uid': uid, 'resourceId': rid,
+                'className': random.choice(CLASSES),
+                'text': random.choice(['', random_word(), random_word(12)]),
+                'contentDescription': '',
+                'bounds': '[%d,%d][%d,%d]' %(left, top, left + 180, top + 120),
+                'checkable': False, 'longClickable': False,
+                'scrollable': False, 'ancestorPath': random_word(4)})
+
+    scale = random.choice([0.5, 0.75, 1.333])
+    follower = []
+    for ui in leader:
+        ui = dict(ui)
+        l, t, r, b = ua_utils.parse_bounds(ui['bounds'])
+        ui['bounds'] = '[%d,%d][%d,%d]' %(l * scale, t * scale,
+                r * scale, b * scale)
+        if ui['text'] and random.random() < args.translated:
+            ui['text'] = ui['text'][:3] + random_word(4)
+        if random.random() < args.renamed:
+            ui['className'] = ui['className'].replace('widget',
+                    'material')
+        follower.append(ui)
+    random.shuffle(follower)
+    return leader, (1080, 1920), follower
+
+
+def select(ui: dict, ui_dics: list) -> dict:
+    '''
+    Previous lookup: the first UI with the same text, class and resource ID
+    '''
+    for candidate in ui_dics:
+        if candidate['text'] == ui['text'] and \
+                candidate['className'] == ui['className'] and \
+                candidate['resourceId'] == ui['resourceId']:
+            return candidate
+    return None
+
+
+def bench_synthetic(args) -> None:
+    stats = {'selector': [0, 0, 0.0], 'index': [0, 0, 0.0]}  # hit, right, s
+    confidences = []
+    for _ in range(args.pairs):
+        leader, screen_size, follower = build_pair(args)
+        started = perf_counter()
+        index = ElementIndex(follower)
+        results = [index.resolve(ui, screen_size) for ui in leader]
+        stats['index'][2] += perf_counter() - started
+        started = perf_counter()
+        selected = [select(ui, follower) for ui in leader]
+        stats['selector'][2] += perf_counter() - started
+
+        for ui, (match, confidence), other in zip(leader, results, selected):
+            for name, found in [('index', match), ('selector', other)]:
+                if found is not None:
+                    stats[name][0] += 1
+                    stats[name][1] += found['uid'] == ui['uid']
+            if match is not None:
+                confidences.append((confidence, match['uid'] == ui['uid']))
+
+    total = args.pairs * args.uis
+    print('%d synthetic pairs, %d UIs' %(args.pairs, total))
+    print('%10s %10s %10s %12s' %('method', 'matched', 'correct', 'per UI'))
+    for name, (hit, right, seconds) in stats.items():
+        print('%10s %9.1f%% %9.1f%% %10.3fms' %(name, hit * 100 / total,
+                right * 100 / total, seconds * 1000 / total))
+    for low, high in [(0.9, 1.01), (0.7, 0.9), (0.0, 0.7)]:
+        bucket = [right for c, right in confidences if low <= c < high]
+        if bucket:
+            print('confidence [%.1f, %.1f): %5d matches, %5.1f%% correct'
+                    %(low, min(high, 1.0), len(bucket),
+                    sum(bucket) * 100 / len(bucket)))
+
+
+def bench_records(paths: list) -> None:
+    files = []
+    for path in paths:
+        files += glob.glob(os.path.join(path, '**', 'matches_*.jsonl'),
+                recursive=True) if os.path.isdir(path) else [path]
+
+    n_records, n_matched, n_same, n_selected, seconds = 0, 0, 0, 0, 0.0
+    for path in files:
+        with open(path, 'r') as f:
+            for line in f:
+                record = json.loads(line)
+                n_records += 1
+                started = perf_counter()
+                match, confidence = ElementIndex(record['follower']).resolve(
+                        record['leader'], record['screenSize'])
+                seconds += perf_counter() - started
+                if match is not None:
+                    n_matched += 1
+                    n_same += record['follower'].index(match) \
+                            == record['match']
+                n_selected += select(record['leader'],
+                        record['follower']) is not None
+    if n_records == 0:
+        print('No recorded matches found')
+        return
+    print('%d recorded pairs in %d files' %(n_records, len(files)))
+    print('index matched: %.1f%% (%.1f%% as recorded), %.3fms per UI'
+            %(n_matched * 100 / n_records, n_same * 100 / n_records,
+            seconds * 1000 / n_records))
+    print('selector matched: %.1f%%' %(n_selected * 100 / n_records))
+
+
+def main():
+    args = parser.parse_args()
+    random.seed(0)
+    if args.records:
+        bench_records(args.records)
+    else:
+        bench_synthetic(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+
+Compare UI graphs saved by runs (ui_graph_<serial>.json.gz) across devices,
+Android versions and app versions
+
+ - diff:  report screens lacking on some of the given graphs, and how
+          screens of the same Activity differ
+ - index: add graphs found under log directories to an index of screens
+ - lacks: list devices and versions whose runs lack a screen (a screen
+          hash or an Activity), using the index
+'''
+
+import os
+import sys
+import glob
+import gzip
+import json
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.config as conf
+import src.graph_store as graph_store
+import src.graph_hash as graph_hash
+
+
+parser = ArgumentParser(description='Compare UI graphs of runs')
+subparsers = parser.add_subparsers(dest='command')
+diff_parser = subparsers.add_parser('diff', help='Diff two or more graphs')
+diff_parser.add_argument('GRAPHS', nargs='+',
+        help='ui_graph_<serial>.json.gz files')
+diff_parser.add_argument('-o', '--output', help='Write the report as JSON')
+index_parser = subparsers.add_parser('index',
+        help='Index the graphs found under log directories')
+index_parser.add_argument('LOG_PATHS', nargs='+')
+lacks_parser = subparsers.add_parser('lacks',
+        help='Find devices and versions lacking a screen')
+lacks_parser.add_argument('SCREEN', help='Screen hash or Activity name')
+lacks_parser.add_argument('--package', help='Only runs of the package')
+for sub in [index_parser, lacks_parser]:
+    sub.add_argument('--index', default=conf.GRAPH_INDEX_PATH,
+            help='Path of the index')
+
+
+def describe(meta: dict, path: str) -> str:
+    if 'serial' not in meta:
+        return path
+    return '%s (android %s, app %s, run %s)' %(meta['serial'],
+            meta.get('android_version'), meta.get('app_version', '?'),
+            meta.get('run'))
+
+
+def diff(args) -> None:
+    named_hashes = []
+    for path in args.GRAPHS:
+        graph = graph_store.load_graph(path)
+        named_hashes.append((describe(graph.graph.get('meta', {}), path),
+                graph_hash.hash_states(graph)))
+    report = graph_hash.diff_graphs(named_hashes)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    print('%d graphs, %d common screens%s' %(len(report['graphs']),
+            report['common'], ', equal' if report['equal'] else ''))
+    for screen in report['screens']:
+        print('[%s] %s lacking on: %s' %(screen['hash'], screen['activity'],
+                ', '.join(screen['absent'])))
+    for change in report['changed']:
+        print('[%s -> %s] %s: %d missing, %d extra UIs' %(*change['hashes'],
+                change['activity'], len(change['missing']),
+                len(change['extra'])))
+
+
+def load_index(path: str) -> dict:
+    if not os.path.exists(path):
+        return {'graphs': {}}
+    with gzip.open(path, 'rt', encoding='utf8') as f:
+        return json.load(f)
+
+
+def index(args) -> None:
+    '''
+    Add new or changed graphs to the index, keeping the screens of each
+    '''
+    idx = load_index(args.index)
+    n_added = 0
+    for log_path in args.LOG_PATHS:
+        for path in glob.glob(os.path.join(log_path, '**',
+                'ui_graph_*.json.gz'), recursive=True):
+            path = os.path.abspath(path)
+            mtime = os.path.getmtime(path)
+            if idx['graphs'].get(path, {}).get('mtime') == mtime:
+                continue
+            graph = graph_store.load_graph(path)
+            hashes = graph_hash.hash_states(graph)
+            idx['graphs'][path] = {'mtime': mtime,
+                    'meta': graph.graph.get('meta', {}),
+                    'hash': graph_hash.hash_graph(hashes),
+                    'screens': {h['local']: h['activity']
+                        for h in hashes.values()}}
+            n_added += 1
+
+    os.makedirs(os.path.dirname(args.index) or '.', exist_ok=True)
+    tmp_path = args.index + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf8') as f:
+        json.dump(idx, f, separators=(',', ':'))
+    os.replace(tmp_path, args.index)
+    print('%d graphs indexed (%d new or changed)' %(len(idx['graphs']),
+            n_added))
+
+
+def lacks(args) -> None:
+    '''
+    Group runs of the packages having the screen somewhere by device and
+    versions, and list the groups where no run found it
+    '''
+    idx = load_index(args.index)
+    groups = {}     # {(package, serial, android, app): [found in any run]}
+    packages = set()
+    for entry in idx['graphs'].values():
+        screens = entry['screens']
+        if args.SCREEN in screens or args.SCREEN in screens.values():
+            packages.add(entry['meta'].get('package'))
+    for entry in idx['graphs'].values():
+        meta, screens = entry['meta'], entry['screens']
+        if meta.get('package') not in packages or (args.package and
+                meta.get('package') != args.package):
+            continue
+        key = (meta.get('package'), meta.get('serial'),
+                meta.get('android_version'), meta.get('app_version', '?'))
+        groups.setdefault(key, []).append(args.SCREEN in screens
+                or args.SCREEN in screens.values())
+
+    if not groups:
+        print('No indexed run found %s' %(args.SCREEN))
+        return
+    print('%-40s %-20s %8s %8s %s' %('package', 'device', 'android', 'app',
+            'runs'))
+    for (package, serial, android, app), found in sorted(groups.items(),
+            key=lambda item: tuple(str(k) for k in item[0])):
+        if not any(found):
+            print('%-40s %-20s %8s %8s %d' %(package, serial, android, app,
+                    len(found)))
+
+
+def main():
+    args = parser.parse_args()
+    if args.command == 'diff':
+        diff(args)
+    elif args.command == 'index':
+        index(args)
+    elif args.command == 'lacks':
+        lacks(args)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,169 +1,254 @@
-import re
 import os
+import sys
+import json
 from argparse import ArgumentParser
-import numpy as np
+from functools import partial
+from multiprocessing import Pool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.config as conf
+from src.ssi import PREFILTER, parse_ssi
+from src.log_index import LogIndex
+from src.logcat_archive import ARCHIVE_SUFFIX, LogcatArchive
+import src.analytics as analytics
 
 # Takes a path containing APKs to test
 parser = ArgumentParser(description='Parse logs and results after the fuzz testing')
 parser.add_argument('LOG_PATH', action='store', \
         help='A directory containing logss (e.g., 2021-11-28 00:53:04.895557)')
-args = parser.parse_args()
-log_path = args.LOG_PATH
-
-
-# Log patterns (API 27)
-PATTERN = re.compile(r"""^.*(?P<transaction>B[A-Z]_TRANSACTION):\s+\[Interface\stoken\]\s+(?P<class>.+)\s+\[code\]\s+(?P<code>[a-zz\d]+)\s*$""",re.VERBOSE)
-
-
-
-
-def find_ssi(log_file: str, pid: str=None) -> set:
+parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), \
+        help='Number of processes parsing files')
+parser.add_argument('--index', default=conf.LOG_INDEX_PATH, \
+        help='Index of files parsed before, to parse only new or grown files')
+parser.add_argument('--rebuild', action='store_true', \
+        help='Parse all files again')
+parser.add_argument('--android', default='8.1.0', \
+        help='Android version of the devices tested')
+parser.add_argument('--baseline', \
+        help='Logcat before testing (default: logcat_base_<android>_r1 here)')
+parser.add_argument('-o', '--output', \
+        help='JSON file to write summaries of packages to (default: stdout)')
+
+# Log file nmaes
+ADB_LOG = 'adb_logcat_emulator-'
+UIS_LOG = 'uis_traversed_emulator-'
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BLOCK_SIZE = 1 << 20
+
+
+def scan(log_file: str, parse_line, offset: int=0, prefilter: str=None) \
+        -> tuple:
+    '''
+    Parse complete lines of the file from the byte offset, reading blocks;
+    a last line not ended yet is left for the next time
+
+    :return: (items found, offset after the last complete line)
+    '''
     found = set()
-    with open(log_file, 'r', errors='ignore') as f:
-        for line in f.readlines():
-            line = line.strip()
-
-            # Parse only for the given PID
-            if pid and not pid in line:
-                continue
-
-            match = PATTERN.match(line)
-            if match == None:
-                continue
+    rest = b''
+    with open(log_file, 'rb') as f:
+        f.seek(offset)
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            block = rest + block
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            offset += end
+            for line in block[:end].decode('utf8', errors='ignore') \
+                    .split('\n'):
+                # Most lines are not SSIs, skip them before the regex
+                if prefilter and prefilter not in line:
+                    continue
 
-            transaction = match.group('transaction')
-            class_name = match.group('class')
-            code = match.group('code')
-        
-            found.add((transaction, class_name, code))
+                item = parse_line(line)
+                if item is not None:
+                    found.add(item)
 
-    return found
+    return found, offset
 
 
+def scan_archive(log_file: str, parse_line, prefilter: str=None) -> tuple:
+    '''
+    Parse lines of a logcat archive (see src/logcat_archive.py), a block at
+    a time
 
-def find_ui(log_file: str) -> set:
+    :return: (items found, size of the archive)
+    '''
     found = set()
-    with open(log_file, 'r', errors='ignore') as f:
-        for line in f.readlines():
-            split_line = line.strip().split('___')
-            if len(split_line) != 2:
+    size = os.path.getsize(log_file)
+    for block in LogcatArchive(log_file).blocks():
+        for line in block.split('\n'):
+            if prefilter and prefilter not in line:
                 continue
 
-            found.add((split_line[0], split_line[1]))
+            item = parse_line(line)
+            if item is not None:
+                found.add(item)
 
-    return found
+    return found, size
 
 
+def ssi_of(line: str, pid: str=None) -> tuple:
+    # Parse only for the given PID (the third field of threadtime)
+    if pid:
+        fields = line.split(None, 3)
+        if len(fields) < 3 or fields[2] != pid:
+            return None
+    return parse_ssi(line)
 
 
+def ui_of(line: str) -> tuple:
+    split_line = line.strip().split('___')
+    if len(split_line) != 2:
+        return None
+    return (split_line[0], split_line[1])
 
-def main():
-    
-    # SSIs before testing
-    ssi_log = 'logcat_base_8.1.0_r1'
-    ssi_before = find_ssi(ssi_log, pid=None)
 
-    # Log file nmaes
-    adb_log = 'adb_logcat_emulator-'
-    uis_log = 'uis_traversed_emulator-'
+def find_ssi(log_file: str, pid: str=None) -> set:
+    if log_file.endswith(ARCHIVE_SUFFIX):
+        return scan_archive(log_file, partial(ssi_of, pid=pid),
+                PREFILTER)[0]
+    return scan(log_file, partial(ssi_of, pid=pid),
+            prefilter=PREFILTER)[0]
 
 
-    pkg_dirs = os.listdir(log_path)
-    all_ui = {}
-    all_ssi = {}
-    for pkg_dir in pkg_dirs:
+def find_ui(log_file: str) -> set:
+    return scan(log_file, ui_of)[0]
+
+
+def parse_file(job: tuple) -> tuple:
+    '''
+    Parse a file of a job (package, try, kind, path, offset) from the
+    offset in a worker process
+
+    :return: (job, stat before parsing, items found, offset parsed up to)
+    '''
+    pkg_dir, n_try, kind, path, offset = job
+    stat = os.stat(path)
+    if kind == 'archive':
+        found, end = scan_archive(path, ssi_of, PREFILTER)
+    elif kind == 'ssi':
+        found, end = scan(path, ssi_of, offset, PREFILTER)
+    else:
+        found, end = scan(path, ui_of, offset)
+    return job, stat, found, end
+
+
+def find_jobs(log_path: str) -> list:
+    '''
+    Find logcat and traversed UI files of every try of every package
+    '''
+    jobs = []
+    for pkg_dir in os.listdir(log_path):
         path_pkg = os.path.join(log_path, pkg_dir)
         if not os.path.isdir(path_pkg):
             continue
-
-        all_ui[pkg_dir] = {}
-        all_ssi[pkg_dir] = {}
-
         for n_try in os.listdir(path_pkg):
             path_n_try = os.path.join(path_pkg, n_try)
-            all_ui[pkg_dir][int(n_try)] = set()
-            all_ssi[pkg_dir][int(n_try)] = set()
-
             for f in os.listdir(path_n_try):
-                if f.startswith(adb_log):
-                    ssi = find_ssi(os.path.join(path_n_try, f), pid=None)
-                    all_ssi[pkg_dir][int(n_try)].update(ssi)
-
-                elif f.startswith(uis_log):
-                    ui = find_ui(os.path.join(path_n_try, f))
-                    all_ui[pkg_dir][int(n_try)].update(ui)
-
+                if f.startswith(ADB_LOG) and f.endswith(ARCHIVE_SUFFIX):
+                    jobs.append((pkg_dir, int(n_try), 'archive', 
+                            os.path.join(path_n_try, f), 0))
+                elif f.startswith(ADB_LOG) and f.endswith('.log'):
+                    jobs.append((pkg_dir, int(n_try), 'ssi', 
+                            os.path.join(path_n_try, f), 0))
+                elif f.startswith(UIS_LOG):
+                    jobs.append((pkg_dir, int(n_try), 'ui', 
+                            os.path.join(path_n_try, f), 0))
+    return jobs
+
+
+def parse_logs(log_path: str, jobs: int, index: LogIndex=None) -> tuple:
+    '''
+    Parse files in parallel and merge the sets found per package and try.
+    With an index, only files new or grown since it was saved are read.
+
+    :return: ({pkg: {try: UIs}}, {pkg: {try: SSIs}})
+    '''
+    all_ui = {}
+    all_ssi = {}
+    for pkg_dir in os.listdir(log_path):
+        path_pkg = os.path.join(log_path, pkg_dir)
+        if not os.path.isdir(path_pkg):
+            continue
+        all_ui[pkg_dir] = {int(n_try): set() for n_try in os.listdir(path_pkg)}
+        all_ssi[pkg_dir] = {int(n_try): set() for n_try in os.listdir(path_pkg)}
+
+    files = find_jobs(log_path)
+    todo = files
+    if index is not None:
+        index.prune(log_path, [job[3] for job in files])
+        todo = []
+        for job in files:
+            offset = index.get_offset(job[3])
+            if offset is not None:
+                # Archives are written whole, so one changed is read again
+                todo.append(job[:4] +
+                        (0 if job[2] == 'archive' else offset,))
+
+    # Largest files first, so that no worker is left with a large one last
+    todo.sort(key=lambda job: job[4] - os.path.getsize(job[3]))
+    found_files = {}
+    if todo:
+        with Pool(processes=max(1, min(jobs, len(todo)))) as pool:
+            for job, stat, found, end in \
+                    pool.imap_unordered(parse_file, todo):
+                if index is not None:
+                    index.update(job[3], stat, end, found, job[4] == 0)
                 else:
-                    continue
+                    found_files[job[3]] = found
+    print('%d of %d files parsed' %(len(todo), len(files)), file=sys.stderr)
 
+    for pkg_dir, n_try, kind, path, _ in files:
+        found = index.get(path) if index is not None else found_files[path]
+        if kind == 'ui':
+            all_ui[pkg_dir][n_try].update(found)
+        else:
+            all_ssi[pkg_dir][n_try].update(found)
+    return all_ui, all_ssi
 
 
+def main():
+    args = parser.parse_args()
+    log_path = args.LOG_PATH
+    index = LogIndex(args.index, load=not args.rebuild)
 
-    # ----------------- #
-    #   Print Results   #
-    # ----------------- #
-    
-    print('# of SSIs before testing: %d\n' %(len(ssi_before))) 
-    
-    for pkg_dir in pkg_dirs:
-        path_pkg = os.path.join(log_path, pkg_dir)
-        if not os.path.isdir(path_pkg):
-            continue
-        
-        cum_ui = []
-        cum_ssi = []
-        tries = list(all_ui[pkg_dir].keys())
-        tries.sort()
-        for n_try in tries:
-
-            if n_try == 0:
-                cum_ui.append(all_ui[pkg_dir][n_try])
-                cum_ssi.append(all_ssi[pkg_dir][n_try])
-            
-            else:
-                temp_ui = set()
-                temp_ui.update(cum_ui[n_try-1])
-                temp_ui.update(all_ui[pkg_dir][n_try])
-                cum_ui.append(temp_ui)
-                
-                temp_ssi = set()
-                temp_ssi.update(cum_ssi[n_try-1])
-                temp_ssi.update(all_ssi[pkg_dir][n_try])
-                cum_ssi.append(temp_ssi)
-
-        ssi_new = set()
-        ssi_new.update(cum_ssi[-1])
-        for item in ssi_before:
-            if item in ssi_new:
-                ssi_new.remove(item)
-       
-        for ssi in ssi_new:
-            with open('%s_ssi_except_default.log' %(pkg_dir),
-                    'w', errors='ignore') as f:
-                for ssi in ssi_new:
-                    f.write('%s, %s, %s\n' %(ssi[0], ssi[1], ssi[2]))
-
- 
-        n_ui = [ len(n_try) for n_try in cum_ui ]
-        n_ssi = [ len(n_try) for n_try in cum_ssi ]
-
-        cdf_ui = [round((1. * ui) / n_ui[-1], 2) for ui in n_ui] \
-                if n_ui[-1] != 0 else [0] * len(n_ui)
-        cdf_ssi = [round((1. * ssi) / n_ssi[-1], 2) for ssi in n_ssi] \
-                if n_ssi[-1] != 0 else [0] * len(n_ssi)
-
-        
-        print('\n\n%s\n - UIs: %d, SSIs: %d, new SSIs: %d' %(pkg_dir, 
-            n_ui[-1], n_ssi[-1], len(ssi_new)))
-        print(' - # of UIs:\n     %s' %(str(n_ui)))
-        '''
-        print(' - UI CDF: \n     %s\n     %s\n     %s' 
-                %(str(cdf_ui[:10]), str(cdf_ui[10:20]), str(cdf_ui[20:])))
-        print(' - # of SSIs:\n     %s' %(str(n_ssi)))
-        print(' - SSI CDF: \n     %s\n     %s\n     %s' 
-                %(str(cdf_ssi[:10]), str(cdf_ssi[10:20]), str(cdf_ssi[20:])))
-        '''
-    
+    # SSIs before testing
+    ssi_log = args.baseline or os.path.join(SCRIPT_DIR,
+            'logcat_base_%s_r1' %(args.android))
+    ssi_before = index.get_baseline(args.android, ssi_log)
+    if ssi_before is None:
+        ssi_before = find_ssi(ssi_log, pid=None)
+        index.set_baseline(args.android, ssi_log, ssi_before)
+
+    all_ui, all_ssi = parse_logs(log_path, args.jobs, index)
+    index.save()
+
+    # SSIs found in a package but not before testing
+    n_new = {}
+    for pkg_dir, tries in all_ssi.items():
+        ssi_new = set().union(*tries.values()) - ssi_before
+        with open('%s_ssi_except_default.log' %(pkg_dir),
+                'w', errors='ignore') as f:
+            f.writelines('%s, %s, %s\n' %(ssi[0], ssi[1], ssi[2])
+                    for ssi in sorted(ssi_new))
+        n_new[pkg_dir] = len(ssi_new)
+
+    # ------------------- #
+    #   Write Summaries   #
+    # ------------------- #
+    cov_ui = analytics.coverage(all_ui)
+    cov_ssi = analytics.coverage(all_ssi)
+    summary = {'log_path': log_path, 'android_version': args.android,
+            'ssis_before': len(ssi_before),
+            'packages': {pkg_dir: {'uis': cov_ui[pkg_dir],
+                'ssis': cov_ssi[pkg_dir], 'new_ssis': n_new[pkg_dir]}
+                for pkg_dir in sorted(all_ssi)}}
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as f:
+            json.dump(summary, f, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
 
 
 if __name__ == '__main__':
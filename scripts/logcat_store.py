@@ -0,0 +1,87 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+
+Convert logcat dumps into columnar stores (src/logcat_store.py) and query
+SSIs of them
+
+ - convert: write <logcat file>.cols/ next to each adb_logcat file
+            (archived or not)
+ - ssis:    SSIs of a store, of a process or a time window, or those not
+            in a baseline store
+'''
+
+import os
+import sys
+import glob
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.logcat_store import LogcatStore, convert
+from src.logcat_archive import ARCHIVE_SUFFIX, to_ms
+
+
+STORE_SUFFIX = '.cols'
+
+parser = ArgumentParser(description='Convert and query logcat stores')
+subparsers = parser.add_subparsers(dest='command')
+convert_parser = subparsers.add_parser('convert', help='Convert logcat dumps')
+convert_parser.add_argument('LOG_PATHS', nargs='+',
+        help='Logcat files or directories containing adb_logcat files')
+convert_parser.add_argument('--force', action='store_true',
+        help='Convert files converted before again')
+ssis_parser = subparsers.add_parser('ssis', help='List SSIs of a store')
+ssis_parser.add_argument('STORE')
+ssis_parser.add_argument('--pid', type=int, help='Only SSIs of the process')
+ssis_parser.add_argument('--start', help='From the time (MM-DD HH:MM:SS.mmm)')
+ssis_parser.add_argument('--end', help='Until the time (MM-DD HH:MM:SS.mmm)')
+ssis_parser.add_argument('--baseline', help='Store of logcat before testing')
+ssis_parser.add_argument('--by-pid', action='store_true',
+        help='Count SSIs of each process')
+
+
+def find_logcats(log_paths: list) -> list:
+    paths = []
+    for log_path in log_paths:
+        if os.path.isfile(log_path):
+            paths.append(log_path)
+            continue
+        for pattern in ['adb_logcat_*.log', 'adb_logcat_*' + ARCHIVE_SUFFIX]:
+            paths.extend(glob.glob(os.path.join(glob.escape(log_path), '**',
+                    pattern), recursive=True))
+    return paths
+
+
+def main():
+    args = parser.parse_args()
+    if args.command == 'convert':
+        for path in find_logcats(args.LOG_PATHS):
+            store_dir = path + STORE_SUFFIX
+            if os.path.exists(store_dir) and not args.force and \
+                    os.path.getmtime(store_dir) >= os.path.getmtime(path):
+                continue
+            print('%s: %d lines' %(store_dir, convert(path, store_dir)))
+
+    elif args.command == 'ssis':
+        store = LogcatStore(args.STORE)
+        start = to_ms(args.start) if args.start else None
+        end = to_ms(args.end) if args.end else None
+        baseline = LogcatStore(args.baseline) if args.baseline else None
+        if args.by_pid:
+            for pid, keys in sorted(store.ssis_by_pid(start, end).items()):
+                if baseline is not None:
+                    keys = store.new_keys(keys, baseline)
+                print('%d\t%d' %(pid, len(keys)))
+            return
+        keys = store.ssi_keys(args.pid, start, end)
+        if baseline is not None:
+            keys = store.new_keys(keys, baseline)
+        for ssi in sorted(store.decode(keys)):
+            print('%s, %s, %s' %ssi)
+
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
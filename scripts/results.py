@@ -0,0 +1,193 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+
+Query the results database of all runs (log/results.db)
+
+ - import:   add runs of existing log directories (log/date_time)
+ - failures: failure rate grouped by Android version, device, app or app
+             version
+ - crashes:  crash signatures and how often they happened
+ - ssis:     new SSIs per minute of runs guided by SSIs and of the random
+             baseline (conf.SSI_GUIDED)
+ - sql:      any other query
+'''
+
+import os
+import re
+import sys
+import json
+import glob
+from time import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import src.config as conf
+import src.graph_store as graph_store
+from src.ssi import parse_ssi
+from src.results_db import ResultsDB, crash_signature
+from src.logcat_archive import ARCHIVE_SUFFIX, read_lines
+
+
+RESULT_PATTERN = re.compile(r'^(?P<apk>.*) (?P<verdict>SUCCESS|FAILED) ' \
+        r'(\((?P<failure>\d+)\) )?on (?P<serial>\S+), try: (?P<run>\d+)' \
+        r'(, recovered: (?P<recoveries>\d+))?$')
+GROUPS = ['android_version', 'serial', 'package', 'app_version']
+
+parser = ArgumentParser(description='Query results of all runs')
+parser.add_argument('--db', default=conf.RESULTS_DB_PATH,
+        help='Path of the results database')
+subparsers = parser.add_subparsers(dest='command')
+import_parser = subparsers.add_parser('import',
+        help='Import runs of log directories')
+import_parser.add_argument('LOG_PATHS', nargs='+',
+        help='Directories of tests (log/date_time) or containing them')
+for name, text in [('failures', 'Failure rate'), ('crashes', 'Crashes'),
+        ('ssis', 'New SSIs per minute, guided and random')]:
+    sub = subparsers.add_parser(name, help=text)
+    sub.add_argument('--package', help='Only runs of the package')
+    sub.add_argument('--days', type=float,
+            help='Only runs of the last given days')
+    if name == 'failures':
+        sub.add_argument('--by', choices=GROUPS, default='android_version')
+sql_parser = subparsers.add_parser('sql', help='Run a query')
+sql_parser.add_argument('QUERY')
+
+
+def find_package(campaign: str, apk: str, serial: str, run: str) -> str:
+    '''
+    Find the package directory of a run of the APK on the device
+    '''
+    candidates = [os.path.basename(os.path.dirname(path)) for path in
+            glob.glob(os.path.join(glob.escape(campaign), '*', run))
+            if glob.glob(os.path.join(glob.escape(path), '*' + serial + '*'))]
+    for candidate in candidates:
+        if candidate in os.path.basename(apk):
+            return candidate
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def read_run(campaign: str, match: dict) -> dict:
+    '''
+    Get the record of a run from the files it left
+    '''
+    serial, run = match['serial'], match['run']
+    package = find_package(campaign, match['apk'], serial, run)
+    record = {'campaign': os.path.basename(campaign), 'apk': match['apk'],
+            'package': package, 'serial': serial, 'run': int(run),
+            'verdict': match['verdict'],
+            'failure': int(match['failure']) if match['failure'] else None,
+            'recoveries': int(match['recoveries'] or 0)}
+    if package is None:
+        return record
+    run_dir = os.path.join(campaign, package, run)
+
+    # Runs written with the database have their record already
+    summary_path = os.path.join(run_dir, 'run_summary_%s.json' %(serial))
+    if os.path.exists(summary_path):
+        with open(summary_path, 'r', encoding='utf8') as f:
+            summary = json.load(f)
+        if 'record' in summary:
+            return dict(summary['record'], campaign=record['campaign'])
+
+    graph = graph_store.load_graph(os.path.join(run_dir,
+            'ui_graph_%s.json.gz' %(serial)))
+    record['android_version'] = graph.graph.get('meta', {}) \
+            .get('android_version')
+    traversed_path = os.path.join(run_dir, 'uis_traversed_%s.log' %(serial))
+    if os.path.exists(traversed_path):
+        with open(traversed_path, 'r', errors='ignore') as f:
+            record['uis'] = len(set(line.strip() for line in f
+                    if conf.DELIMITER in line))
+        record['started'] = os.path.getmtime(traversed_path)
+    logcat_path = os.path.join(run_dir, 'adb_logcat_%s' %(serial))
+    logcat_path += ARCHIVE_SUFFIX if os.path.exists(logcat_path +
+            ARCHIVE_SUFFIX) else '.log'
+    if os.path.exists(logcat_path):
+        ssis, runtime = set(), []
+        for line in read_lines(logcat_path):
+            ssis.add(parse_ssi(line))
+            if 'AndroidRuntime' in line:
+                runtime.append(line)
+        ssis.discard(None)
+        record['ssis'] = len(ssis)
+        if record['failure']:
+            record['crash'] = crash_signature('\n'.join(runtime), package)
+    return record
+
+
+def import_logs(db: ResultsDB, log_paths: list) -> None:
+    n_runs = 0
+    for log_path in log_paths:
+        for results_path in glob.glob(os.path.join(glob.escape(log_path),
+                '**', 'results.log'), recursive=True):
+            campaign = os.path.dirname(results_path)
+            with open(results_path, 'r', errors='ignore') as f:
+                for line in f:
+                    match = RESULT_PATTERN.match(line.strip())
+                    if match is None:
+                        continue
+                    db.add_run(read_run(campaign, match.groupdict()))
+                    n_runs += 1
+    db.flush()
+    print('%d runs imported' %(n_runs))
+
+
+def where(args) -> tuple:
+    clauses, params = [], []
+    if args.package:
+        clauses.append('runs.package = ?')
+        params.append(args.package)
+    if args.days:
+        clauses.append('runs.started >= ?')
+        params.append(time() - args.days * 24 * 3600)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def print_rows(header: list, rows: list) -> None:
+    if header:
+        print('\t'.join(header))
+    for row in rows:
+        print('\t'.join('' if value is None else str(value)
+                for value in row))
+
+
+def main():
+    args = parser.parse_args()
+    db = ResultsDB(args.db)
+    if args.command == 'import':
+        import_logs(db, args.LOG_PATHS)
+    elif args.command == 'failures':
+        column = 'apks.app_version' if args.by == 'app_version' \
+                else 'runs.' + args.by
+        clause, params = where(args)
+        print_rows([args.by, 'runs', 'failed', 'rate'], db.query(
+                "SELECT %s, COUNT(*), SUM(runs.verdict = 'FAILED'), "
+                "ROUND(AVG(runs.verdict = 'FAILED'), 3) FROM runs "
+                'LEFT JOIN apks ON apks.path = runs.apk%s GROUP BY 1 '
+                'ORDER BY 1' %(column, clause), tuple(params)))
+    elif args.command == 'crashes':
+        clause, params = where(args)
+        clause += (' AND' if clause else ' WHERE') + ' runs.crash IS NOT NULL'
+        print_rows(['crash', 'runs', 'packages', 'android versions'],
+                db.query('SELECT crash, COUNT(*), '
+                'GROUP_CONCAT(DISTINCT package), '
+                'GROUP_CONCAT(DISTINCT android_version) FROM runs%s '
+                'GROUP BY crash ORDER BY 2 DESC' %(clause), tuple(params)))
+    elif args.command == 'ssis':
+        clause, params = where(args)
+        clause += (' AND' if clause else ' WHERE') + \
+                ' runs.ssi_rate IS NOT NULL'
+        print_rows(['package', 'guided', 'runs', 'SSIs per minute'],
+                db.query('SELECT package, ssi_guided, COUNT(*), '
+                'ROUND(AVG(ssi_rate), 2) FROM runs%s GROUP BY 1, 2 '
+                'ORDER BY 1, 2' %(clause), tuple(params)))
+    elif args.command == 'sql':
+        print_rows([], db.query(args.QUERY))
+    else:
+        parser.print_help()
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@
 '''
 
 from re import findall
+from functools import lru_cache
 from subprocess import Popen, PIPE
 
 # Local packages
@@ -35,3 +36,17 @@ def get_launchable_activityList(apkPath: str) -> list:
     return findall("(?<=launchable-activity: name=')[^']*", output)
 
 
+
+@lru_cache(maxsize=None)
+def get_version_name(apkPath: str) -> str:
+    '''
+    Get version name of the APK file (or '' if it has none), kept once
+    read as it is asked for after every run
+
+    :param apkPath: A path of the APK file
+    :return: version name
+    '''
+    command = ['dump', 'badging', apkPath]
+    output = commons.run_aapt_command(command).decode(encoding, 'ignore')
+    found = findall("(?<=versionName=')[^']*", output)
+    return found[0] if found else ''
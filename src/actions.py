@@ -0,0 +1,132 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+# Local packages
+import src.adb_utils as adb
+import src.uiautomator_utils as ua_utils
+
+
+TEXT = 'text'
+LONG_CLICK = 'long_click'
+CLICK = 'click'
+SCROLL = 'scroll'
+
+EDIT_TEXT = "android.widget.EditText"
+
+
+def choose_action(ui: dict) -> str:
+    '''
+    Choose an action for the UI from the attributes in its dump
+    '''
+    if ui['className'] == EDIT_TEXT:
+        return TEXT
+    elif ui.get('longClickable'):
+        return LONG_CLICK
+    # Dumps keep clickable UIs only, so a scrollable one is clickable too
+    elif ui.get('scrollable'):
+        return SCROLL
+    elif ui.get('clickable', True) or ui.get('checkable'):
+        return CLICK
+    return None
+
+def get_center(bounds: str) -> tuple:
+    '''
+    Get the center point of the given bounds
+    '''
+    left, top, right, bottom = ua_utils.parse_bounds(bounds)
+    return (left + right) // 2, (top + bottom) // 2
+
+def perform_at_bounds(ua_device, d_serial: str, ui: dict,
+                      text: str = '') -> tuple:
+    '''
+    Perform an action on the UI with a single tap, long-press or swipe
+    at its bounds, without searching the hierarchy again
+
+    :return: (action performed or None, number of RPCs and ADB commands)
+             as perform_with_selector() if typing with ADB failed
+    '''
+    action = choose_action(ui)
+    x, y = get_center(ui['bounds'])
+    if action == TEXT:
+        # Focus, type and close the keyboard in one round-trip, or type with
+        # a selector if a step of it failed
+        status = adb.run_input_script(d_serial, [adb.tap_step(x, y, wait=1),
+                adb.text_step(text), adb.keyevent_step(4)])
+        if adb.failed_steps(status):
+            action, rpcs = perform_with_selector(ua_device, d_serial, ui, text)
+            return action, rpcs + 1
+    elif action == LONG_CLICK:
+        ua_device.long_click(x, y)
+    elif action == CLICK:
+        ua_device.click(x, y)
+    elif action == SCROLL:
+        left, top, right, bottom = ua_utils.parse_bounds(ui['bounds'])
+        offset = (bottom - top) // 4
+        ua_device.swipe(x, bottom - offset, x, top + offset, steps=10)
+    else:
+        return None, 0
+    return action, 1
+
+def get_steps(ui: dict, text: str = '', wait: float = 1) -> list:
+    '''
+    Get input script steps (see adb_utils) performing the action on the UI
+    '''
+    action = choose_action(ui)
+    x, y = get_center(ui['bounds'])
+    if action == TEXT:
+        return [adb.tap_step(x, y, wait=1), adb.text_step(text),
+                adb.keyevent_step(4, wait=wait)]
+    elif action == LONG_CLICK:
+        return [adb.long_press_step(x, y, wait=wait)]
+    elif action == CLICK:
+        return [adb.tap_step(x, y, wait=wait)]
+    elif action == SCROLL:
+        left, top, right, bottom = ua_utils.parse_bounds(ui['bounds'])
+        offset = (bottom - top) // 4
+        return [adb.swipe_step(x, bottom - offset, x, top + offset, 
+                wait=wait)]
+    return []
+
+def perform_with_selector(ua_device, d_serial: str, ui: dict,
+                          text: str = '') -> tuple:
+    '''
+    Find the UI with a selector on the live hierarchy and perform an action.
+    Used when the UI is not found in the last dump (the screen changed).
+
+    :return: (action performed or None, number of RPCs and ADB commands)
+             where the action is False if the UI does not exist
+    '''
+    ui_element = ua_device(text=ui['text'], className=ui['className'],
+                           resourceId=ui['resourceId'])
+    rpcs = 1
+    if not ui_element.exists:
+        return False, rpcs
+
+    # Type random strign on a EditText widget
+    rpcs += 1
+    if ui_element.className == EDIT_TEXT:
+        ui_element.set_text(text)
+        adb.adb_close_keyboard(d_serial)
+        return TEXT, rpcs + 2
+    # Long click
+    rpcs += 1
+    if ui_element.longClickable:
+        ui_element.long_click.wait()
+        return LONG_CLICK, rpcs + 1
+    # Click or check
+    rpcs += 1
+    if ui_element.clickable:
+        ui_element.click.wait()
+        return CLICK, rpcs + 1
+    rpcs += 1
+    if ui_element.checkable:
+        ui_element.click.wait()
+        return CLICK, rpcs + 1
+    # Scroll
+    rpcs += 1
+    if ui_element.scrollable:
+        ui_element.swipe.up(steps=10).wait()
+        return SCROLL, rpcs + 1
+    return None, rpcs
@@ -2,8 +2,13 @@
 '''
 @author: Chang Min Park (cpark22@buffalo.edu)
 '''
-from re import search
+from re import search, findall
 from time import sleep
+from subprocess import Popen, PIPE, DEVNULL
+from shlex import quote
+from hashlib import md5
+import os
+import tempfile
 from random import choice, randint
 from math import pow
 from string import ascii_letters, digits
@@ -14,6 +19,10 @@ from src.config import ADB, INSTALL_FAILED_EXCEPTION
 import src.config as conf
 import src.aapt_utils as aapt
 
+STEP_MARKER = '__STEP__'            # Printed after each step of a script
+SCRIPT_DIR = '/data/local/tmp'      # Where scripts are pushed on devices
+INLINE_SCRIPT_LIMIT = 1000          # Longer scripts are pushed first
+_pushed_scripts = {}                # {d_serial: set of pushed script names}
 
 def adb_reboot_uiautomator(d_serial: str) -> None:
     '''
@@ -115,6 +124,13 @@ def get_window_dumpsys(d_serial: str) -> str:
     else:
         return ''
 
+def get_pids(d_serial: str, pkg_name: str) -> set:
+    '''
+    Get PIDs of the processes of the package
+    '''
+    out = commons.run_adb_command(d_serial, ['shell', 'pidof', pkg_name])
+    return set(pid for pid in (out or '').split() if pid.isdigit())
+
 def get_foreground_package_name(d_serial: str) -> str:
     '''
     Get the foreground package name.
@@ -174,12 +190,13 @@ def is_keyboard_numeric(d_serial: str) -> bool:
     return "Keyboard mode = 5" in \
         commons.run_adb_command(d_serial, ['shell', 'dumpsys', 'input_method'])
 
-def type_text(d_serial: str, text: str) -> None:
+def type_text(d_serial: str, text: str, 
+              delay: int = commons.ACTION_DELAY) -> None:
     '''
     Send the given text to type on the Android d_serial.
     '''
     commons.run_adb_command(d_serial, ['shell', 'input', 'text', text])
-    sleep(commons.ACTION_DELAY)
+    sleep(delay)
 
 def type_random_text(length: int) -> None:
     '''
@@ -200,6 +217,110 @@ def is_keyboard_shown(d_serial: str) -> bool:
     return "mInputShown=true" in \
         commons.run_adb_command(d_serial, ['shell', 'dumpsys', 'input_method'])
 
+def tap_step(x: int, y: int, wait: float = 0) -> tuple:
+    '''
+    Script step tapping the given point
+    '''
+    return (['input', 'tap', str(x), str(y)], wait)
+
+def long_press_step(x: int, y: int, wait: float = 0,
+                    duration: int = 1000) -> tuple:
+    '''
+    Script step long-pressing the given point for duration milliseconds
+    '''
+    return (['input', 'swipe', str(x), str(y), str(x), str(y), 
+            str(duration)], wait)
+
+def swipe_step(x1: int, y1: int, x2: int, y2: int, wait: float = 0,
+               duration: int = 300) -> tuple:
+    '''
+    Script step swiping from (x1, y1) to (x2, y2)
+    '''
+    return (['input', 'swipe', str(x1), str(y1), str(x2), str(y2),
+            str(duration)], wait)
+
+def text_step(text: str, wait: float = 0) -> tuple:
+    '''
+    Script step typing the given text (spaces are typed as %s)
+    '''
+    return (['input', 'text', text.replace(' ', '%s')], wait)
+
+def keyevent_step(keycode: int, wait: float = 0) -> tuple:
+    '''
+    Script step sending the given key event (e.g., 4 for back)
+    '''
+    return (['input', 'keyevent', str(keycode)], wait)
+
+def compile_input_script(steps: list) -> str:
+    '''
+    Compile (command, wait in seconds) steps into one shell script that
+    prints the exit status of every step
+    '''
+    lines = []
+    for idx, (command, wait) in enumerate(steps):
+        lines.append('%s; echo "%s %d $?"' %(' '.join(quote(arg) \
+                for arg in command), STEP_MARKER, idx))
+        if wait:
+            lines.append('sleep %s' %(('%.3f' %(wait)).rstrip('0').rstrip('.')))
+    return '; '.join(lines)
+
+def run_input_script(d_serial: str, steps: list) -> list:
+    '''
+    Run the given steps on the device in a single round-trip
+
+    A short script is passed to the shell directly. A long one is pushed
+    once (named by its hash) and executed from the device afterwards.
+
+    :return: exit status of each step, None for steps that did not run
+    '''
+    script = compile_input_script(steps)
+    if len(script) <= INLINE_SCRIPT_LIMIT:
+        out = commons.run_adb_command(d_serial, ['shell', script])
+    else:
+        name = 'fuzz_%s.sh' %(md5(script.encode('utf-8')).hexdigest())
+        path = SCRIPT_DIR + '/' + name
+        pushed = _pushed_scripts.setdefault(d_serial, set())
+        if name not in pushed:
+            with tempfile.NamedTemporaryFile('w', suffix='.sh', 
+                    delete=False) as f:
+                f.write(script + '\n')
+            try:
+                commons.run_adb_command(d_serial, ['push', f.name, path])
+            finally:
+                os.remove(f.name)
+            pushed.add(name)
+        out = commons.run_adb_command(d_serial, ['shell', 'sh', path])
+
+    status = [None] * len(steps)
+    for idx, code in findall(STEP_MARKER + r' (\d+) (\d+)', out or ''):
+        if int(idx) < len(status):
+            status[int(idx)] = int(code)
+    return status
+
+def remove_pushed_scripts(d_serial: str) -> None:
+    '''
+    Delete the scripts pushed to the device by run_input_script()
+    '''
+    names = _pushed_scripts.pop(d_serial, set())
+    if names:
+        commons.run_adb_command(d_serial, ['shell', 'rm', '-f'] + 
+                [SCRIPT_DIR + '/' + name for name in sorted(names)])
+
+def failed_steps(status: list) -> list:
+    '''
+    Get indexes of steps (see run_input_script()) that failed or did not run
+    '''
+    return [idx for idx, code in enumerate(status) if code != 0]
+
+def press_back_chain(d_serial: str, times: int, wait: float = 1) -> list:
+    '''
+    Press back the given number of times in a single round-trip
+
+    :return: exit status of each press (see run_input_script())
+    '''
+    return run_input_script(d_serial, 
+            [keyevent_step(4, wait) for _ in range(times)])
+
 def logcat_clear(d_serial: str) -> None:
     '''
     Clear logcat.
@@ -259,6 +380,21 @@ def logcat_dump(d_serial: str, filtered=False) -> str:
     sleep(commons.ACTION_DELAY)
     return out
 
+def logcat_lines(d_serial: str) -> iter:
+    '''
+    Stream lines of logcat dumped in the threadtime format, without holding
+    the dump in memory
+    '''
+    command = [ADB, '-s', d_serial, 'logcat', '-d', '-v', 'threadtime']
+    proc = Popen(command, stdout=PIPE, stderr=DEVNULL)
+    try:
+        for line in proc.stdout:
+            yield line.decode(commons.encoding, 'ignore')
+    finally:
+        proc.stdout.close()
+        proc.wait()
+    sleep(commons.ACTION_DELAY)
+
 def get_android_version(d_serial: str) -> str:
     '''
     Get Android version of the given device
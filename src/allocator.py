@@ -0,0 +1,52 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+# Local packages
+import src.config as conf
+
+
+class BudgetAllocator:
+    '''
+    Track time, actions and discoveries spent on each state of a run
+
+    A state is exhausted once it took more than conf.STATE_TIME_BUDGET
+    seconds and its last conf.STATE_DISCOVERY_WINDOW actions found no new
+    state or UI, so that testing moves on to under-explored states.
+    '''
+
+    def __init__(self):
+        self._states = {}   # {state: {time, actions, discoveries, recent}}
+
+    def record(self, state: str, seconds: float, discoveries: int) -> None:
+        '''
+        Record an action performed on the state
+        '''
+        stat = self._states.setdefault(state, {'time': 0.0, 'actions': 0,
+                'discoveries': 0, 'recent': []})
+        stat['time'] += seconds
+        stat['actions'] += 1
+        stat['discoveries'] += discoveries
+        stat['recent'] = (stat['recent'] + [discoveries]) \
+                [-conf.STATE_DISCOVERY_WINDOW:]
+
+    def is_exhausted(self, state: str) -> bool:
+        '''
+        Check if the state used up its budget without finding anything new
+        '''
+        stat = self._states.get(state)
+        if stat is None or stat['time'] <= conf.STATE_TIME_BUDGET:
+            return False
+        return len(stat['recent']) >= conf.STATE_DISCOVERY_WINDOW \
+                and not any(stat['recent'])
+
+    def get_allocation(self) -> dict:
+        '''
+        Get {state: {time, actions, discoveries, exhausted}} of the run
+        '''
+        return {state: {'time': round(stat['time'], 2),
+                        'actions': stat['actions'],
+                        'discoveries': stat['discoveries'],
+                        'exhausted': self.is_exhausted(state)}
+                for state, stat in self._states.items()}
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import numpy as np
+
+
+# Fractions of all items found to report the first run reaching them
+SATURATION_POINTS = [0.5, 0.9, 0.99, 1.0]
+
+def first_seen(runs: dict) -> dict:
+    '''
+    Get the first run each item (UI or SSI) was found in
+
+    :param runs: {run: set of items}
+    :return: {item: run}
+    '''
+    found = {}
+    for run in sorted(runs, reverse=True):
+        found.update(dict.fromkeys(runs[run], run))
+    return found
+
+
+def coverage(packages: dict) -> dict:
+    '''
+    Get cumulative counts of items found over runs of each package, their
+    CDF and the runs reaching SATURATION_POINTS of them
+
+    The first run of each item is found once, and counts of all packages
+    come from one histogram of (package, first run).
+
+    :param packages: {package: {run: set of items}}
+    :return: {package: {runs, total, cumulative, cdf, saturation}}
+    '''
+    names = sorted(packages)
+    runs = [sorted(packages[name]) for name in names]
+    n_runs = max([len(pkg_runs) for pkg_runs in runs] or [0])
+    if not n_runs:
+        return {name: _summary([], np.zeros(0, dtype=np.int64))
+                for name in names}
+
+    pkg_ids, positions = [], []
+    for pkg_id, (name, pkg_runs) in enumerate(zip(names, runs)):
+        position = {run: i for i, run in enumerate(pkg_runs)}
+        first = first_seen(packages[name])
+        pkg_ids.append(np.full(len(first), pkg_id, dtype=np.int64))
+        positions.append(np.fromiter((position[run] for run in
+                first.values()), dtype=np.int64, count=len(first)))
+    counts = np.bincount(np.concatenate(pkg_ids) * n_runs +
+            np.concatenate(positions), minlength=len(names) * n_runs)
+    cumulative = np.cumsum(counts.reshape(len(names), n_runs), axis=1)
+    return {name: _summary(pkg_runs, cumulative[pkg_id, :len(pkg_runs)])
+            for pkg_id, (name, pkg_runs) in enumerate(zip(names, runs))}
+
+
+# ----------------- #
+#   Local Methods   #
+# ----------------- #
+def _summary(runs: list, cumulative: np.ndarray) -> dict:
+    total = int(cumulative[-1]) if len(cumulative) else 0
+    cdf = cumulative / total if total else np.zeros(len(cumulative))
+    saturation = {}
+    for point in SATURATION_POINTS:
+        i = int(np.searchsorted(cdf, point - 1e-9)) if total else len(runs)
+        saturation[str(point)] = runs[i] if i < len(runs) else None
+    return {'runs': [int(run) for run in runs], 'total': total,
+            'cumulative': cumulative.tolist(),
+            'cdf': np.round(cdf, 3).tolist(), 'saturation': saturation}
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import json
+import random
+import string
+from time import time
+
+# Local packages
+import src.config as conf
+import src.adb_utils as adb
+import src.actions as actions
+import src.uiautomator_utils as ua_utils
+from src.logger import Logger
+
+
+TAP = 'tap'
+LONG_PRESS = 'long_press'
+SWIPE = 'swipe'
+TEXT = 'text'
+NOT_FOREGROUND = 'not_foreground'
+FAILED = 'failed'           # Steps of the batch before that failed
+
+
+class BlitzFuzzer:
+    '''
+    Fire random events at a high rate on cached UI bounds
+
+    Events are sent in batches of conf.BLITZ_BATCH_SIZE as one input script
+    and the clickable UIs are dumped again only every
+    conf.BLITZ_REFRESH_EVENTS events or when the Activity changes. Every
+    event is written to a log before it is sent, so a crash can be
+    replayed with replay().
+    '''
+
+    def __init__(self, driver, d_serial: str, log_path: str,
+                 seed: int = None):
+        self._driver = driver
+        self._d_serial = d_serial
+        self._log_path = log_path
+        self._seed = seed if seed is not None else random.randrange(2**32)
+        self._random = random.Random(self._seed)
+        self._logger = Logger.get_instance()
+        self._uis = []
+        self._screen = (0, 0, 1080, 1920)   # Bounds of the whole screen
+
+    def run(self, duration: float) -> float:
+        '''
+        Fire events for the given seconds
+
+        :return: events per second
+        '''
+        started = time()
+        n_events, n_refresh, n_crashes, n_failed = 0, 0, 0, 0
+        activity = self._refresh()
+        with open(self._log_path, 'w', encoding='utf8') as log:
+            log.write(json.dumps({'seed': self._seed,
+                    'serial': self._d_serial}) + '\n')
+            while time() - started < duration:
+                if n_refresh >= conf.BLITZ_REFRESH_EVENTS or activity != \
+                        adb.get_foreground_activity_name(self._d_serial):
+                    activity = self._refresh()
+                    n_refresh = 0
+
+                # Log a batch of events, then send it in one round-trip
+                events = [self._random_event()
+                        for _ in range(conf.BLITZ_BATCH_SIZE)]
+                for event in events:
+                    event['time'] = round(time() - started, 3)
+                    log.write(json.dumps(event) + '\n')
+                log.flush()
+                steps = get_steps(events)
+                failed = adb.failed_steps(adb.run_input_script(
+                        self._d_serial, steps))
+                if failed:
+                    log.write(json.dumps({'time': round(time() - started,
+                            3), 'kind': FAILED, 'steps': failed}) + '\n')
+                    log.flush()
+                    n_failed += len(failed)
+                    # Nothing reaches the device any more
+                    if len(failed) == len(steps):
+                        break
+                n_events += len(events)
+                n_refresh += len(events)
+
+                # Relaunch the app if it crashed or was left
+                if not self._driver.check_foreground_package(self._d_serial):
+                    n_crashes += 1
+                    log.write(json.dumps({'time': round(time() - started,
+                            3), 'kind': NOT_FOREGROUND}) + '\n')
+                    log.flush()
+                    if not self._driver.recover(self._d_serial):
+                        break
+                    activity = self._refresh()
+
+        rate = n_events / (time() - started)
+        self._logger.info("%s: %d blitz events (%.1f per second), " \
+                "%d crashes, %d failed steps, seed: %d", self._d_serial, 
+                n_events, rate, n_crashes, n_failed, self._seed, 
+                serial=self._d_serial)
+        return rate
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _refresh(self) -> str:
+        '''
+        Dump clickable UIs again and get the foreground Activity
+        '''
+        self._uis = self._driver.get_current_uis(self._d_serial, fresh=True)
+        bounds = [ua_utils.parse_bounds(ui['bounds']) for ui in self._uis]
+        if bounds:
+            self._screen = (0, 0, max(b[2] for b in bounds),
+                            max(b[3] for b in bounds))
+        return adb.get_foreground_activity_name(self._d_serial)
+
+    def _random_event(self) -> dict:
+        kind = self._random.choices(list(conf.BLITZ_EVENT_WEIGHTS.keys()),
+                weights=list(conf.BLITZ_EVENT_WEIGHTS.values()))[0]
+        if kind == SWIPE or not self._uis:
+            left, top, right, bottom = self._screen
+            return {'kind': SWIPE,
+                    'x1': self._randint(left, right),
+                    'y1': self._randint(top, bottom),
+                    'x2': self._randint(left, right),
+                    'y2': self._randint(top, bottom)}
+        if kind == TEXT:
+            edit_texts = [ui for ui in self._uis
+                    if ui['className'] == actions.EDIT_TEXT]
+            ui = self._random.choice(edit_texts or self._uis)
+            x, y = actions.get_center(ui['bounds'])
+            text = ''.join(self._random.choice(string.ascii_letters)
+                    for _ in range(10))
+            return {'kind': TEXT, 'x': x, 'y': y, 'text': text,
+                    'ui': ui['resourceId']}
+        ui = self._random.choice(self._uis)
+        x, y = actions.get_center(ui['bounds'])
+        return {'kind': kind, 'x': x, 'y': y, 'ui': ui['resourceId']}
+
+    def _randint(self, low: int, high: int) -> int:
+        '''
+        Get a random point in [low, high), or low if the range is empty
+        '''
+        return self._random.randint(low, high - 1) if high > low else low
+
+
+def get_steps(events: list) -> list:
+    '''
+    Get input script steps (see adb_utils) of the given events
+    '''
+    wait = conf.BLITZ_EVENT_WAIT
+    steps = []
+    for event in events:
+        if event['kind'] == TAP:
+            steps.append(adb.tap_step(event['x'], event['y'], wait))
+        elif event['kind'] == LONG_PRESS:
+            steps.append(adb.long_press_step(event['x'], event['y'], wait))
+        elif event['kind'] == SWIPE:
+            steps.append(adb.swipe_step(event['x1'], event['y1'],
+                    event['x2'], event['y2'], wait, duration=100))
+        elif event['kind'] == TEXT:
+            steps += [adb.tap_step(event['x'], event['y']),
+                      adb.text_step(event['text'], wait)]
+    return steps
+
+def replay(d_serial: str, log_path: str, until: float = None) -> int:
+    '''
+    Send the events logged by BlitzFuzzer again, up to the given time
+
+    :return: number of steps sent that did not fail
+    '''
+    events = []
+    with open(log_path, 'r', encoding='utf8') as log:
+        for line in log:
+            event = json.loads(line)
+            if 'kind' not in event or event['kind'] in [NOT_FOREGROUND,
+                    FAILED]:
+                continue
+            if until is not None and event['time'] > until:
+                break
+            events.append(event)
+    n_sent = 0
+    for idx in range(0, len(events), conf.BLITZ_BATCH_SIZE):
+        steps = get_steps(events[idx:idx + conf.BLITZ_BATCH_SIZE])
+        failed = adb.failed_steps(adb.run_input_script(d_serial, steps))
+        if len(failed) == len(steps):
+            break
+        n_sent += len(steps) - len(failed)
+    return n_sent
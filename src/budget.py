@@ -0,0 +1,102 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+from threading import Lock
+
+# Local packages
+import src.config as conf
+
+
+class RunBudget:
+    '''
+    Decide how many runs each app gets from what its runs discover
+
+    An app stops before conf.NUM_RUNS_PER_APP runs once its discovery of
+    UIs and SSIs saturates, and the runs it leaves go to a shared pool. An
+    app still discovering after conf.NUM_RUNS_PER_APP runs takes extra
+    runs from the pool, up to conf.MAX_RUNS_PER_APP.
+
+    Saturation: no new UI or SSI in the last conf.SATURATION_WINDOW runs
+    after the first one (everything is new in it), and the Good-Turing
+    estimate of finding something new in the next run (items seen in
+    exactly one run / runs) under conf.SATURATION_THRESHOLD. Apps that
+    found nothing at all are stuck rather than saturated: they take the
+    runs they were given, but no extra ones.
+    '''
+
+    def __init__(self):
+        first_stop = max(conf.MIN_RUNS_PER_APP, conf.SATURATION_WINDOW + 1)
+        if conf.ADAPTIVE_RUNS and first_stop >= conf.NUM_RUNS_PER_APP:
+            raise ValueError('No app can stop before NUM_RUNS_PER_APP (%d) '
+                    'runs: saturation is decided after %d runs at the '
+                    'earliest' %(conf.NUM_RUNS_PER_APP, first_stop))
+        self._lock = Lock()
+        self._pool = 0          # Runs given up by saturated apps
+        self._counts = {}       # {pkg: {item: # of runs it was seen in}}
+        self._new = {}          # {pkg: [# of new items in each run]}
+
+    def record(self, pkg_name: str, uis: set, ssis: set) -> int:
+        '''
+        Record what a run of the app discovered
+
+        :return: number of items never seen in previous runs
+        '''
+        items = set(('ui', ui) for ui in uis) | \
+                set(('ssi', tuple(ssi)) for ssi in ssis)
+        with self._lock:
+            counts = self._counts.setdefault(pkg_name, {})
+            new = 0
+            for item in items:
+                if item not in counts:
+                    new += 1
+                counts[item] = counts.get(item, 0) + 1
+            self._new.setdefault(pkg_name, []).append(new)
+        return new
+
+    def should_continue(self, pkg_name: str, nth_try: int) -> bool:
+        '''
+        Check if the app should be tested for another (nth_try) run
+        '''
+        if not conf.ADAPTIVE_RUNS:
+            return nth_try < conf.NUM_RUNS_PER_APP
+        with self._lock:
+            if nth_try < conf.MIN_RUNS_PER_APP:
+                return True
+            if nth_try >= conf.MAX_RUNS_PER_APP:
+                return False
+
+            saturated = self._is_saturated(pkg_name)
+            if nth_try < conf.NUM_RUNS_PER_APP:
+                if saturated:
+                    self._pool += conf.NUM_RUNS_PER_APP - nth_try
+                    return False
+                return True
+            if not saturated and self._pool > 0 and \
+                    self._counts.get(pkg_name):
+                self._pool -= 1
+                return True
+            return False
+
+    def get_summary(self, pkg_name: str) -> str:
+        with self._lock:
+            new = self._new.get(pkg_name, [])
+            return "%d runs, %d items, new per run: %s, spare runs: %d" \
+                    %(len(new), len(self._counts.get(pkg_name, {})),
+                    str(new), self._pool)
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _is_saturated(self, pkg_name: str) -> bool:
+        counts = self._counts.get(pkg_name, {})
+        new = self._new.get(pkg_name, [])
+
+        # Nothing found at all is a stuck app, not a saturated one
+        if not counts or len(new) - 1 < conf.SATURATION_WINDOW:
+            return False
+        if any(new[1:][-conf.SATURATION_WINDOW:]):
+            return False
+        singletons = sum(1 for count in counts.values() if count == 1)
+        return singletons / len(new) < conf.SATURATION_THRESHOLD
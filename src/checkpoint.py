@@ -0,0 +1,81 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import os
+import json
+import hashlib
+from threading import Lock
+
+
+CHECKPOINT_FILE = 'checkpoint.jsonl'
+
+class Checkpoint:
+    '''
+    Runs of a test finished so far, to resume the test after the process
+    died
+
+    A unit is a run (index) of an APK (by its SHA-256) on a device. Each
+    finished unit is appended as one JSON line and synced to disk before
+    the next run starts, so a unit is either recorded whole or not at all;
+    a line cut by a crash is ignored when loading.
+    '''
+
+    def __init__(self, log_dir: str):
+        self._path = os.path.join(log_dir, CHECKPOINT_FILE)
+        self._lock = Lock()
+        self._done = set()      # {(APK hash, serial, run)}
+        if not os.path.exists(self._path):
+            # Created with the test, so that it can be resumed from the start
+            open(self._path, 'a').close()
+            return
+        with open(self._path, 'r', encoding='utf8') as f:
+            data = f.read()
+        for line in data.splitlines():
+            try:
+                unit = json.loads(line)
+            except ValueError:
+                continue
+            self._done.add((unit['apk'], unit['serial'], unit['run']))
+
+        # Drop a line cut by a crash, not to append to it
+        if data and not data.endswith('\n'):
+            with open(self._path, 'r+', encoding='utf8') as f:
+                f.truncate(len(data[:data.rfind('\n') + 1].encode('utf8')))
+
+    def complete(self, apk_hash: str, d_serials: list, nth_try: int) -> None:
+        '''
+        Record the run of the APK as finished on the devices
+        '''
+        d_serials = [d_serial for d_serial in d_serials
+                if (apk_hash, d_serial, nth_try) not in self._done]
+        if not d_serials:
+            return
+        lines = ''.join(json.dumps({'apk': apk_hash, 'serial': d_serial,
+                'run': nth_try}) + '\n' for d_serial in d_serials)
+        with self._lock:
+            with open(self._path, 'a', encoding='utf8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._done.update((apk_hash, d_serial, nth_try)
+                    for d_serial in d_serials)
+
+    def is_done(self, apk_hash: str, d_serials: list, nth_try: int) -> bool:
+        '''
+        Check if the run of the APK finished on all the devices
+        '''
+        return all((apk_hash, d_serial, nth_try) in self._done
+                for d_serial in d_serials)
+
+
+def apk_hash(apk_path: str) -> str:
+    '''
+    Get SHA-256 of the APK file
+    '''
+    sha = hashlib.sha256()
+    with open(apk_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
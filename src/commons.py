@@ -14,6 +14,7 @@ import signal
 import multiprocessing
 import io
 import contextlib
+from threading import Lock
 
 # Local packages
 import src.config as conf
@@ -26,6 +27,8 @@ encoding="utf-8"
 ACTION_DELAY = 3 #3
 REBOOT_DELAY = 60
 
+_append_lock = Lock()   # For files appended by all devices
+
 def find_apks(path: str) -> list:
     '''
     Find all APK files under the given path recursively
@@ -179,8 +182,15 @@ def write_tested_pkg(pkg: str) -> None:
     path = conf.TESTED_PKGS_PATH
     if not os.path.exists(path):
         sys.exit("Given file path doesn't exist: %s" %(path))
-    with open(path, 'a') as f:
-        f.write(pkg+"\n")
+    append_line(path, pkg+"\n")
+
+def append_line(path: str, line: str) -> None:
+    '''
+    Append a line to a file shared by device threads, in a single write
+    '''
+    with _append_lock:
+        with open(path, 'a', encoding='utf8') as f:
+            f.write(line)
 
 
 def run_signal_timer(timeout: int) -> None:
@@ -194,6 +204,13 @@ def run_signal_timer(timeout: int) -> None:
     signal.alarm(timeout)
 
 
+def cancel_signal_timer() -> None:
+    '''
+    Cancel the signal timer if it has not gone off yet
+    '''
+    signal.alarm(0)
+
+
 def run_thread_timer(timeout, func, args=(), kwargs={}) -> bool:
     '''
     Run thread timer
@@ -10,21 +10,107 @@ import os
 # ------------ #
 MODE_FOLLOWER_LEADER = False
 MODE_RANDOM = True      
+PRUNE_DIVERGED_FOLLOWERS = False    # Stop followers on another Activity
+MATCH_MIN_CONFIDENCE = 0.5          # Least score of a fuzzy match on followers
+# Confidence of a fuzzy match per point of its score, so that it ranks below
+# matches by structure, ID or text (0.7 to 1.0, see src/matcher.py)
+MATCH_FUZZY_WEIGHT = 0.7
+RECORD_MATCHES = False              # Log matches for scripts/bench_matcher.py
+
+# Blitz mode (not in follow-the-leader mode): fire random taps, long-presses,
+# swipes and texts on cached UI bounds as fast as possible (see src/blitz.py)
+MODE_BLITZ = False
+BLITZ_BATCH_SIZE = 20           # Events sent in one round-trip
+BLITZ_REFRESH_EVENTS = 100      # Events before dumping UIs again
+BLITZ_EVENT_WAIT = 0.05         # Seconds between events
+BLITZ_EVENT_WEIGHTS = {'tap': 6, 'long_press': 1, 'swipe': 2, 'text': 1}
 
 REBOOT_AFTER_EACH_APP = False
 KEEP_INSTALLED_APP = False
 NUM_RUNS_PER_APP = 3            
+
+# Stop testing an app before NUM_RUNS_PER_APP runs once its runs stop
+# finding new UIs and SSIs, and give the runs saved to apps still finding
+# new ones after NUM_RUNS_PER_APP runs (see src/budget.py). An app can stop
+# after max(MIN_RUNS_PER_APP, SATURATION_WINDOW + 1) runs at the earliest,
+# which must be less than NUM_RUNS_PER_APP.
+ADAPTIVE_RUNS = True
+MIN_RUNS_PER_APP = 2
+MAX_RUNS_PER_APP = NUM_RUNS_PER_APP * 2
+SATURATION_WINDOW = 1           # Runs in a row without anything new
+SATURATION_THRESHOLD = 0.5      # Expected # of new items in the next run
 WAIT_AFTER_APP_LAUNCH = 5          # Wait for the device to load first screen 
 APP_INSTALL_DELAY = 30
 TESTING_TIMEOUT = WAIT_AFTER_APP_LAUNCH + 180   # in second
+CLEANING_TIMEOUT = 120          # Time to save results after testing a run
+
+# What makes a screen a new state in the UI graph:
+#  - activity: the foreground Activity only
+#  - structure: the Activity and the layout of its actionable UIs
+#  - content: the same as structure plus texts on the UIs
+STATE_ABSTRACTION = 'structure'
+SCREEN_CACHE_TTL = 5            # Seconds a UI dump is reused (no action)
+
+# How to reach untested UIs when the current state has none left (not in
+# random or follow-the-leader mode):
+#  - back: press back until a state with untested UIs shows up
+#  - shortest_path: replay the shortest recorded path to the nearest one,
+#                   relaunching the app first when that is cheaper
+NAVIGATION = 'shortest_path'
+RELAUNCH_COST = 3               # Relaunching the app, in number of actions
+REPLAY_STEP_WAIT = 1            # Seconds to wait after each replayed action
+
+# Move on from a state after STATE_TIME_BUDGET seconds on it once its last
+# STATE_DISCOVERY_WINDOW actions found no new state or UI
+STATE_TIME_BUDGET = 30
+STATE_DISCOVERY_WINDOW = 5
+
+# Times the app is relaunched in a run after it crashed or was left
+MAX_RECOVERIES_PER_RUN = 3
+RECOVERY_BACK_PRESSES = 2       # Tried before relaunching the app
+
+# Keep UI graphs of previous runs (and campaigns) and test UIs that were
+# never or rarely tested before first
+USE_EXPLORATION_MEMORY = True
+WL_ITERATIONS = 3       # Steps from a state covered by its subtree hash
+
+# Stream logcat while testing to find system service interactions (SSIs)
+# caused by each action, and test UIs like ones that caused new SSIs first
+MONITOR_SSI = True
+SSI_GUIDED = True
+
+# Draw UI graphs of runs in the background as 'pdf', 'svg', 'dot' (written
+# only, to lay out later) or 'none'
+RENDER_FORMAT = 'pdf'
+RENDER_WORKERS = 2
+
+# Write events of each run (trace_<serial>.jsonl) in batches of this many
+# events, or after this many seconds
+TRACE_BATCH_SIZE = 50
+TRACE_FLUSH_INTERVAL = 1.0
+
+# Archive logcat of each run (adb_logcat_<serial>.log.gz) in gzip blocks of
+# this many bytes of lines, indexed by time, tag and PID
+LOGCAT_BLOCK_SIZE = 256 << 10
+LOGCAT_COMPRESS_LEVEL = 6
+
+# Write results of runs to RESULTS_DB_PATH in batches of this many runs
+RESULTS_BATCH_SIZE = 10
 
 LOGGER_VERBOSE = True
+LOG_CONSOLE_LEVEL = 'DEBUG' if LOGGER_VERBOSE else 'INFO'
+LOG_FILE_LEVEL = 'INFO'         # log.log
+LOG_DEVICE_LEVEL = 'INFO'       # device_<serial>.log of each test
 
 # --------- #
 #   Paths   #
 # --------- #
 LOG_DIR = 'log'
 TESTED_PKGS_PATH = os.path.join(LOG_DIR, "tested_pkgs")
+GRAPH_STORE_DIR = os.path.join(LOG_DIR, "graphs")
+GRAPH_INDEX_PATH = os.path.join(GRAPH_STORE_DIR, "index.json.gz")
+RESULTS_DB_PATH = os.path.join(LOG_DIR, "results.db")
+LOG_INDEX_PATH = os.path.join(LOG_DIR, "log_index.json.gz")
 
 
 # ------------- #
@@ -38,6 +124,7 @@ AAPT = 'aapt'
 #   Patterns and Constants   #
 # -------------------------- #
 DELIMITER = "___" #should confirm if it is unique
+STATE_DELIMITER = "#"   # Between an Activity name and its screen hash
 TIMEOUT_EXCEPTION = "TIMEOUT"
 NOT_FOREGROUND_EXCEPTION = "PACKAGE_NOT_FOREGROUND"
 INSTALL_FAILED_EXCEPTION = "INSTALL_FAILED"
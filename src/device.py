@@ -5,14 +5,15 @@
 
 import os
 import sys
+import json
 import random
 import string
 from datetime import datetime
-from time import sleep
+from time import sleep, time
 from threading import Thread
+from collections import deque
 from uiautomator import Device
 import networkx as nx
-from networkx.drawing.nx_agraph import to_agraph
 
 # Local Packages
 import src.config as conf
@@ -20,6 +21,17 @@ import src.commons as commons
 import src.adb_utils as adb
 import src.aapt_utils as aapt
 import src.uiautomator_utils as ua_utils
+import src.actions as actions
+import src.graph_store as graph_store
+import src.trace as trace
+import src.results_db as results_db
+from src.frontier import Frontier
+from src.allocator import BudgetAllocator
+from src.ssi import SsiMonitor
+from src.divergence import DivergenceTracker
+from src.matcher import ElementIndex, get_screen_size
+from src.renderer import GraphRenderer
+from src.logcat_archive import ArchiveWriter, ARCHIVE_SUFFIX
 from src.logger import Logger
 
 
@@ -27,22 +39,37 @@ class DeviceDriver:
     _instance = None
 
     @staticmethod
-    def get_instance():
+    def get_instance(log_dir: str = None):
         if DeviceDriver._instance == None:
-            DeviceDriver()
+            DeviceDriver(log_dir)
         return DeviceDriver._instance
 
-    def __init__(self):
+    def __init__(self, log_dir: str = None):
         if DeviceDriver._instance != None:
             msg = "Singleton class cannot be instantiated more than once."
             raise Exception(msg)
             
-        self.cur_activity = {}      # {d_serial: current activity name}
-        self.root_activity = {}     # {d_serial: root activity name}
+        self.cur_activity = {}      # {d_serial: current state name}
+        self.root_activity = {}     # {d_serial: root state name}
         self._nth_try = {}          # {d_serial: nth try for the same app}
         self._apk_running = {}      # {d_serial: APK path}
         self._ua_devices = {}       # {d_serial: Device}
         self._graphs = {}           # {d_serial: nx.DiGraph}
+        self._frontiers = {}        # {d_serial: Frontier}
+        self._duplicates = {}       # {d_serial: # of elements seen again}
+        self._collisions = {}       # {d_serial: # of signatures shared}
+        self._signatures = {}       # {d_serial: {Activity: {sig: node}}}
+        self._screens = {}          # {d_serial: (state, UIs, dump time)}
+        self._started = {}          # {d_serial: time testing started}
+        self._rpcs = {}             # {d_serial: [RPCs per action]}
+        self._last_node = {}        # {d_serial: node traveled last}
+        self._recoveries = {}       # {d_serial: # of relaunches in a run}
+        self._memory = {}           # {d_serial: nx.DiGraph of past runs}
+        self._ssi_monitors = {}     # {d_serial: SsiMonitor}
+        self._allocators = {}       # {d_serial: BudgetAllocator}
+        self._traces = {}           # {d_serial: TraceWriter of the run}
+        self._divergence = None     # DivergenceTracker of the run
+        self._renderer = GraphRenderer()
         self._random_text = ''      # For EditText UI to type same text
         
         self._logger = Logger.get_instance()
@@ -55,11 +82,15 @@ class DeviceDriver:
         if conf.MODE_FOLLOWER_LEADER:
             self.leader_device = self._select_leader()
         
-        # Create a log directory
+        # Create a log directory, or keep writing to the given one
         if not os.path.isdir(conf.LOG_DIR):
             os.mkdir(conf.LOG_DIR)
-        self._log_dir = os.path.join(conf.LOG_DIR, str(datetime.now()))
-        os.mkdir(self._log_dir)
+        if log_dir is None:
+            self._log_dir = os.path.join(conf.LOG_DIR, str(datetime.now()))
+            os.mkdir(self._log_dir)
+        else:
+            self._log_dir = log_dir
+        self._logger.set_device_log_dir(self._log_dir)
 
         DeviceDriver._instance = self
 
@@ -73,6 +104,8 @@ class DeviceDriver:
         Prepare device
         '''
         self._apk_running[d_serial] = apk
+        self._logger.bind(d_serial, package=aapt.get_package_name(apk), 
+                run=nth_try, phase='prepare')
         self._reset_device(d_serial)
         self._install_apk(d_serial, apk)
         self._nth_try[d_serial] = str(nth_try)
@@ -84,11 +117,20 @@ class DeviceDriver:
         nth_log_dir = os.path.join(apk_log_dir, str(nth_try))
         if not os.path.isdir(nth_log_dir):
             os.mkdir(nth_log_dir)
+
+        # Start over a run left unfinished by a test resumed
+        for name in os.listdir(nth_log_dir):
+            if '_'+d_serial+'.' in name:
+                os.remove(os.path.join(nth_log_dir, name))
+        self._traces[d_serial] = trace.TraceWriter(
+                self.get_run_log_path(d_serial, 'trace.jsonl'),
+                self.get_run_log_path(d_serial, 'uis_traversed.log'))
         
     def prepare_device_all(self, apk:str, nth_try: int=0) -> None:
         '''
         Prepare devices
         '''
+        self._divergence = DivergenceTracker(self.leader_device)
         threads=[]
         for d_serial in self.devices.keys():
             thread = Thread(target = self.prepare_device, 
@@ -102,6 +144,13 @@ class DeviceDriver:
         Initialize root activity and grant permissions 
         '''
         while not self.check_foreground_package(d_serial): sleep(1)
+        self._logger.bind(d_serial, phase='test')
+        self._traces[d_serial].event(trace.PHASE, phase='test')
+        self._started[d_serial] = time()
+        if conf.MONITOR_SSI:
+            self._ssi_monitors[d_serial] = SsiMonitor(d_serial, 
+                    aapt.get_package_name(self._apk_running[d_serial]))
+            self._ssi_monitors[d_serial].start()
         self.allow_permission_popup(d_serial)
         self.add_new_activity(d_serial)
 
@@ -121,14 +170,45 @@ class DeviceDriver:
         Clean device after done with testing
         '''
         pkg_name = aapt.get_package_name(self._apk_running[d_serial])
+        self._logger.bind(d_serial, phase='clean')
+        self._traces[d_serial].event(trace.PHASE, phase='clean')
 
         # Write a log
-        self._write_log(d_serial, self._apk_running[d_serial])
+        failure, crash = self._write_log(d_serial, self._apk_running[d_serial])
+        ssis, ssi_rate = self._stop_ssi_monitor(d_serial)
+        self._save_graph(d_serial)
+        minutes = (time() - self._started.get(d_serial, time())) / 60
+        actions = [node for node in self.get_visited_nodes(d_serial) 
+                    if conf.DELIMITER in node]
+        self._write_summary(d_serial, actions, ssis, ssi_rate, failure, 
+                crash)
+        self._write_allocation(d_serial)
+        self._write_divergence(d_serial)
+        self._logger.info("%s: %d actions, %d duplicate elements skipped, " \
+                    "%d signature collisions", d_serial, len(actions), 
+                    self._duplicates[d_serial], self._collisions[d_serial],
+                    serial=d_serial)
+        self._logger.info("%s: %.1f UIs tested per minute (navigation: %s)",
+                    d_serial, len(actions) / minutes if minutes > 0 else 0,
+                    conf.NAVIGATION, serial=d_serial)
+        states = [node for node, attr in self._graphs[d_serial].nodes(data=True)
+                    if attr['type'] == "activity"]
+        self._logger.info("%s: %d states reached (%.1f per minute)", 
+                    d_serial, len(states), 
+                    len(states) / minutes if minutes > 0 else 0, 
+                    serial=d_serial)
+        rpcs = self._rpcs[d_serial]
+        self._logger.info("%s: %d RPCs for %d actions (%.2f per action)", 
+                    d_serial, sum(rpcs), len(rpcs),
+                    sum(rpcs) / len(rpcs) if rpcs else 0, serial=d_serial)
+        self._logger.info("%s: %d recoveries", d_serial, 
+                    self._recoveries[d_serial], serial=d_serial)
 
         # Draw tested UI graph
         self._draw_graph(d_serial)
 
-        # Uninstall the app or just stop
+        # Uninstall the app or just stop, and delete input scripts pushed
+        adb.remove_pushed_scripts(d_serial)
         if conf.KEEP_INSTALLED_APP:
             adb.force_stop(d_serial, pkg_name)
         else:
@@ -138,8 +218,12 @@ class DeviceDriver:
         commons.write_tested_pkg(pkg_name)
 
         # Make the device idle
+        self._traces[d_serial].close()
         self._nth_try[d_serial] = None
         self._graphs[d_serial] = None
+        self._frontiers[d_serial] = None
+        self._screens[d_serial] = None
+        self._memory[d_serial] = None
         self.cur_activity[d_serial] = None
         if last:
             self._apk_running[d_serial] = None
@@ -165,8 +249,7 @@ class DeviceDriver:
                 'com.android.packageinstaller:id/permission_allow_button',
                 'com.android.permissioncontroller:id/permission_allow_button']
         
-        xml = self._ua_devices[d_serial].dump()
-        uis = ua_utils.get_clickable_list(ua_utils.get_current_tree(xml))
+        uis = self._get_screen(d_serial)[1]
         
         # Allow Permission Popup if found
         for ui in uis:
@@ -176,6 +259,7 @@ class DeviceDriver:
                                 className=ui['className'], \
                                 resourceId=ui['resourceId'])
                 ui_element.click.wait()
+                self._invalidate_screen(d_serial)
 
                 # Check if other permission popup exists
                 self.allow_permission_popup(d_serial)
@@ -188,16 +272,55 @@ class DeviceDriver:
         pkg_name = aapt.get_package_name(self._apk_running[d_serial])
         fg_pkg_name = adb.get_foreground_package_name(d_serial)
         return pkg_name == fg_pkg_name
-                
+
+    def get_current_state(self, d_serial: str) -> str:
+        '''
+        Get the state of the current screen (see conf.STATE_ABSTRACTION)
+        '''
+        return self._get_screen(d_serial)[0]
+
+    def get_current_uis(self, d_serial: str, fresh: bool = False) -> list:
+        '''
+        Get clickable UIs of the current screen, dumped again if fresh (the
+        screen may have changed without the driver knowing)
+        '''
+        if fresh:
+            self._invalidate_screen(d_serial)
+        return self._get_screen(d_serial)[1]
+
+    def get_run_log_path(self, d_serial: str, name: str) -> str:
+        '''
+        Get the path of a log file of the current run (e.g., name.log ->
+        log/date_time/pkg_name/run_number/name_serial.log)
+        '''
+        base, ext = os.path.splitext(name)
+        return os.path.join(self._log_dir, 
+                aapt.get_package_name(self._apk_running[d_serial]), 
+                self._nth_try[d_serial], base+'_'+d_serial+ext)
+
+    def is_root_activity(self, d_serial: str, root_state: str) -> bool:
+        '''
+        Check if the device is on the Activity of the given root state
+        '''
+        return root_state is not None and \
+            root_state.split(conf.STATE_DELIMITER)[0] == \
+                adb.get_foreground_activity_name(d_serial)
     
     def add_new_activity(self, d_serial: str, pre_node=None):
         '''
-        Add new activity found to graphs and change current activity
+        Add new state found to graphs and change current state
+
+        A state seen before keeps the UIs added on its first visit.
         '''
-        self.cur_activity[d_serial] = \
-                adb.get_foreground_activity_name(d_serial)   
+        state, ui_dics = self._get_screen(d_serial)
+        if state != self.cur_activity.get(d_serial):
+            self._traces[d_serial].event(trace.STATE, state=state, 
+                    previous=self.cur_activity.get(d_serial))
+        self.cur_activity[d_serial] = state
         
         if self.cur_activity[d_serial] in self._graphs[d_serial]:
+            if pre_node != None and pre_node in self._graphs[d_serial]:
+                self._graphs[d_serial].add_edge(pre_node, state)
             return
         
         cur_package = adb.get_foreground_package_name(d_serial)
@@ -206,32 +329,61 @@ class DeviceDriver:
             return
         
         if cur_package not in self._graphs[d_serial]:
-            self._graphs[d_serial].add_node(cur_package, 
+            self._add_node(d_serial, cur_package, 
                     **{"type": "package", "visited": True})
-            self._graphs[d_serial].add_node(self.cur_activity[d_serial], 
+            self._add_node(d_serial, self.cur_activity[d_serial], 
                     **{"type": "activity", "visited": True})
             self._graphs[d_serial].add_edge(cur_package, 
                     self.cur_activity[d_serial])
         else:
-            self._graphs[d_serial].add_node(self.cur_activity[d_serial], 
+            self._add_node(d_serial, self.cur_activity[d_serial], 
                     **{"type": "activity", "visited": False})
             if pre_node != None:
                 self._graphs[d_serial].add_edge(pre_node, 
                         self.cur_activity[d_serial])
-        
-        xml = self._ua_devices[d_serial].dump()
-        ui_dics = ua_utils.get_clickable_list(ua_utils.get_current_tree(xml))
 
-        for idx, ui in enumerate(ui_dics):
+        self._update_attr(d_serial, self.cur_activity[d_serial], 
+                "screenSize", "%dx%d" %get_screen_size(ui_dics))
+
+        # Skip identical UIs of the screen, and UIs tested already in another
+        # state of the Activity (e.g., a toolbar shown with every tab)
+        stats = {}
+        signed = ua_utils.assign_signatures(ui_dics, stats)
+        seen = self._signatures[d_serial].setdefault(
+                state.split(conf.STATE_DELIMITER)[0], {})
+        self._duplicates[d_serial] += stats['duplicates']
+        self._collisions[d_serial] += stats['collisions']
+        for signature, ui in signed:
+            node_name = self.cur_activity[d_serial] + conf.DELIMITER \
+                    + signature
+            if node_name in self._graphs[d_serial]:
+                continue
+            tested = seen.get(signature)
+            if tested in self._graphs[d_serial] \
+                    and self._graphs[d_serial]._node[tested]['visited']:
+                self._duplicates[d_serial] += 1
+                continue
+            seen.setdefault(signature, node_name)
             dic = dict(ui.items() | {"type": "element", "visited": False,
                 "second_visit": False}.items())
-            node_name = self.cur_activity[d_serial] + conf.DELIMITER \
-                    + ui['className'].split('.')[-1].lower() + str(idx)
-            self._graphs[d_serial].add_node(node_name, **dic)
+            self._add_node(d_serial, node_name, **dic)
             self._graphs[d_serial].add_edge( \
                     self.cur_activity[d_serial], node_name)
     
     def travel_node(self, d_serial: str, node, random_mode= False):
+        '''
+        Travel the given node, charging the time spent and the states or 
+        UIs found to the state of the node
+        '''
+        started, n_nodes = time(), len(self._graphs[d_serial])
+        try:
+            self._travel_node(d_serial, node, random_mode)
+        finally:
+            self._allocators[d_serial].record(node.split(conf.DELIMITER)[0], 
+                    time() - started, 
+                    max(0, len(self._graphs[d_serial]) - n_nodes))
+
+    def _travel_node(self, d_serial: str, node, random_mode= False):
         '''
         Travel the given node
         '''
@@ -240,16 +392,24 @@ class DeviceDriver:
             raise Exception(conf.NOT_FOREGROUND_EXCEPTION)
     
         self.add_new_activity(d_serial)
-        prev_activity = adb.get_foreground_activity_name(d_serial)
+        prev_activity = self.cur_activity[d_serial]
+        self._last_node[d_serial] = node
+        if self._ssi_monitors.get(d_serial):
+            self._ssi_monitors[d_serial].mark_action(node)
 
         # Print UI node testing
         if not conf.MODE_FOLLOWER_LEADER and conf.DELIMITER in node:
-            self._logger.debug('%s, %s ---> %s' %(d_serial, \
-                                adb.get_foreground_activity_name(d_serial), 
-                                str(node.split(conf.DELIMITER)[-1])))
+            self._logger.debug('%s, %s ---> %s', d_serial, prev_activity, 
+                    node.split(conf.DELIMITER)[-1], serial=d_serial)
         if not random_mode:
             if not self._visit_node(d_serial, node):
                 self.add_new_activity(d_serial, node)
+
+                # The rest of the previous state is reached again with 
+                # navigate_to_frontier() once the new state is tested
+                if conf.NAVIGATION == "shortest_path" \
+                        and not conf.MODE_FOLLOWER_LEADER:
+                    return
     
                 if len(self.get_next_nodes(d_serial, prev_activity)) != 0 and \
                     not self._graphs[d_serial]._node[node]['second_visit']:
@@ -271,7 +431,7 @@ class DeviceDriver:
                 self.cur_activity[d_serial] = \
                         self._next_activity(d_serial)
             if len(self.get_next_nodes(d_serial, self.cur_activity[d_serial])) \
-                    == 0 and not self.cur_activity[d_serial] == root_activity:
+                    == 0 and not self.is_root_activity(d_serial, root_activity):
                 self.press_back(d_serial)
     
     def travel_node_all(self, node, random_mode) -> None:
@@ -280,42 +440,184 @@ class DeviceDriver:
         '''
         # Print UI node testing
         if conf.DELIMITER in node:
-            self._logger.debug('%s ---> %s' \
-                    %(adb.get_foreground_activity_name(self.leader_device), 
-                    str(node.split(conf.DELIMITER)[-1])))
+            self._logger.debug('%s ---> %s', 
+                    self.get_current_state(self.leader_device), 
+                    node.split(conf.DELIMITER)[-1])
         else:
-            self._logger.debug('%s' \
-                    %(adb.get_foreground_activity_name(self.leader_device)))
+            self._logger.debug('%s', 
+                    self.get_current_state(self.leader_device))
 
         threads=[]
-        for d_serial in self.devices.keys():
+        for d_serial in self._active_devices():
             thread = Thread(target = self.travel_node, 
                               args = (d_serial, node, random_mode))
             threads.append(thread)
         commons.thread_start(threads)
         commons.thread_join(threads)
         self._random_text = ''
+
+        # Compare screens of followers with the leader's
+        leader_screen = self._get_screen(self.leader_device)
+        for d_serial in self._active_devices():
+            if d_serial == self.leader_device:
+                continue
+            divergence = self._divergence.compare(node, leader_screen, 
+                    d_serial, self._get_screen(d_serial))
+            if divergence:
+                self._logger.debug('%s: diverged at step %d (missing: %d, ' \
+                        'extra: %d, changed: %d)', d_serial, 
+                        divergence['step'], len(divergence['missing']), 
+                        len(divergence['extra']), len(divergence['changed']), 
+                        serial=d_serial)
+        self._divergence.next_step()
     
     def press_back(self, d_serial: str) -> None:
         '''
-        Press back button to goto previous activity
+        Press back button to goto previous state
         '''
-        prev_activity = adb.get_foreground_activity_name(d_serial)
-        self._ua_devices[d_serial].press.back()
-        while prev_activity == adb.get_foreground_activity_name(d_serial):
+        prev_activity = self.get_current_state(d_serial)
+        if adb.failed_steps(adb.press_back_chain(d_serial, 1, wait=0)):
+            self._ua_devices[d_serial].press.back()
+        self._invalidate_screen(d_serial)
+        while prev_activity == self.get_current_state(d_serial):
             if not self.check_foreground_package(d_serial):
                 raise Exception(conf.NOT_FOREGROUND_EXCEPTION)
             sleep(1)
-        self.cur_activity[d_serial] = \
-                adb.get_foreground_activity_name(d_serial)
+            self._invalidate_screen(d_serial)
+        self.cur_activity[d_serial] = self.get_current_state(d_serial)
+
 
+    def recover(self, d_serial: str) -> bool:
+        '''
+        Bring the app back after it crashed or was left, by pressing back or
+        relaunching it, recording the failure on the node traveled last, so
+        that testing goes on in the same run
+
+        :return: True if the app is on foreground again
+        '''
+        if self._recoveries[d_serial] >= conf.MAX_RECOVERIES_PER_RUN:
+            return False
+        self._recoveries[d_serial] += 1
+
+        node = self._last_node[d_serial]
+        if node in self._graphs[d_serial]:
+            attr = self._graphs[d_serial]._node[node]
+            self._update_attr(d_serial, node, "failures", 
+                    attr.get("failures", 0) + 1)
+            self._update_attr(d_serial, node, "visited", True)
+        self._logger.info("%s: app left after %s, relaunching (%d/%d)", 
+                d_serial, node, self._recoveries[d_serial], 
+                conf.MAX_RECOVERIES_PER_RUN, serial=d_serial)
+
+        # Backing out of another app (e.g., a browser opened by a link) is
+        # cheaper than relaunching, and keeps the state of the app; one
+        # press at a time, not to back out of the app once it is back
+        backed = False
+        for _ in range(conf.RECOVERY_BACK_PRESSES):
+            if adb.failed_steps(adb.press_back_chain(d_serial, 1)):
+                break
+            if self.check_foreground_package(d_serial):
+                backed = True
+                break
+        self._invalidate_screen(d_serial)
+        if not backed:
+            pkg_name = aapt.get_package_name(self._apk_running[d_serial])
+            adb.bring_to_foreground(d_serial, pkg_name)
+            sleep(conf.WAIT_AFTER_APP_LAUNCH)
+            self._invalidate_screen(d_serial)
+            if not self.check_foreground_package(d_serial):
+                return False
+        if self._ssi_monitors.get(d_serial):
+            self._ssi_monitors[d_serial].update_pids()
+        self.allow_permission_popup(d_serial)
+        self.add_new_activity(d_serial)
+        return True
+
+    def recover_all(self) -> bool:
+        '''
+        Recover all devices whose app is not on foreground
+
+        Followers that cannot be recovered stop following the leader.
+
+        :return: True if the app is on foreground of the leader device
+        '''
+        recovered = {}
+        def recover(d_serial):
+            recovered[d_serial] = self.recover(d_serial)
+
+        threads=[]
+        for d_serial in self._active_devices():
+            if self.check_foreground_package(d_serial):
+                continue
+            thread = Thread(target = recover, args = (d_serial,))
+            threads.append(thread)
+        commons.thread_start(threads)
+        commons.thread_join(threads)
+        for d_serial, success in recovered.items():
+            if not success and d_serial != self.leader_device \
+                    and self._divergence is not None:
+                self._logger.warning('%s: not recovered, pruned', d_serial,
+                        serial=d_serial)
+                self._divergence.prune(d_serial)
+        return recovered.get(self.leader_device, True) and \
+                self.check_foreground_package(self.leader_device)
+
+    def navigate_to_frontier(self, d_serial: str) -> bool:
+        '''
+        Go to the nearest state with untested UIs by replaying the shortest
+        recorded path to it, from the current state or, if cheaper, from
+        the root state after relaunching the app
+
+        :return: True if the device is on a state with untested UIs, False
+                 if it is not or a step of the path failed
+        '''
+        graph = self._graphs[d_serial]
+        targets = set(state for state 
+                in self._frontiers[d_serial].pending_activities()
+                if not self.is_exhausted(d_serial, state))
+        if not targets:
+            return False
+
+        current = self.get_current_state(d_serial)
+        path = self._shortest_path(d_serial, current, targets)
+        root_path = self._shortest_path(d_serial, 
+                self.root_activity[d_serial], targets)
+        if root_path is not None and (path is None or 
+                len(root_path) // 2 + conf.RELAUNCH_COST < len(path) // 2):
+            self._relaunch(d_serial)
+            path = root_path
+        if path is None:
+            return False
+
+        # Replay actions on the elements of the path at once
+        steps, step_nodes = [], []
+        for node in path[1::2]:
+            node_steps = actions.get_steps(graph._node[node], 
+                    self._random_text, wait=conf.REPLAY_STEP_WAIT)
+            steps += node_steps
+            step_nodes += [node] * len(node_steps)
+        self._logger.debug('%s: navigating to %s in %d actions', 
+                d_serial, path[-1], len(path) // 2, serial=d_serial)
+        failed = adb.failed_steps(adb.run_input_script(d_serial, steps))
+        self._invalidate_screen(d_serial)
+        self.allow_permission_popup(d_serial)
+        self.add_new_activity(d_serial)
+        if failed:
+            # The device is not where the path leads, so the caller falls
+            # back to pressing back from wherever it is
+            self._logger.warning('%s: navigation to %s failed at %s', 
+                    d_serial, path[-1], step_nodes[failed[0]], 
+                    serial=d_serial)
+            return False
+        return len(self.get_next_nodes(d_serial, 
+                self.cur_activity[d_serial])) != 0
 
     def press_back_all(self) -> None:
         '''
         Press back button to goto previous activity for all devices
         '''
         threads=[]
-        for d_serial in self.devices.keys():
+        for d_serial in self._active_devices():
             thread = Thread(target = self.press_back, 
                               args = (d_serial,), kwargs={})
             threads.append(thread)
@@ -326,17 +628,84 @@ class DeviceDriver:
         '''
         Get next nodes to test
         '''
-        nodes = []
-        if activity == None:
-            return nodes
-        for node, attr in sorted(self._graphs[d_serial].nodes(data=True)):
-            if not node.startswith(activity):
-                continue
-            if attr['visited']:
-                continue
-            nodes.append(node)
-        return nodes
+        if self.is_exhausted(d_serial, activity):
+            return []
+        return self._frontiers[d_serial].next_nodes(activity)
+
+    def is_exhausted(self, d_serial: str, state: str = None) -> bool:
+        '''
+        Check if the state (the current one if None) used up its budget
+        '''
+        if state is None:
+            state = self.cur_activity[d_serial]
+        return self._allocators[d_serial].is_exhausted(state)
     
+    def prioritize(self, d_serial: str, nodes: list) -> list:
+        '''
+        Order nodes so that ones like those that caused new SSIs come first,
+        then ones never or rarely visited in previous runs (the order is 
+        kept among equal nodes)
+        '''
+        memory = self._memory.get(d_serial)
+        gains = {}
+        if conf.SSI_GUIDED and self._ssi_monitors.get(d_serial):
+            # The same UI may be on other states (e.g., a toolbar button)
+            for node, gain in self._ssi_monitors[d_serial].get_gains().items():
+                signature = node.split(conf.DELIMITER)[-1]
+                gains[signature] = gains.get(signature, 0) + gain
+
+        def key(node: str) -> tuple:
+            gain = gains.get(node.split(conf.DELIMITER)[-1], 0)
+            if conf.SSI_GUIDED:
+                gain += graph_store.get_ssi(memory, node)
+            return (-gain, graph_store.get_hits(memory, node))
+
+        if not memory and not gains:
+            return nodes
+        return sorted(nodes, key=key)
+
+    def get_log_dir(self) -> str:
+        return self._log_dir
+
+    def get_run_summary(self, d_serial: str, apk: str, nth_try: int) -> tuple:
+        '''
+        Get (UIs tested, SSIs found) in the given run of the app
+        '''
+        path = os.path.join(self._log_dir, aapt.get_package_name(apk), 
+                str(nth_try), 'run_summary_'+d_serial+'.json')
+        if not os.path.exists(path):
+            return set(), set()
+        with open(path, 'r', encoding='utf8') as f:
+            summary = json.load(f)
+        return set(summary['uis']), set(tuple(ssi) for ssi in summary['ssis'])
+
+    def get_run_record(self, d_serial: str, apk: str, nth_try: int) -> dict:
+        '''
+        Get the result of the given run of the app (see results_db), or 
+        None if the run did not finish
+        '''
+        path = os.path.join(self._log_dir, aapt.get_package_name(apk), 
+                str(nth_try), 'run_summary_'+d_serial+'.json')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf8') as f:
+            return json.load(f).get('record')
+
+    def close(self) -> None:
+        '''
+        Wait until graphs of all runs are drawn
+        '''
+        if self._renderer.get_depth():
+            self._logger.info("Drawing %d graphs...", 
+                    self._renderer.get_depth())
+        self._renderer.close()
+
+    def release_device(self, d_serial: str) -> None:
+        '''
+        Make the device idle after done with all runs of an app
+        '''
+        self._apk_running[d_serial] = None
+
     def get_idle_device(self, apk: str) -> str:
         '''
         Get an idle device
@@ -353,31 +722,26 @@ class DeviceDriver:
         '''
         Get visited nodes
         '''
-        nodes = []
-        for node, attr in sorted(self._graphs[d_serial].nodes(data=True)):
-            if not attr['visited']:
-                continue
-            nodes.append(node)
-        return nodes
+        return self._frontiers[d_serial].visited_nodes()
 
     def print_settings(self) -> None:
         '''
         Print test settings
         '''
         self._logger.info('')
-        self._logger.info("================== %s ==================" \
-                    %(str(datetime.now())))
+        self._logger.info("================== %s ==================", 
+                    str(datetime.now()))
         self._logger.info("[ New Test ]")
-        self._logger.info(" - Follow-the-leader mode: %s" \
-                    %(str(conf.MODE_FOLLOWER_LEADER)))
-        self._logger.info(" - Random mode: %s" %(str(conf.MODE_RANDOM)))
+        self._logger.info(" - Follow-the-leader mode: %s", 
+                    str(conf.MODE_FOLLOWER_LEADER))
+        self._logger.info(" - Random mode: %s", str(conf.MODE_RANDOM))
         self._logger.info(" - Keep apps installed (no uninstall for " +\
-                    "login-requied apps): %s" %(str(conf.KEEP_INSTALLED_APP)))
+                    "login-requied apps): %s", str(conf.KEEP_INSTALLED_APP))
         self._logger.info(" - Connected devices:")
         for idx, d in enumerate(self.devices.items()):
-            device_str = "     %d. %s (Android version: %s)" %(idx, d[0], d[1])
-            device_str += " <- leader" if d[0] == self.leader_device else ""
-            self._logger.info(device_str)
+            self._logger.info("     %d. %s (Android version: %s)%s", idx, 
+                    d[0], d[1], 
+                    " <- leader" if d[0] == self.leader_device else "")
             
     # --------------------- #
     #   Private Funcsions   #
@@ -396,6 +760,20 @@ class DeviceDriver:
         # Reset UI Automator Device and DiGraph
         self._ua_devices[d_serial] = Device(d_serial)
         self._graphs[d_serial] = nx.DiGraph()
+        self._frontiers[d_serial] = Frontier()
+        self._duplicates[d_serial] = 0
+        self._collisions[d_serial] = 0
+        self._signatures[d_serial] = {}
+        self._rpcs[d_serial] = []
+        self._last_node[d_serial] = None
+        self._recoveries[d_serial] = 0
+        self._allocators[d_serial] = BudgetAllocator()
+
+        # Load UI graphs of previous runs
+        self._memory[d_serial] = None
+        if conf.USE_EXPLORATION_MEMORY:
+            self._memory[d_serial] = graph_store.load_graph(
+                    self._memory_path(d_serial))
  
     def _install_apk(self, d_serial: str, apk_path: str) -> None: 
         '''
@@ -411,15 +789,16 @@ class DeviceDriver:
 
             if conf.KEEP_INSTALLED_APP:
                 adb.bring_to_foreground(d_serial, pkg_name)
-                self._logger.info("%s is ready on %s." %(pkg_name, d_serial))
+                self._logger.info("%s is ready on %s.", pkg_name, d_serial,
+                        serial=d_serial)
                 sleep(conf.WAIT_AFTER_APP_LAUNCH)
                 return
             else:
                 adb.uninstall(d_serial, pkg_name)
         adb.install(d_serial, apk_path)
         adb.bring_to_foreground(d_serial, pkg_name)
-        self._logger.info("%s is installed and ready on %s." \
-                        %( pkg_name, d_serial))
+        self._logger.info("%s is installed and ready on %s.", 
+                        pkg_name, d_serial, serial=d_serial)
         sleep(conf.WAIT_AFTER_APP_LAUNCH)
  
     def _find_devices(self) -> dict:
@@ -450,159 +829,444 @@ class DeviceDriver:
                 return d_serial
         sys.exit('[!] Invalid device was selected.')
 
-    def _write_log(self, d_serial: str, apk: str) -> None:
+    def _write_log(self, d_serial: str, apk: str) -> tuple:
         '''
-        Write a log with error messages if failed
+        Write a log with error messages if failed, and get (failure # or 
+        None, crash signature or None)
          - Failure #:
             1. The device is disconnected (hung).
-            2. The app is not on foreground.
+            2. The app is not on foreground (relaunches during the run
+               are reported as "recovered: N")
             3. At least one runtime error found in the logs
             4. Traversed UIs are different with leader device's graph
         '''
         log_file = os.path.join(self._log_dir, 'results.log')
+        pkg_name = aapt.get_package_name(apk)
+        apk_log = os.path.join(self._log_dir, pkg_name, 
+                    self._nth_try[d_serial], 
+                    'adb_logcat_'+d_serial+ARCHIVE_SUFFIX)
     
-        hung = False
-        if d_serial in commons.get_device_serials():
-            dump = adb.logcat_dump(d_serial)
-        else:
-            hung = True
-            dump = "Device not found in adb devices: " + d_serial
+        # Stream logcat to the archive, keeping only lines of AndroidRuntime
+        hung = d_serial not in commons.get_device_serials()
+        runtime = []
+        with ArchiveWriter(apk_log) as archive:
+            if hung:
+                archive.write("Device not found in adb devices: " + d_serial)
+            else:
+                for line in adb.logcat_lines(d_serial):
+                    archive.write(line)
+                    if "AndroidRuntime" in line:
+                        runtime.append(line)
     
-        pkg_name = aapt.get_package_name(apk)
         nodes = self.get_visited_nodes(d_serial)
 
-        succ_msg = "%s SUCCESS on %s, try: "+self._nth_try[d_serial]+"\n" 
-        fail_msg = "%s FAILED (%d) on %s, try: "+self._nth_try[d_serial]+"\n"
+        # The app may have been left and relaunched during the run
+        recoveries = self._recoveries[d_serial]
+        end_msg = ", recovered: %d\n" %(recoveries) if recoveries else "\n"
+        succ_msg = "%s SUCCESS on %s, try: "+self._nth_try[d_serial]+end_msg
+        fail_msg = "%s FAILED (%d) on %s, try: "+self._nth_try[d_serial]+end_msg
         
+        failure = None
         if hung:
-            with open(log_file, 'a', encoding='utf8') as log:
-                log.write(fail_msg %(apk, 1, d_serial))
+            failure = 1
         elif not pkg_name == adb.get_foreground_package_name(d_serial):
-            with open(log_file, 'a', encoding='utf8') as log:
-                log.write(fail_msg %(apk, 2, d_serial))
-        elif dump.find("E/AndroidRuntime") >= 0:
-            with open(log_file, 'a', encoding='utf8') as log:
-                log.write(fail_msg %(apk, 3, d_serial))
-        elif conf.MODE_FOLLOWER_LEADER and not nx.is_isomorphic(
-                self._graphs[self.leader_device], self._graphs[d_serial]):
-            with open(log_file, 'a', encoding='utf8') as log:
-                log.write(fail_msg %(apk, 4, d_serial))
-        else:
-            with open(log_file, 'a', encoding='utf8') as log:
-                log.write(succ_msg %(apk, d_serial))
-    
-        apk_log = os.path.join(self._log_dir, aapt.get_package_name(apk), 
-                    self._nth_try[d_serial], 'adb_logcat_'+d_serial+'.log')
-        with open(apk_log, 'w', encoding='utf8') as log_f:
-            log_f.write(dump)
+            failure = 2
+        elif any("E/AndroidRuntime" in line or " E AndroidRuntime" in line
+                for line in runtime):
+            failure = 3
+        elif conf.MODE_FOLLOWER_LEADER and \
+                self._divergence.is_diverged(d_serial):
+            failure = 4
+        self._traces[d_serial].event(trace.VERDICT, failure=failure, 
+                nodes=len(nodes), recoveries=recoveries)
+        commons.append_line(log_file, succ_msg %(apk, d_serial) 
+                if failure is None else fail_msg %(apk, failure, d_serial))
+        return failure, results_db.crash_signature("".join(runtime),
+                pkg_name) if failure else None
+
+    def _stop_ssi_monitor(self, d_serial: str) -> tuple:
+        '''
+        Stop streaming logcat and record new SSIs caused by each node
+
+        :return: (SSIs seen, new SSIs per minute or None if not monitored)
+        '''
+        monitor = self._ssi_monitors.pop(d_serial, None)
+        if monitor is None:
+            return set(), None
+        monitor.stop()
+        for node, gain in monitor.get_gains().items():
+            if node in self._graphs[d_serial]:
+                self._update_attr(d_serial, node, "ssi", gain)
+        self._logger.info("%s: %d SSIs (%.1f new per minute, guided: %s)", 
+                d_serial, len(monitor.get_seen()), monitor.get_rate(),
+                conf.SSI_GUIDED, serial=d_serial)
+        return monitor.get_seen(), monitor.get_rate()
+
+    def _write_summary(self, d_serial: str, uis: list, ssis: set, 
+                       ssi_rate: float, failure: int, crash: str) -> None:
+        '''
+        Write UIs tested and SSIs found in the run (see get_run_summary()),
+        and the result of the run (see get_run_record()) with the rate of
+        new SSIs, to compare guided runs with the random baseline
+        '''
+        path = os.path.join(self._log_dir, 
+                aapt.get_package_name(self._apk_running[d_serial]), 
+                self._nth_try[d_serial], 'run_summary_'+d_serial+'.json')
+        started = self._started.get(d_serial, time())
+        record = {'campaign': os.path.basename(self._log_dir),
+                'apk': self._apk_running[d_serial],
+                'package': aapt.get_package_name(self._apk_running[d_serial]),
+                'serial': d_serial, 'android_version': self.devices[d_serial],
+                'run': int(self._nth_try[d_serial]),
+                'verdict': "SUCCESS" if failure is None else "FAILED",
+                'failure': failure, 'started': started, 
+                'duration': time() - started, 'uis': len(uis), 
+                'ssis': len(ssis), 'crash': crash, 
+                'recoveries': self._recoveries[d_serial],
+                'ssi_rate': ssi_rate, 'ssi_guided': conf.SSI_GUIDED 
+                    if ssi_rate is not None else None}
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump({'uis': sorted(uis), 'ssis': sorted(ssis), 
+                    'record': record}, f)
+
+    def _write_divergence(self, d_serial: str) -> None:
+        '''
+        Write where the follower diverged from the leader in the run
+        '''
+        if not conf.MODE_FOLLOWER_LEADER or d_serial == self.leader_device:
+            return
+        path = os.path.join(self._log_dir, 
+                aapt.get_package_name(self._apk_running[d_serial]), 
+                self._nth_try[d_serial], 'divergence_'+d_serial+'.json')
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump(self._divergence.get_report(d_serial), f, indent=1)
+
+    def _active_devices(self) -> list:
+        '''
+        Devices still testing (followers can be pruned once diverged)
+        '''
+        return [d_serial for d_serial in self.devices.keys() 
+                if self._divergence is None or 
+                    not self._divergence.is_pruned(d_serial)]
+
+    def _write_allocation(self, d_serial: str) -> None:
+        '''
+        Write time, actions and discoveries spent on each state of the run
+        '''
+        allocation = self._allocators[d_serial].get_allocation()
+        path = os.path.join(self._log_dir, 
+                aapt.get_package_name(self._apk_running[d_serial]), 
+                self._nth_try[d_serial], 'allocation_'+d_serial+'.json')
+        with open(path, 'w', encoding='utf8') as f:
+            json.dump(allocation, f, indent=1, sort_keys=True)
+        exhausted = [state for state, stat in allocation.items() 
+                if stat['exhausted']]
+        self._logger.info("%s: %d states tested, %d ran out of budget", 
+                d_serial, len(allocation), len(exhausted), serial=d_serial)
+
+    def _save_graph(self, d_serial: str) -> None:
+        '''
+        Save the graph of the run and merge it into the exploration memory
+        '''
+        pkg_name = aapt.get_package_name(self._apk_running[d_serial])
+        meta = {'package': pkg_name, 'serial': d_serial, 
+                'android_version': self.devices[d_serial],
+                'app_version': aapt.get_version_name(
+                    self._apk_running[d_serial]),
+                'run': self._nth_try[d_serial]}
+        graph_store.save_graph(self._graphs[d_serial], 
+                os.path.join(self._log_dir, pkg_name, self._nth_try[d_serial],
+                'ui_graph_'+d_serial+'.json.gz'), meta)
+
+        if not conf.USE_EXPLORATION_MEMORY:
+            return
+        graph_store.update_memory(self._memory_path(d_serial), 
+                self._graphs[d_serial], {'package': pkg_name, 
+                'android_version': self.devices[d_serial]})
+
+    def _memory_path(self, d_serial: str) -> str:
+        return graph_store.memory_path(
+                aapt.get_package_name(self._apk_running[d_serial]), 
+                self.devices[d_serial])
 
     def _draw_graph(self, d_serial: str) -> None:
         '''
-        Draw a graph for the traversed UIs
+        Draw a graph for the traversed UIs from the graph saved, in the 
+        background
         '''
-        graph = self._graphs[d_serial]
-        cPackage = aapt.get_package_name(self._apk_running[d_serial])
-        for node, attr in sorted(graph.nodes(data=True)):
-            if attr['type'] == "package":
-                graph._node[node]['label'] = "ROOT"
-                graph._node[node]['style'] = "filled"
-                graph._node[node]['fillcolor'] = "yellow"
-            elif attr['type'] == "activity":
-                graph._node[node]['label'] = node.split(cPackage)[-1]
-                graph._node[node]['style'] = "filled"
-                graph._node[node]['fillcolor'] = "orange"
-            else:
-                graph._node[node]['label'] = node.split(cPackage)[-1]
-                graph._node[node]['style'] = "filled"
-                graph._node[node]['fillcolor'] = "green"
-                
-            if attr['visited'] == False:
-                graph._node[node]['label'] = node.split(cPackage)[-1]
-                graph._node[node]['style'] = "filled"
-                graph._node[node]['fillcolor'] = "red"
-        
-        graphviz = to_agraph(graph)
-        graphviz.layout('dot')
-        graphviz.draw(os.path.join(self._log_dir, 
-                    aapt.get_package_name(self._apk_running[d_serial]), 
-                    self._nth_try[d_serial], 'ui_graph_'+d_serial+'.pdf'))
+        pkg_name = aapt.get_package_name(self._apk_running[d_serial])
+        depth = self._renderer.submit(self.get_run_log_path(d_serial, 
+                'ui_graph.json.gz'), pkg_name)
+        self._logger.info("%s: %d graphs waiting to be drawn", 
+                    d_serial, depth, serial=d_serial)
         
     def _update_attr(self, d_serial:str, node, attr, value) -> None:
         '''
         Update the addtribute of the node
         '''
         self._graphs[d_serial]._node[node][attr] = value
+        if attr == "visited":
+            self._frontiers[d_serial].update(node, value)
+
+    def _add_node(self, d_serial: str, node, **attr) -> None:
+        '''
+        Add a node to the graph and index it in the frontier
+        '''
+        self._graphs[d_serial].add_node(node, **attr)
+        attr = self._graphs[d_serial]._node[node]
+        activity = node.split(conf.DELIMITER)[0] \
+                if attr['type'] == "element" else None
+        self._frontiers[d_serial].add(node, attr['type'], attr['visited'],
+                activity=activity)
+
+    def _remove_node(self, d_serial: str, node) -> None:
+        '''
+        Remove a node from the graph and the frontier
+        '''
+        self._graphs[d_serial].remove_node(node)
+        self._frontiers[d_serial].remove(node)
+
+    def _shortest_path(self, d_serial: str, source: str, 
+                       targets: set) -> list:
+        '''
+        Find the shortest path [state, element, state, ...] from the source
+        to any of the targets over elements that led to another state
+        '''
+        graph = self._graphs[d_serial]
+        if source not in graph:
+            return None
+        parents = {source: None}
+        queue = deque([source])
+        while queue:
+            state = queue.popleft()
+            if state in targets:
+                path = [state]
+                while parents[path[-1]] is not None:
+                    path.append(parents[path[-1]])
+                return path[::-1]
+            for element in graph.successors(state):
+                if graph._node[element]['type'] != "element":
+                    continue
+                for next_state in graph.successors(element):
+                    if next_state not in parents:
+                        parents[element] = state
+                        parents[next_state] = element
+                        queue.append(next_state)
+        return None
+
+    def _relaunch(self, d_serial: str) -> None:
+        '''
+        Restart the app from its launcher Activity
+        '''
+        pkg_name = aapt.get_package_name(self._apk_running[d_serial])
+        adb.force_stop(d_serial, pkg_name)
+        adb.bring_to_foreground(d_serial, pkg_name)
+        sleep(conf.WAIT_AFTER_APP_LAUNCH)
+        self._invalidate_screen(d_serial)
+        if self._ssi_monitors.get(d_serial):
+            self._ssi_monitors[d_serial].update_pids()
+        self.allow_permission_popup(d_serial)
+
+    def _get_screen(self, d_serial: str) -> tuple:
+        '''
+        Get (state, clickable UIs) of the current screen
+
+        The last dump is reused until an action is performed on the device
+        or it is older than conf.SCREEN_CACHE_TTL.
+        '''
+        screen = self._screens.get(d_serial)
+        if screen and time() - screen[2] < conf.SCREEN_CACHE_TTL:
+            return screen[0], screen[1]
+
+        activity = adb.get_foreground_activity_name(d_serial)
+        xml = self._ua_devices[d_serial].dump()
+        ui_dics = ua_utils.get_clickable_list(ua_utils.get_current_tree(xml))
+        state = activity
+        if activity and conf.STATE_ABSTRACTION != "activity":
+            state = activity + conf.STATE_DELIMITER \
+                    + ua_utils.get_state_hash(ui_dics, conf.STATE_ABSTRACTION)
+        self._screens[d_serial] = (state, ui_dics, time())
+        return state, ui_dics
+
+    def _invalidate_screen(self, d_serial: str) -> None:
+        '''
+        Drop the cached dump after the screen may have changed
+        '''
+        self._screens[d_serial] = None
    
 
     def _next_activity(self, d_serial: str):
         '''
         Find an unvisited activity in the node list
         '''
-        for node, attr in sorted(self._graphs[d_serial].nodes(data=True)):
-            if attr['type'] == "activity" and attr['visited'] == False:
-                return node
-        return None
+        return self._frontiers[d_serial].next_activity()
 
 
     def _visit_node(self, d_serial:str , node) -> bool:
         '''
         Visit the given node
         '''
+        if conf.MODE_FOLLOWER_LEADER and d_serial != self.leader_device:
+            if conf.DELIMITER in node:
+                return self._visit_leader_node(d_serial, node)
+            return self._visit_leader_state(d_serial, node)
         if not node in self._graphs[d_serial]:
-            self._logger.warning('[!] Node does not exist on device graph')
+            self._logger.warning('[!] Node does not exist on device graph',
+                    serial=d_serial)
             return
+
+        # The node belongs to another screen of the app: put its state back
+        # on the frontier, so that the node is tested once there again
+        state, ui_dics = self._get_screen(d_serial)
+        node_state = node.split(conf.DELIMITER)[0]
+        if state != node_state and conf.DELIMITER in node:
+            if node_state in self._graphs[d_serial]:
+                self._update_attr(d_serial, node_state, "visited", False)
+            return True
     
-        # Write to a apk log directory
-        nth_log = os.path.join(self._log_dir, 
-            aapt.get_package_name(self._apk_running[d_serial]), 
-            self._nth_try[d_serial], 'uis_traversed_'+d_serial+'.log')
-        with open(nth_log, 'a') as nth_log_f:
-            nth_log_f.write(node+"\n")
+        self._traces[d_serial].event(trace.ELEMENT, node=node)
         self.allow_permission_popup(d_serial)
         ui = self._graphs[d_serial]._node[node]
     
         # Check current UIs on foreground
-        xml = self._ua_devices[d_serial].dump()
-        ui_dics = ua_utils.get_clickable_list(ua_utils.get_current_tree(xml))
+        ui_dics = self._get_screen(d_serial)[1]
         foreground_ui_ids = \
                 [ ui['resourceId'] for idx, ui in enumerate(ui_dics) ]
+        foreground_uis = dict(ua_utils.assign_signatures(ui_dics))
+        signature = node.split(conf.DELIMITER)[-1]
     
         if ui['type'] == "activity":
             self._update_attr(d_serial, node, "visited", True)
-        elif not ui['resourceId'] in foreground_ui_ids:
-            self._graphs[d_serial].remove_node(node)
+        elif not signature in foreground_uis and \
+                not ui['resourceId'] in foreground_ui_ids:
+            self._remove_node(d_serial, node)
         else:
-            ui_element = self._ua_devices[d_serial](text=ui['text'], \
-                                         className=ui['className'], \
-                                         resourceId=ui['resourceId'])
-            if ui_element.exists:
-                # Type random strign on a EditText widget
-                if ui_element.className == "android.widget.EditText":
-                    if self._random_text == '':
-                        self._random_text = \
-                            ''.join(random.choice(string.ascii_letters) \
-                            for i in range(10))
-                    ui_element.set_text(self._random_text)
-                    adb.adb_close_keyboard(d_serial)
-                # Long click
-                elif ui_element.longClickable:
-                    ui_element.long_click.wait()
-                # Click or check
-                elif ui_element.clickable or ui_element.checkable:
-                    ui_element.click.wait()
-                # Scroll
-                elif ui_element.scrollable:
-                    ui_element.swipe.up(steps=10).wait()
-                else:
-                    self._graphs[d_serial].remove_node(node)
-                    return
-                self._update_attr(d_serial, node, "visited", True)
+            if self._random_text == '':
+                self._random_text = \
+                    ''.join(random.choice(string.ascii_letters) \
+                    for i in range(10))
+
+            # Act on the bounds in the dump, or search the live hierarchy
+            # with a selector if the UI is no longer where it was dumped
+            started = time()
+            if signature in foreground_uis:
+                action, rpcs = actions.perform_at_bounds(
+                        self._ua_devices[d_serial], d_serial, 
+                        foreground_uis[signature], self._random_text)
             else:
+                action, rpcs = actions.perform_with_selector(
+                        self._ua_devices[d_serial], d_serial, ui, 
+                        self._random_text)
+            self._rpcs[d_serial].append(rpcs)
+            self._logger.debug('%s: %s with %d RPCs', d_serial, action, rpcs,
+                    serial=d_serial)
+            self._traces[d_serial].event(trace.ACTION, node=node, 
+                    action=action, rpcs=rpcs, 
+                    seconds=round(time() - started, 3))
+
+            if action is None:
+                self._remove_node(d_serial, node)
+                return
+            elif action is False:
                 self._update_attr(d_serial, node, "difference", "deleted")
+            else:
+                self._invalidate_screen(d_serial)
+                self._update_attr(d_serial, node, "visited", True)
       
         sleep(1)
         prev = node.split(conf.DELIMITER)[0]
-        curr = adb.get_foreground_activity_name(d_serial)
+        curr = self.get_current_state(d_serial)
         self.allow_permission_popup(d_serial)
         return prev == curr
+
+    def _visit_leader_state(self, d_serial: str, node) -> bool:
+        '''
+        Visit the leader's state on a follower: its screen hash may differ
+        from the follower's, so the current state of the follower stands 
+        for it, as the UI matched does for the leader's element
+        '''
+        state = self.get_current_state(d_serial)
+        self._traces[d_serial].event(trace.ELEMENT, node=node)
+        if state in self._graphs[d_serial]:
+            self._update_attr(d_serial, state, "visited", True)
+        return True
+
+    def _visit_leader_node(self, d_serial: str, node) -> bool:
+        '''
+        Visit the leader's node on a follower, acting on the UI matched to 
+        the leader's on the follower's screen, which may differ in size, 
+        locale or OS version
+        '''
+        leader_graph = self._graphs[self.leader_device]
+        if not node in leader_graph:
+            self._logger.warning('[!] Node does not exist on leader graph',
+                    serial=d_serial)
+            return True
+        leader_ui = leader_graph._node[node]
+        leader_state = node.split(conf.DELIMITER)[0]
+        screen_size = leader_graph._node[leader_state].get("screenSize") \
+                if leader_state in leader_graph else None
+        if screen_size:
+            screen_size = tuple(int(n) for n in screen_size.split('x'))
+
+        state, ui_dics = self._get_screen(d_serial)
+        ui, confidence = ElementIndex(ui_dics).resolve(leader_ui, screen_size)
+        if conf.RECORD_MATCHES:
+            self._write_match(d_serial, leader_ui, screen_size, ui_dics, ui)
+
+        # The follower graph keeps the leader's node names
+        self._traces[d_serial].event(trace.ELEMENT, node=node)
+        if not node in self._graphs[d_serial]:
+            self._add_node(d_serial, node, **{"type": "element", 
+                    "visited": False, "second_visit": False})
+            if state in self._graphs[d_serial]:
+                self._graphs[d_serial].add_edge(state, node)
+        if ui is None:
+            self._logger.debug('%s: no match for %s (%.2f)', d_serial, 
+                    node.split(conf.DELIMITER)[-1], confidence, 
+                    serial=d_serial)
+            self._update_attr(d_serial, node, "difference", "deleted")
+            return True
+        for attr, value in ui.items():
+            self._update_attr(d_serial, node, attr, value)
+        self._update_attr(d_serial, node, "matchConfidence", confidence)
+
+        self.allow_permission_popup(d_serial)
+        if self._random_text == '':
+            self._random_text = \
+                ''.join(random.choice(string.ascii_letters) \
+                for i in range(10))
+        started = time()
+        action, rpcs = actions.perform_at_bounds(self._ua_devices[d_serial], 
+                d_serial, ui, self._random_text)
+        self._rpcs[d_serial].append(rpcs)
+        self._traces[d_serial].event(trace.ACTION, node=node, action=action,
+                rpcs=rpcs, seconds=round(time() - started, 3), 
+                confidence=confidence)
+        self._logger.debug('%s: %s with %d RPCs (match: %.2f)', d_serial, 
+                action, rpcs, confidence, serial=d_serial)
+        if action:
+            self._invalidate_screen(d_serial)
+            self._update_attr(d_serial, node, "visited", True)
+
+        sleep(1)
+        curr = self.get_current_state(d_serial)
+        self.allow_permission_popup(d_serial)
+        return state == curr
+
+    def _write_match(self, d_serial: str, leader_ui: dict, 
+                     screen_size: tuple, ui_dics: list, ui: dict) -> None:
+        '''
+        Record the leader's UI, the follower's UIs and the UI matched, to 
+        benchmark matching with scripts/bench_matcher.py
+        '''
+        fields = ['resourceId', 'className', 'text', 'contentDescription', 
+                'bounds', 'checkable', 'longClickable', 'scrollable', 
+                'ancestorPath']
+        record = {'leader': {f: leader_ui.get(f) for f in fields},
+                'screenSize': screen_size, 'follower': ui_dics,
+                'match': ui_dics.index(ui) if ui is not None else None}
+        with open(self.get_run_log_path(d_serial, 
+                'matches.jsonl'), 'a') as f:
+            f.write(json.dumps(record)+"\n")
             
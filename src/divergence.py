@@ -0,0 +1,123 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+from threading import Lock
+
+# Local packages
+import src.config as conf
+import src.uiautomator_utils as ua_utils
+
+
+class DivergenceTracker:
+    '''
+    Compare the screen of each follower with the leader's after every step
+    of follow-the-leader mode and record where they diverge
+
+    A follower diverges on another Activity or on UIs missing or extra by
+    (resource ID, class). UIs only changed (e.g., another text or parents)
+    are recorded as changes, not divergences.
+    '''
+
+    def __init__(self, leader: str):
+        self._leader = leader
+        self._lock = Lock()
+        self._step = 0
+        self._divergences = {}      # {follower: [divergence]}
+        self._changes = {}          # {follower: [UIs changed at a step]}
+        self._pruned = set()
+
+    def compare(self, node: str, leader_screen: tuple, follower: str,
+                follower_screen: tuple) -> dict:
+        '''
+        Compare (state, UIs) of the follower with the leader's after the
+        leader's node was traveled
+
+        :return: the divergence recorded, or None if the screens match
+        '''
+        leader_state, leader_uis = leader_screen
+        follower_state, follower_uis = follower_screen
+        diff = diff_uis(leader_uis, follower_uis)
+        leader_activity = _activity(leader_state)
+        follower_activity = _activity(follower_state)
+        if leader_activity == follower_activity and not diff['missing'] \
+                and not diff['extra']:
+            if diff['changed']:
+                with self._lock:
+                    self._changes.setdefault(follower, []).append({
+                            'step': self._step, 'node': node,
+                            'changed': diff['changed']})
+            return None
+
+        divergence = dict(diff, step=self._step, node=node,
+                leader_state=leader_state, follower_state=follower_state)
+        with self._lock:
+            self._divergences.setdefault(follower, []).append(divergence)
+            if conf.PRUNE_DIVERGED_FOLLOWERS and leader_activity != \
+                    follower_activity:
+                self._pruned.add(follower)
+        return divergence
+
+    def next_step(self) -> None:
+        with self._lock:
+            self._step += 1
+
+    def is_diverged(self, follower: str) -> bool:
+        return bool(self._divergences.get(follower))
+
+    def is_pruned(self, follower: str) -> bool:
+        return follower in self._pruned
+
+    def prune(self, follower: str) -> None:
+        '''
+        Stop testing on the follower (e.g., its app cannot be relaunched)
+        '''
+        with self._lock:
+            self._pruned.add(follower)
+
+    def get_report(self, follower: str) -> dict:
+        '''
+        Get the first and all divergence points of the follower, and UIs
+        changed on screens that did not diverge
+        '''
+        divergences = self._divergences.get(follower, [])
+        return {'leader': self._leader, 'follower': follower,
+                'steps': self._step, 'pruned': follower in self._pruned,
+                'first': divergences[0] if divergences else None,
+                'all': divergences, 'changes': self._changes.get(follower, [])}
+
+
+def diff_uis(leader_uis: list, follower_uis: list) -> dict:
+    '''
+    Get UIs missing on, extra on, and changed on the follower
+
+    UIs with the same resource ID and class on both sides but a different
+    signature (e.g., a different text or ancestors) are changed, not
+    missing and extra.
+    '''
+    leader = dict(ua_utils.assign_signatures(leader_uis))
+    follower = dict(ua_utils.assign_signatures(follower_uis))
+    missing = [sig for sig in leader if sig not in follower]
+    extra = [sig for sig in follower if sig not in leader]
+
+    def key(ui: dict) -> tuple:
+        return (ui['resourceId'], ui['className'])
+
+    extra_by_key = {}
+    for sig in extra:
+        extra_by_key.setdefault(key(follower[sig]), []).append(sig)
+    changed = []
+    for sig in list(missing):
+        candidates = extra_by_key.get(key(leader[sig]))
+        if candidates:
+            other = candidates.pop(0)
+            missing.remove(sig)
+            extra.remove(other)
+            changed.append({'leader': sig, 'follower': other,
+                    'resourceId': leader[sig]['resourceId'],
+                    'text': [leader[sig]['text'], follower[other]['text']]})
+    return {'missing': missing, 'extra': extra, 'changed': changed}
+
+def _activity(state: str) -> str:
+    return state.split(conf.STATE_DELIMITER)[0] if state else None
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+from bisect import bisect_left, insort
+
+
+class Frontier:
+    '''
+    Incremental index over an exploration graph.
+
+    Keeps, per activity, a sorted list of unvisited element nodes, a sorted
+    list of unvisited activities and a set of visited nodes, so that the
+    exploration loop never has to scan the whole graph. It must be updated
+    whenever a node is added, visited or removed.
+    '''
+
+    def __init__(self):
+        self._types = {}        # {node: node type}
+        self._groups = {}       # {element node: activity it belongs to}
+        self._unvisited = {}    # {activity: sorted unvisited element nodes}
+        self._activities = []   # sorted unvisited activity nodes
+        self._visited = {}      # visited nodes of any type, in visit order
+
+    def add(self, node: str, node_type: str, visited: bool,
+            activity: str = None) -> None:
+        '''
+        Add a node (or re-add an existing one) to the index
+        '''
+        if node in self._types:
+            self.remove(node)
+        self._types[node] = node_type
+        if node_type == "element":
+            self._groups[node] = activity
+            self._unvisited.setdefault(activity, [])
+        self.update(node, visited)
+
+    def update(self, node: str, visited: bool) -> None:
+        '''
+        Update the visited state of the given node
+        '''
+        if node not in self._types:
+            return
+        if visited:
+            self._visited.setdefault(node)
+            self._discard(self._pending_list(node), node)
+        else:
+            self._visited.pop(node, None)
+            pending = self._pending_list(node)
+            if pending is not None:
+                idx = bisect_left(pending, node)
+                if idx == len(pending) or pending[idx] != node:
+                    insort(pending, node)
+
+    def remove(self, node: str) -> None:
+        '''
+        Remove the given node from the index
+        '''
+        if node not in self._types:
+            return
+        self._visited.pop(node, None)
+        self._discard(self._pending_list(node), node)
+        if self._types[node] == "activity":
+            pending = self._unvisited.get(node)
+            if pending is not None and not pending:
+                del self._unvisited[node]
+        del self._types[node]
+        self._groups.pop(node, None)
+
+    def next_nodes(self, activity: str) -> list:
+        '''
+        Unvisited nodes of the given activity, the activity itself first
+        '''
+        nodes = []
+        if activity is None:
+            return nodes
+        if self._types.get(activity) == "activity" \
+                and activity not in self._visited:
+            nodes.append(activity)
+        nodes.extend(self._unvisited.get(activity, []))
+        return nodes
+
+    def next_activity(self) -> str:
+        '''
+        First unvisited activity in name order
+        '''
+        return self._activities[0] if self._activities else None
+
+    def pending_activities(self) -> list:
+        '''
+        Activities that still have unvisited elements
+        '''
+        return [activity for activity, pending in self._unvisited.items()
+                if pending]
+
+    def visited_nodes(self) -> list:
+        '''
+        All visited nodes in the order they were first visited
+        '''
+        return list(self._visited)
+
+    def is_visited(self, node: str) -> bool:
+        return node in self._visited
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._types
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _pending_list(self, node: str) -> list:
+        '''
+        The sorted list that holds the node while it is unvisited
+        '''
+        node_type = self._types.get(node)
+        if node_type == "activity":
+            return self._activities
+        if node_type == "element":
+            return self._unvisited.setdefault(self._groups[node], [])
+        return None
+
+    @staticmethod
+    def _discard(pending: list, node: str) -> None:
+        if pending is None:
+            return
+        idx = bisect_left(pending, node)
+        if idx < len(pending) and pending[idx] == node:
+            del pending[idx]
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import hashlib
+from collections import Counter
+import networkx as nx
+
+# Local packages
+import src.config as conf
+
+
+HASH_LENGTH = 16
+
+def get_label(node: str, attr: dict) -> str:
+    '''
+    Label of a node that does not depend on the device it was found on
+
+    Elements are labeled by their class and ID, and states by their
+    Activity. Ancestors are left out, as layouts wrapping the same UIs
+    differ across devices and OS versions.
+    '''
+    if attr.get('type') == "element":
+        return '%s|%s' %(attr.get('className', ''),
+                attr.get('resourceId', ''))
+    return node.split(conf.STATE_DELIMITER)[0]
+
+def hash_states(graph: nx.DiGraph, iterations: int = None) -> dict:
+    '''
+    Canonical hashes of the states of a graph, Weisfeiler-Lehman style
+
+    The local hash of a state covers its Activity and the labels of its
+    elements. Each iteration hashes a state again with the elements it has
+    and the hashes of the states they lead to, so after k iterations the
+    subtree hash covers everything reachable within k steps. It takes
+    O(k * (V + E) log d) for states of d elements.
+
+    :return: {state: {activity, local, subtree, elements: Counter}}
+    '''
+    if iterations is None:
+        iterations = conf.WL_ITERATIONS
+    states = [node for node, attr in graph.nodes(data=True)
+            if attr.get('type') == "activity"]
+    children, labels = {}, {}
+    for state in states:
+        children[state] = [node for node in graph.successors(state)
+                if graph._node[node].get('type') == "element"]
+        labels[state] = Counter(get_label(node, graph._node[node])
+                for node in children[state])
+
+    local = {state: _digest([get_label(state, graph._node[state])]
+            + sorted(labels[state].elements())) for state in states}
+    subtree = dict(local)
+    for _ in range(iterations):
+        subtree = {state: _digest([subtree[state]] + sorted(
+                get_label(element, graph._node[element]) + '>'
+                    + subtree[target]
+                for element in children[state]
+                for target in graph.successors(element) if target in subtree))
+            for state in states}
+
+    return {state: {'activity': get_label(state, graph._node[state]),
+                    'local': local[state], 'subtree': subtree[state],
+                    'elements': labels[state]}
+            for state in states}
+
+def hash_graph(hashes: dict) -> str:
+    '''
+    Canonical hash of a whole graph from the hashes of its states
+    '''
+    return _digest(sorted(h['subtree'] for h in hashes.values()))
+
+def diff_graphs(named_hashes: list) -> dict:
+    '''
+    Diff two or more graphs by the hashes of their states
+
+    States with the same local hash are the same screen. Screens found in
+    some graphs only are reported with the graphs lacking them, and
+    screens of an Activity that differ between two graphs are reported
+    with the elements missing from or extra on the other graph, between
+    the first graph and each other one.
+
+    :param named_hashes: [(name, hash_states() of a graph)]
+    :return: {graphs, screens, changed, equal}
+    '''
+    names = [name for name, hashes in named_hashes]
+    screens = {}            # {local hash: {activity, present: set}}
+    for name, hashes in named_hashes:
+        for h in hashes.values():
+            screen = screens.setdefault(h['local'], {
+                    'activity': h['activity'], 'present': set()})
+            screen['present'].add(name)
+
+    # Pair screens of the same Activity lacking on one graph but not another
+    changed = []
+    first_name, first = named_hashes[0]
+    for name, hashes in named_hashes[1:]:
+        ours, theirs = _unshared(first, hashes), _unshared(hashes, first)
+        for activity in sorted(set(ours) & set(theirs)):
+            for ours_h, theirs_h in zip(ours[activity], theirs[activity]):
+                changed.append({'activity': activity,
+                        'graphs': [first_name, name],
+                        'hashes': [ours_h['local'], theirs_h['local']],
+                        'missing': sorted((ours_h['elements']
+                            - theirs_h['elements']).elements()),
+                        'extra': sorted((theirs_h['elements']
+                            - ours_h['elements']).elements())})
+
+    partial = [{'hash': local, 'activity': screen['activity'],
+                'present': sorted(screen['present']),
+                'absent': sorted(set(names) - screen['present'])}
+            for local, screen in sorted(screens.items(),
+                key=lambda item: (item[1]['activity'], item[0]))
+            if len(screen['present']) < len(names)]
+    return {'graphs': names,
+            'equal': len(set(hash_graph(hashes)
+                for name, hashes in named_hashes)) == 1,
+            'common': len(screens) - len(partial),
+            'screens': partial, 'changed': changed}
+
+# ----------------- #
+#   Local Methods   #
+# ----------------- #
+def _digest(items: list) -> str:
+    return hashlib.md5('/'.join(items).encode('utf-8', 'ignore')) \
+            .hexdigest()[:HASH_LENGTH]
+
+def _unshared(hashes: dict, other: dict) -> dict:
+    '''
+    {activity: [state hashes]} of screens not in the other graph
+    '''
+    other_locals = set(h['local'] for h in other.values())
+    unshared = {}
+    for h in sorted(hashes.values(), key=lambda h: h['local']):
+        if h['local'] not in other_locals:
+            unshared.setdefault(h['activity'], []).append(h)
+    return unshared
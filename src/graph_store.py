@@ -0,0 +1,108 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import os
+import gzip
+import json
+import fcntl
+import networkx as nx
+
+# Local packages
+import src.config as conf
+
+
+# Node attributes only used to draw graphs, not stored
+DRAWING_ATTRS = ['label', 'style', 'fillcolor']
+
+def save_graph(graph: nx.DiGraph, path: str, meta: dict = None) -> None:
+    '''
+    Save the graph as gzipped JSON, replacing the file atomically
+    '''
+    data = {
+        'meta': meta or {},
+        'nodes': [[node, {key: value for key, value in attr.items() 
+                    if key not in DRAWING_ATTRS}] 
+                for node, attr in graph.nodes(data=True)],
+        'edges': [list(edge) for edge in graph.edges()]}
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def load_graph(path: str) -> nx.DiGraph:
+    '''
+    Load a graph saved by save_graph(), or an empty graph if none
+    '''
+    if not os.path.exists(path):
+        return nx.DiGraph()
+    with gzip.open(path, 'rt', encoding='utf8') as f:
+        data = json.load(f)
+    graph = nx.DiGraph(meta=data.get('meta', {}))
+    graph.add_nodes_from((node, attr) for node, attr in data['nodes'])
+    graph.add_edges_from(data['edges'])
+    return graph
+
+def memory_path(pkg_name: str, android_version: str) -> str:
+    '''
+    Path of the exploration memory of the package on an Android version
+    '''
+    return os.path.join(conf.GRAPH_STORE_DIR, pkg_name,
+            'android-%s.json.gz' %(android_version))
+
+def update_memory(path: str, run_graph: nx.DiGraph, meta: dict) -> None:
+    '''
+    Merge a run's graph into the memory saved at the path
+
+    Runs are forked processes that may end at the same time, so the
+    read-merge-write holds an exclusive lock on <path>.lock.
+    '''
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            save_graph(merge_run(load_graph(path), run_graph), path, meta)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def merge_run(memory: nx.DiGraph, run_graph: nx.DiGraph) -> nx.DiGraph:
+    '''
+    Merge a run's graph into the memory
+
+    Each node of the memory counts the runs it was seen in ("runs") and
+    the runs it was visited in ("hits").
+    '''
+    for node, attr in run_graph.nodes(data=True):
+        if node not in memory:
+            memory.add_node(node, **{key: value for key, value
+                    in attr.items() if key not in DRAWING_ATTRS})
+            memory._node[node]['runs'] = 0
+            memory._node[node]['hits'] = 0
+        memory._node[node]['runs'] = memory._node[node].get('runs', 0) + 1
+        if attr.get('visited'):
+            memory._node[node]['hits'] = memory._node[node].get('hits', 0) + 1
+        for key in ['failures', 'ssi']:
+            if attr.get(key):
+                memory._node[node][key] = \
+                        memory._node[node].get(key, 0) + attr[key]
+    memory.add_edges_from(run_graph.edges())
+    return memory
+
+def get_ssi(memory: nx.DiGraph, node: str) -> int:
+    '''
+    Number of new SSIs the node caused in previous runs
+    '''
+    if memory is None or node not in memory:
+        return 0
+    return memory._node[node].get('ssi', 0)
+
+def get_hits(memory: nx.DiGraph, node: str) -> int:
+    '''
+    Number of previous runs in which the node was visited
+    '''
+    if memory is None or node not in memory:
+        return 0
+    return memory._node[node].get('hits', 0)
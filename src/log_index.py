@@ -0,0 +1,110 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import os
+import json
+import gzip
+
+
+VERSION = 1
+
+class LogIndex:
+    '''
+    Items (SSIs or UIs) parsed from log files, kept between analyses of
+    scripts/log_parser.py
+
+    Each file is recorded with its size and mtime when it was parsed, and
+    the byte offset of the end of its last complete line. A file unchanged
+    since is not read again, a file grown is read from the offset, and a
+    file shrunk or rewritten is parsed from the start. SSIs of the baseline
+    logcat are kept per Android version, with the size and mtime of it.
+    '''
+
+    def __init__(self, path: str = None, load: bool = True):
+        self._path = path
+        self._files = {}        # {path: {size, mtime, offset, items}}
+        self._baselines = {}    # {Android version: {path, size, mtime, items}}
+        if not load or path is None or not os.path.exists(path):
+            return
+        with gzip.open(path, 'rt', encoding='utf8') as f:
+            data = json.load(f)
+        if data.get('version') == VERSION:
+            self._files = data['files']
+            self._baselines = data['baselines']
+
+    def get_offset(self, path: str) -> int:
+        '''
+        Get the byte offset to parse the file from, or None if it was
+        parsed as it is
+        '''
+        entry = self._files.get(os.path.abspath(path))
+        if entry is None:
+            return 0
+        stat = os.stat(path)
+        if stat.st_size == entry['size'] and stat.st_mtime == entry['mtime']:
+            return None
+        if stat.st_size <= entry['size']:
+            return 0
+        return entry['offset']
+
+    def update(self, path: str, stat: os.stat_result, offset: int,
+            items: set, reset: bool) -> None:
+        '''
+        Record items parsed from the file up to the offset, with the file
+        stat taken before parsing it
+
+        :param reset: True if parsed from the start
+        '''
+        path = os.path.abspath(path)
+        entry = self._files.get(path)
+        if reset or entry is None:
+            entry = self._files[path] = {'items': []}
+        entry['items'] = [list(item) for item in
+                set(map(tuple, entry['items'])) | items]
+        entry.update(size=stat.st_size, mtime=stat.st_mtime, offset=offset)
+
+    def get(self, path: str) -> set:
+        entry = self._files.get(os.path.abspath(path))
+        return set(map(tuple, entry['items'])) if entry else set()
+
+    def prune(self, log_path: str, paths: list) -> None:
+        '''
+        Forget files under the directory other than the given ones
+        '''
+        log_path = os.path.join(os.path.abspath(log_path), '')
+        keep = set(os.path.abspath(path) for path in paths)
+        for path in list(self._files):
+            if path.startswith(log_path) and path not in keep:
+                del self._files[path]
+
+    def get_baseline(self, android_version: str, path: str) -> set:
+        '''
+        Get SSIs of the baseline logcat of the Android version, or None if
+        it was not parsed as it is
+        '''
+        entry = self._baselines.get(android_version)
+        stat = os.stat(path)
+        if entry is None or entry['path'] != os.path.abspath(path) or \
+                entry['size'] != stat.st_size or \
+                entry['mtime'] != stat.st_mtime:
+            return None
+        return set(map(tuple, entry['items']))
+
+    def set_baseline(self, android_version: str, path: str,
+            items: set) -> None:
+        stat = os.stat(path)
+        self._baselines[android_version] = {'path': os.path.abspath(path),
+                'size': stat.st_size, 'mtime': stat.st_mtime,
+                'items': [list(item) for item in items]}
+
+    def save(self) -> None:
+        if self._path is None:
+            return
+        os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+        tmp_path = self._path + '.tmp'
+        with gzip.open(tmp_path, 'wt', encoding='utf8') as f:
+            json.dump({'version': VERSION, 'files': self._files,
+                    'baselines': self._baselines}, f, separators=(',', ':'))
+        os.replace(tmp_path, self._path)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import os
+import re
+import json
+import gzip
+import zlib
+
+# Local packages
+import src.config as conf
+
+
+ARCHIVE_SUFFIX = '.log.gz'
+INDEX_SUFFIX = '.idx'
+
+# Head of a line of logcat in the threadtime format
+LINE_PATTERN = re.compile(r'^(\d\d)-(\d\d) (\d\d):(\d\d):(\d\d)\.(\d{3})\s+' \
+        r'(\d+)\s+(\d+) ([VDIWEFS]) (.*?)\s*: ')
+
+# Days before each month, counting Feb 29 so that every date is distinct
+MONTH_DAYS = [0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335]
+
+
+def parse_head(line: str) -> tuple:
+    '''
+    Get (time, PID, TID, level, tag) of a threadtime line or None; the time
+    is in milliseconds since Jan 1, as logcat has no year
+    '''
+    match = LINE_PATTERN.match(line)
+    if match is None:
+        return None
+    month, day, hours, minutes, seconds, ms, pid, tid, level, tag = \
+            match.groups()
+    time = ((((MONTH_DAYS[int(month) - 1] + int(day) - 1) * 24 +
+            int(hours)) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + \
+            int(ms)
+    return time, int(pid), int(tid), level, tag
+
+
+def to_ms(timestamp: str) -> int:
+    '''
+    Get the time of a logcat timestamp (MM-DD HH:MM:SS.mmm) as parse_head()
+    '''
+    head = parse_head(timestamp + '  0  0 V x: ')
+    if head is None:
+        raise ValueError('Not a logcat timestamp: ' + timestamp)
+    return head[0]
+
+
+class ArchiveWriter:
+    '''
+    Write logcat lines to a file of gzip members (conf.LOGCAT_BLOCK_SIZE
+    bytes of lines each, so the whole file is still read by zcat), with an
+    index of the blocks in <path>.idx: offset and size of each, the time of
+    its first and last lines, and bitmaps of the tags and PIDs in it.
+    '''
+
+    def __init__(self, path: str):
+        self._path = path
+        self._f = open(path, 'wb')
+        self._lines = []
+        self._size = 0
+        self._tags = {}         # {tag: bit}
+        self._pids = {}         # {PID: bit}
+        self._blocks = []
+        self._block = None
+
+    def write(self, line: str) -> None:
+        '''
+        Add a line (without or with the line break)
+        '''
+        line = line.rstrip('\n')
+        head = parse_head(line)
+        if self._block is None:
+            self._block = {'first': None, 'last': None, 'tags': 0,
+                    'pids': 0, 'lines': 0}
+        if head is not None:
+            time, pid, _, _, tag = head
+            block = self._block
+            if block['first'] is None:
+                block['first'] = block['last'] = time
+            else:
+                block['first'] = min(block['first'], time)
+                block['last'] = max(block['last'], time)
+            block['tags'] |= 1 << self._tags.setdefault(tag, len(self._tags))
+            block['pids'] |= 1 << self._pids.setdefault(pid, len(self._pids))
+        self._block['lines'] += 1
+        self._lines.append(line)
+        self._size += len(line) + 1
+        if self._size >= conf.LOGCAT_BLOCK_SIZE:
+            self._flush()
+
+    def close(self) -> None:
+        '''
+        Write the last block and the index
+        '''
+        self._flush()
+        self._f.close()
+        index = {'tags': sorted(self._tags, key=self._tags.get),
+                'pids': sorted(self._pids, key=self._pids.get),
+                'blocks': [dict(block, tags='%x' %(block['tags']),
+                    pids='%x' %(block['pids'])) for block in self._blocks]}
+        tmp_path = self._path + INDEX_SUFFIX + '.tmp'
+        with open(tmp_path, 'w', encoding='utf8') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(tmp_path, self._path + INDEX_SUFFIX)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _flush(self) -> None:
+        if not self._lines:
+            return
+        data = gzip.compress(('\n'.join(self._lines) + '\n').encode('utf8',
+                'ignore'), compresslevel=conf.LOGCAT_COMPRESS_LEVEL)
+        self._block.update(offset=self._f.tell(), size=len(data))
+        self._f.write(data)
+        self._blocks.append(self._block)
+        self._lines, self._size, self._block = [], 0, None
+
+
+class LogcatArchive:
+    '''
+    Read an archive written by ArchiveWriter, decompressing only the blocks
+    that may have lines of the time window, PIDs and tags asked for. An
+    archive without its index (e.g., the run was killed) is read whole.
+    '''
+
+    def __init__(self, path: str):
+        self._path = path
+        self._index = None
+        if os.path.exists(path + INDEX_SUFFIX):
+            with open(path + INDEX_SUFFIX, 'r', encoding='utf8') as f:
+                self._index = json.load(f)
+
+    def blocks(self, start: int = None, end: int = None, pids: list = None,
+            tags: list = None) -> iter:
+        '''
+        Get text of the blocks that may have lines logged in [start, end)
+        (see parse_head()) by the PIDs with the tags
+        '''
+        if self._index is None:
+            with gzip.open(self._path, 'rt', encoding='utf8',
+                    errors='ignore') as f:
+                try:
+                    for lines in iter(lambda:
+                            f.readlines(conf.LOGCAT_BLOCK_SIZE), []):
+                        yield ''.join(lines)
+                except EOFError:    # The last block was cut
+                    pass
+            return
+
+        pid_mask = self._mask('pids', pids)
+        tag_mask = self._mask('tags', tags)
+        with open(self._path, 'rb') as f:
+            for block in self._index['blocks']:
+                if block['first'] is not None and (
+                        (end is not None and block['first'] >= end) or
+                        (start is not None and block['last'] < start)):
+                    continue
+                if (pid_mask is not None and
+                        not int(block['pids'], 16) & pid_mask) or \
+                        (tag_mask is not None and
+                        not int(block['tags'], 16) & tag_mask):
+                    continue
+                f.seek(block['offset'])
+                yield zlib.decompress(f.read(block['size']),
+                        wbits=31).decode('utf8', 'ignore')
+
+    def lines(self, start: int = None, end: int = None, pids: list = None,
+            tags: list = None) -> iter:
+        '''
+        Get lines logged in [start, end) by the PIDs with the tags; lines
+        not in the threadtime format are only given if nothing is asked
+        '''
+        filtered = (start, end, pids, tags) != (None, None, None, None)
+        for text in self.blocks(start, end, pids, tags):
+            for line in text.rstrip('\n').split('\n') if text else []:
+                if not filtered:
+                    yield line
+                    continue
+                head = parse_head(line)
+                if head is None or \
+                        (start is not None and head[0] < start) or \
+                        (end is not None and head[0] >= end) or \
+                        (pids is not None and head[1] not in pids) or \
+                        (tags is not None and head[4] not in tags):
+                    continue
+                yield line
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _mask(self, name: str, values: list) -> int:
+        '''
+        Get the bitmap of the values, or None to take any
+        '''
+        if values is None:
+            return None
+        bits = {value: i for i, value in enumerate(self._index[name])}
+        mask = 0
+        for value in values:
+            if value in bits:
+                mask |= 1 << bits[value]
+        return mask
+
+
+def read_lines(path: str) -> iter:
+    '''
+    Get lines of a logcat dump, archived or not
+    '''
+    if path.endswith(ARCHIVE_SUFFIX):
+        yield from LogcatArchive(path).lines()
+        return
+    with open(path, 'r', errors='ignore') as f:
+        for line in f:
+            yield line.rstrip('\n')
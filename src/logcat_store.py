@@ -0,0 +1,238 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import os
+import json
+from itertools import islice
+import numpy as np
+
+# Local packages
+from src.ssi import PREFILTER, parse_ssi
+from src.logcat_archive import parse_head, read_lines
+
+
+# Columns of a store and their types
+COLUMNS = {
+    'time': np.int64,       # Milliseconds since Jan 1 (logcat has no year)
+    'pid': np.int32,
+    'tid': np.int32,
+    'level': np.uint8,      # V, D, I, W, E, F or S as a byte
+    'tag': np.int32,        # Interned ids
+    'transaction': np.int8, # Interned ids of the SSI, or -1 if none
+    'interface': np.int32,
+    'code': np.int32,
+}
+TABLES = ['tag', 'transaction', 'interface', 'code']
+META_FILE = 'meta.json'
+CHUNK_LINES = 1 << 20   # Lines parsed before writing them
+
+def convert(logcat_path: str, store_dir: str) -> int:
+    '''
+    Parse a logcat dump (threadtime, archived or not) into a store of
+    columns, each a raw array on disk, reading and writing a chunk of lines
+    at a time
+
+    :return: number of lines stored
+    '''
+    os.makedirs(store_dir, exist_ok=True)
+    tables = {name: {} for name in TABLES}      # {name: {string: id}}
+    files = {name: open(os.path.join(store_dir, name + '.bin'), 'wb')
+            for name in COLUMNS}
+    n_lines, last_time, is_sorted = 0, -1, True
+    try:
+        lines = read_lines(logcat_path)
+        for chunk in iter(lambda: _parse_chunk(islice(lines, CHUNK_LINES),
+                tables), None):
+            times = chunk['time']
+            if not len(times):
+                continue
+            is_sorted = is_sorted and times[0] >= last_time and \
+                    bool(np.all(times[1:] >= times[:-1]))
+            last_time = times[-1]
+            for name, values in chunk.items():
+                values.tofile(files[name])
+            n_lines += len(times)
+    finally:
+        for f in files.values():
+            f.close()
+
+    meta = {'lines': n_lines, 'sorted': is_sorted,
+            'source': os.path.abspath(logcat_path),
+            'tables': {name: sorted(table, key=table.get)
+                for name, table in tables.items()}}
+    with open(os.path.join(store_dir, META_FILE), 'w', encoding='utf8') as f:
+        json.dump(meta, f)
+    return n_lines
+
+
+class LogcatStore:
+    '''
+    Columns of a logcat dump written by convert(), memory-mapped
+
+    Strings (tags, transactions, interfaces and codes) are interned per
+    store, and an SSI is a key combining the ids of its transaction,
+    interface and code, so that sets of SSIs are arrays of unique keys.
+    '''
+
+    def __init__(self, store_dir: str):
+        with open(os.path.join(store_dir, META_FILE), 'r',
+                encoding='utf8') as f:
+            self.meta = json.load(f)
+        self.tables = self.meta['tables']
+        self.columns = {name: np.memmap(os.path.join(store_dir, name +
+                '.bin'), dtype=dtype, mode='r', shape=(self.meta['lines'],))
+                if self.meta['lines'] else np.zeros(0, dtype=dtype)
+                for name, dtype in COLUMNS.items()}
+        self._n_interfaces = max(1, len(self.tables['interface']))
+        self._n_codes = max(1, len(self.tables['code']))
+
+    def __len__(self) -> int:
+        return self.meta['lines']
+
+    def window(self, start: float = None, end: float = None) -> slice:
+        '''
+        Get lines logged in [start, end) (see logcat_archive.to_ms()) as a
+        slice, or a mask if lines are not in order of time
+        '''
+        time = self.columns['time']
+        if not self.meta['sorted']:
+            mask = np.ones(len(time), dtype=bool)
+            if start is not None:
+                mask &= time >= start
+            if end is not None:
+                mask &= time < end
+            return mask
+        return slice(0 if start is None else
+                int(np.searchsorted(time, start, 'left')),
+                len(time) if end is None else
+                int(np.searchsorted(time, end, 'left')))
+
+    def ssi_keys(self, pid: int = None, start: float = None,
+            end: float = None) -> np.ndarray:
+        '''
+        Get unique keys of SSIs of the process in the time window
+        '''
+        rows = self.window(start, end)
+        interface = self.columns['interface'][rows]
+        mask = interface >= 0
+        if pid is not None:
+            mask &= self.columns['pid'][rows] == pid
+        return np.unique(self._keys(self.columns['transaction'][rows][mask],
+                interface[mask], self.columns['code'][rows][mask]))
+
+    def ssis_by_pid(self, start: float = None, end: float = None) -> dict:
+        '''
+        Get unique keys of SSIs of each process in the time window
+
+        :return: {PID: keys}
+        '''
+        rows = self.window(start, end)
+        interface = self.columns['interface'][rows]
+        mask = interface >= 0
+        pids = self.columns['pid'][rows][mask].astype(np.int64)
+        keys = self._keys(self.columns['transaction'][rows][mask],
+                interface[mask], self.columns['code'][rows][mask])
+        n_keys = max(1, len(self.tables['transaction'])) * \
+                self._n_interfaces * self._n_codes
+        pairs = np.unique(pids * n_keys + keys)
+        pids, keys = pairs // n_keys, pairs % n_keys
+        split = np.flatnonzero(np.diff(pids)) + 1
+        return {int(group_pids[0]): group_keys for group_pids, group_keys
+                in zip(np.split(pids, split), np.split(keys, split))
+                if len(group_pids)}
+
+    def new_keys(self, keys: np.ndarray, baseline: 'LogcatStore') \
+            -> np.ndarray:
+        '''
+        Get keys of SSIs not found in the baseline store
+        '''
+        return np.setdiff1d(keys, self.translate(baseline.ssi_keys(),
+                baseline), assume_unique=True)
+
+    def translate(self, keys: np.ndarray, other: 'LogcatStore') \
+            -> np.ndarray:
+        '''
+        Get keys of SSIs of another store in ids of this one, dropping
+        SSIs with a string this store does not have
+        '''
+        transaction, interface, code = other._split(keys)
+        ids = [self._lookup(other, name)[values] for name, values in
+                [('transaction', transaction), ('interface', interface),
+                ('code', code)]]
+        known = (ids[0] >= 0) & (ids[1] >= 0) & (ids[2] >= 0)
+        return np.unique(self._keys(*(values[known] for values in ids)))
+
+    def decode(self, keys: np.ndarray) -> set:
+        '''
+        Get SSIs of keys as (transaction, interface, code)
+        '''
+        transaction, interface, code = self._split(keys)
+        return set(zip((self.tables['transaction'][i] for i in transaction),
+                (self.tables['interface'][i] for i in interface),
+                (self.tables['code'][i] for i in code)))
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _keys(self, transaction: np.ndarray, interface: np.ndarray,
+            code: np.ndarray) -> np.ndarray:
+        return (transaction.astype(np.int64) * self._n_interfaces +
+                interface) * self._n_codes + code
+
+    def _split(self, keys: np.ndarray) -> tuple:
+        keys = np.asarray(keys, dtype=np.int64)
+        code = keys % self._n_codes
+        rest = keys // self._n_codes
+        return rest // self._n_interfaces, rest % self._n_interfaces, code
+
+    def _lookup(self, other: 'LogcatStore', name: str) -> np.ndarray:
+        '''
+        Map ids of a table of another store to ids of this one (-1 if none)
+        '''
+        ids = {string: i for i, string in enumerate(self.tables[name])}
+        return np.array([ids.get(string, -1) for string in
+                other.tables[name]] or [-1], dtype=np.int64)
+
+
+def _parse_chunk(lines: iter, tables: dict) -> dict:
+    '''
+    Parse lines into arrays of columns, interning strings into the tables,
+    or None if there are no lines
+    '''
+    values = {name: [] for name in COLUMNS}
+    empty = True
+    for line in lines:
+        empty = False
+        head = parse_head(line)
+        if head is None:
+            continue
+        time, pid, tid, level, tag = head
+        values['time'].append(time)
+        values['pid'].append(pid)
+        values['tid'].append(tid)
+        values['level'].append(ord(level))
+        values['tag'].append(_intern(tables['tag'], tag))
+        ssi = parse_ssi(line) if PREFILTER in line else None
+        if ssi is None:
+            values['transaction'].append(-1)
+            values['interface'].append(-1)
+            values['code'].append(-1)
+        else:
+            values['transaction'].append(_intern(tables['transaction'],
+                    ssi[0]))
+            values['interface'].append(_intern(tables['interface'], ssi[1]))
+            values['code'].append(_intern(tables['code'], ssi[2]))
+    if empty:
+        return None
+    return {name: np.array(column, dtype=COLUMNS[name])
+            for name, column in values.items()}
+
+
+def _intern(table: dict, string: str) -> int:
+    i = table.get(string)
+    if i is None:
+        i = table[string] = len(table)
+    return i
+
@@ -4,10 +4,31 @@
 '''
 
 import logging as lg
+import logging.handlers
+import os
+import atexit
 import sys
+import queue
 import src.config as conf
 
+# Fields of each record, set with Logger.bind() per device
+FIELDS = ['serial', 'package', 'run', 'phase']
+
 class Logger:
+    '''
+    Log through a queue, so that device threads only enqueue records and a
+    single listener thread writes them to the sinks:
+     - console (conf.LOG_CONSOLE_LEVEL)
+     - log.log (conf.LOG_FILE_LEVEL)
+     - device_<serial>.log in the log directory of the test, with the
+       package, run and phase of each record (conf.LOG_DEVICE_LEVEL)
+
+    Messages take arguments to format lazily, and debug ones are dropped
+    before any formatting if no sink takes them. A process forked after
+    the logger was created (e.g., a run in individual mode) writes to new
+    sinks directly: the listener thread is not forked with it, and a lock
+    of the sinks it inherits may be held forever.
+    '''
     _instance = None
 
     @staticmethod
@@ -20,21 +41,125 @@ class Logger:
         if Logger._instance != None:
             raise Exception("Singleton class cannot be instantiated more \
                     than once.")
-        lg.basicConfig(filename='log.log', level=lg.NOTSET)
-        self._logger = lg.getLogger()
+        self._contexts = {}     # {serial: {field: value}}
+        self._make_sinks()
 
-        s_handler = lg.StreamHandler(sys.stdout)
-        s_handler.setLevel(lg.DEBUG if conf.LOGGER_VERBOSE else lg.INFO)
+        # Records of libraries (e.g., uiautomator) reach the sinks as well,
+        # through the root logger that records of the tester propagate to
+        self._root = lg.getLogger()
+        self._root.setLevel(min(handler.level for handler in self._sinks))
+        self._logger = lg.getLogger('fuzz_tester')
+        self._queue = queue.Queue()
+        self._q_handler = lg.handlers.QueueHandler(self._queue)
+        self._root.addHandler(self._q_handler)
+        self._listener = lg.handlers.QueueListener(self._queue,
+                *self._sinks, respect_handler_level=True)
+        self._listener.start()
+        self._pid = os.getpid()
+        atexit.register(self.stop)
+        os.register_at_fork(after_in_child=self._write_directly)
+        Logger._instance = self
+
+    def bind(self, serial: str, **fields) -> None:
+        '''
+        Set fields (package, run, phase) of records logged for the device
+        '''
+        context = self._contexts.setdefault(serial, {})
+        context.update(fields)
+
+    def set_device_log_dir(self, log_dir: str) -> None:
+        '''
+        Write device logs as device_<serial>.log in the directory
+        '''
+        self._device_handler.set_log_dir(log_dir)
+
+    def info(self, msg: str, *args, serial: str = None) -> None:
+        self._log(lg.INFO, msg, args, serial)
+
+    def debug(self, msg: str, *args, serial: str = None) -> None:
+        if self._logger.isEnabledFor(lg.DEBUG):
+            self._log(lg.DEBUG, msg, args, serial)
+
+    def warning(self, msg: str, *args, serial: str = None) -> None:
+        self._log(lg.WARNING, msg, args, serial)
+
+    def stop(self) -> None:
+        '''
+        Write all records queued and stop the listener
+        '''
+        if os.getpid() == self._pid and self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _log(self, level: int, msg: str, args: tuple, serial: str) -> None:
+        extra = dict.fromkeys(FIELDS, '-')
+        if serial is not None:
+            extra.update(self._contexts.get(serial, {}), serial=serial)
+        self._logger.log(level, msg, *args, extra=extra)
+
+    def _make_sinks(self, log_dir: str = None) -> None:
         formatter = lg.Formatter('%(asctime)s - %(levelname)s : %(message)s')
+        s_handler = lg.StreamHandler(sys.stdout)
+        s_handler.setLevel(conf.LOG_CONSOLE_LEVEL)
         s_handler.setFormatter(formatter)
-        self._logger.addHandler(s_handler)
-        Logger._instance = self
+        f_handler = lg.FileHandler('log.log')
+        f_handler.setLevel(conf.LOG_FILE_LEVEL)
+        f_handler.setFormatter(formatter)
+        self._device_handler = DeviceFileHandler()
+        self._device_handler.setLevel(conf.LOG_DEVICE_LEVEL)
+        if log_dir is not None:
+            self._device_handler.set_log_dir(log_dir)
+        self._sinks = [s_handler, f_handler, self._device_handler]
+
+    def _write_directly(self) -> None:
+        '''
+        Replace the queue with new sinks in a forked process (the inherited
+        ones are dropped, not closed, as the parent still writes to them)
+        '''
+        self._pid = os.getpid()
+        self._listener = None
+        for handler in list(self._root.handlers):
+            self._root.removeHandler(handler)
+        self._make_sinks(self._device_handler.get_log_dir())
+        for handler in self._sinks:
+            self._root.addHandler(handler)
+
+
+class DeviceFileHandler(lg.Handler):
+    '''
+    Write records of each device to its own file, and others nowhere
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self._log_dir = None
+        self._handlers = {}     # {serial: FileHandler}
+        self._formatter = lg.Formatter('%(asctime)s - %(levelname)s ' \
+                '[%(package)s, run: %(run)s, %(phase)s] : %(message)s')
 
-    def info(self, msg: str) -> None:
-        self._logger.info(msg)
+    def get_log_dir(self) -> str:
+        return self._log_dir
 
-    def debug(self, msg: str) -> None:
-        self._logger.debug(msg)
+    def set_log_dir(self, log_dir: str) -> None:
+        self.acquire()
+        try:
+            self._log_dir = log_dir
+            for handler in self._handlers.values():
+                handler.close()
+            self._handlers = {}
+        finally:
+            self.release()
 
-    def warning(self, msg: str) -> None:
-        self._logger.warning(msg)
+    def emit(self, record: lg.LogRecord) -> None:
+        serial = getattr(record, 'serial', '-')
+        if self._log_dir is None or serial == '-':
+            return
+        if serial not in self._handlers:
+            handler = lg.FileHandler(os.path.join(self._log_dir,
+                    'device_%s.log' %(serial)))
+            handler.setFormatter(self._formatter)
+            self._handlers[serial] = handler
+        self._handlers[serial].emit(record)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+from difflib import SequenceMatcher
+
+# Local packages
+import src.config as conf
+import src.uiautomator_utils as ua_utils
+
+
+def get_screen_size(ui_dics: list) -> tuple:
+    '''
+    Estimate (width, height) of the screen from the bounds of its UIs
+    '''
+    width, height = 1, 1
+    for ui in ui_dics:
+        left, top, right, bottom = ua_utils.parse_bounds(ui['bounds'])
+        width, height = max(width, right), max(height, bottom)
+    return width, height
+
+
+class ElementIndex:
+    '''
+    Index of the UIs of a dump to find the UI matching one from another
+    device, where texts, sizes and the order of UIs may differ
+
+    UIs are looked up by their structure (resource ID, class and ancestor
+    path), by resource ID, and by normalized text with hash lookups first.
+    Only when none of them is conclusive are all UIs scored by text
+    similarity, relative position, class and ancestor path.
+    '''
+
+    def __init__(self, ui_dics: list):
+        self._uis = ui_dics
+        self._size = get_screen_size(ui_dics)
+        self._by_structure = {}
+        self._by_id = {}
+        self._by_text = {}
+        for ui in ui_dics:
+            self._by_structure.setdefault(_structure(ui), []).append(ui)
+            if ui['resourceId']:
+                self._by_id.setdefault(ui['resourceId'], []).append(ui)
+            if _text(ui):
+                self._by_text.setdefault(_text(ui), []).append(ui)
+
+    def resolve(self, ui: dict, screen_size: tuple = None) -> tuple:
+        '''
+        Find the UI matching the given UI of a screen of the given size
+
+        :return: (matching UI or None, confidence from 0 to 1)
+        '''
+        position = _relative_center(ui, screen_size or self._size)
+        for candidates, confidence in [
+                (self._by_structure.get(_structure(ui)), 1.0),
+                (self._by_id.get(ui['resourceId']), 0.9),
+                (self._by_text.get(_text(ui)) if _text(ui) else None, 0.8)]:
+            if not candidates:
+                continue
+            if len(candidates) == 1:
+                return candidates[0], confidence
+            best = self._closest(ui, position, candidates)
+            return best, confidence - 0.1
+
+        # Fuzzy fallback over all UIs, since classes differ across versions
+        best, best_score = None, 0.0
+        for candidate in self._uis:
+            score = self._score(ui, position, candidate)
+            if score > best_score:
+                best, best_score = candidate, score
+        if best_score < conf.MATCH_MIN_CONFIDENCE:
+            return None, best_score
+        return best, round(best_score * conf.MATCH_FUZZY_WEIGHT, 3)
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _closest(self, ui: dict, position: tuple, candidates: list) -> dict:
+        return max(candidates,
+                key=lambda candidate: self._score(ui, position, candidate))
+
+    def _score(self, ui: dict, position: tuple, candidate: dict) -> float:
+        '''
+        Similarity of two UIs by text, relative position, class and
+        ancestor path
+        '''
+        text = SequenceMatcher(None, _text(ui), _text(candidate)).ratio() \
+                if _text(ui) or _text(candidate) else 1.0
+        x, y = _relative_center(candidate, self._size)
+        distance = ((position[0] - x) ** 2 + (position[1] - y) ** 2) ** 0.5
+        same_class = ui['className'] == candidate['className']
+        same_path = ui.get('ancestorPath') == candidate.get('ancestorPath')
+        return 0.4 * text + 0.3 * max(0.0, 1 - distance) \
+                + 0.15 * same_class + 0.15 * same_path
+
+
+def _structure(ui: dict) -> tuple:
+    return (ui['resourceId'], ui['className'], ui.get('ancestorPath', ''))
+
+def _text(ui: dict) -> str:
+    return ua_utils.normalize_text(ui['text'] or ui['contentDescription'])
+
+def _relative_center(ui: dict, screen_size: tuple) -> tuple:
+    left, top, right, bottom = ua_utils.parse_bounds(ui['bounds'])
+    return ((left + right) / 2 / screen_size[0],
+            (top + bottom) / 2 / screen_size[1])
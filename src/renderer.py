@@ -0,0 +1,136 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+from multiprocessing import Process, Queue, Value
+import networkx as nx
+from networkx.drawing.nx_agraph import to_agraph
+
+# Local packages
+import src.config as conf
+import src.graph_store as graph_store
+from src.logger import Logger
+
+
+class GraphRenderer:
+    '''
+    Render UI graphs saved by graph_store in background processes, so that
+    devices do not wait for the layout before testing the next app
+
+    Graphs are drawn as conf.RENDER_FORMAT: 'pdf' or 'svg' are laid out by
+    conf.RENDER_WORKERS processes, 'dot' is only written (to lay out later
+    with graphviz), and 'none' draws nothing. Workers are forked when the
+    renderer is created, so graphs can be submitted from processes forked
+    later as well.
+    '''
+
+    def __init__(self):
+        self._queue = Queue()
+        self._depth = Value('i', 0)     # Graphs submitted, not drawn yet
+        self._workers = []
+        if conf.RENDER_FORMAT in ['pdf', 'svg']:
+            for _ in range(conf.RENDER_WORKERS):
+                worker = Process(target=_work, args=(self._queue,
+                        self._depth), daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, graph_path: str, pkg_name: str) -> int:
+        '''
+        Draw the saved graph next to it (ui_graph.json.gz -> ui_graph.pdf)
+
+        :return: number of graphs waiting to be drawn
+        '''
+        out_path = graph_path[:-len('.json.gz')] + '.' + conf.RENDER_FORMAT
+        if conf.RENDER_FORMAT == 'none':
+            return 0
+        if conf.RENDER_FORMAT == 'dot':
+            render(graph_path, out_path, pkg_name)
+            return 0
+        with self._depth.get_lock():
+            self._depth.value += 1
+            depth = self._depth.value
+        self._queue.put((graph_path, out_path, pkg_name))
+        return depth
+
+    def get_depth(self) -> int:
+        return self._depth.value
+
+    def close(self) -> None:
+        '''
+        Wait until all graphs submitted are drawn
+        '''
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+
+def render(graph_path: str, out_path: str, pkg_name: str) -> None:
+    '''
+    Draw a saved graph, laid out with dot unless written as DOT
+    '''
+    graphviz = to_agraph_clustered(graph_store.load_graph(graph_path),
+            pkg_name)
+    if out_path.endswith('.dot'):
+        graphviz.write(out_path)
+        return
+    graphviz.layout('dot')
+    graphviz.draw(out_path)
+
+def to_agraph_clustered(graph: nx.DiGraph, pkg_name: str):
+    '''
+    Convert to a graphviz graph where elements of each state are clustered
+    with the state, which lays out faster than one large graph
+    '''
+    graph = graph.copy()
+    graph.graph.pop('meta', None)
+    clusters = {}       # {state: [state, elements]}
+    for node, attr in sorted(graph.nodes(data=True)):
+        for key in list(attr.keys()):
+            if key not in ['type', 'visited', 'failures']:
+                del attr[key]
+        attr['label'] = "ROOT" if attr['type'] == "package" \
+                else node.split(pkg_name)[-1]
+        attr['style'] = "filled"
+        if attr['type'] == "package":
+            attr['fillcolor'] = "yellow"
+        elif attr['type'] == "activity":
+            attr['fillcolor'] = "orange"
+            clusters.setdefault(node, []).insert(0, node)
+        else:
+            attr['fillcolor'] = "green"
+            clusters.setdefault(node.split(conf.DELIMITER)[0], []) \
+                    .append(node)
+        if attr.get('visited') == False:
+            attr['fillcolor'] = "red"
+
+        # The app crashed or was left after the node was traveled
+        if attr.get('failures'):
+            attr['fillcolor'] = "purple"
+
+    graphviz = to_agraph(graph)
+    for idx, (state, nodes) in enumerate(sorted(clusters.items())):
+        if state in graph:
+            graphviz.add_subgraph(nodes, name='cluster_%d' %(idx),
+                    style='dashed')
+    return graphviz
+
+# ----------------- #
+#   Local Methods   #
+# ----------------- #
+def _work(queue: Queue, depth: Value) -> None:
+    while True:
+        item = queue.get()
+        if item is None:
+            break
+        graph_path, out_path, pkg_name = item
+        try:
+            render(graph_path, out_path, pkg_name)
+        except Exception as e:
+            Logger.get_instance().warning('[!] Failed to draw %s: %s', 
+                    out_path, e)
+        with depth.get_lock():
+            depth.value -= 1
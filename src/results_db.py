@@ -0,0 +1,177 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import os
+import re
+import sqlite3
+from threading import Lock
+
+# Local packages
+import src.config as conf
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS devices (
+    serial TEXT PRIMARY KEY,
+    android_version TEXT
+);
+CREATE TABLE IF NOT EXISTS apks (
+    path TEXT PRIMARY KEY,
+    package TEXT,
+    app_version TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    campaign TEXT NOT NULL,         -- Log directory of the test (date_time)
+    apk TEXT NOT NULL,
+    package TEXT,
+    serial TEXT NOT NULL,
+    android_version TEXT,
+    run INTEGER NOT NULL,
+    verdict TEXT NOT NULL,          -- SUCCESS or FAILED
+    failure INTEGER,                -- Failure # (see DeviceDriver._write_log)
+    started REAL,                   -- Unix time
+    duration REAL,                  -- Seconds
+    uis INTEGER,
+    ssis INTEGER,
+    crash TEXT,                     -- Crash signature
+    recoveries INTEGER,             -- Times the app was relaunched
+    ssi_rate REAL,                  -- New SSIs per minute
+    ssi_guided INTEGER,             -- Actions ordered by SSIs, or random
+    UNIQUE (campaign, apk, serial, run)
+);
+CREATE INDEX IF NOT EXISTS runs_package ON runs (package, started);
+CREATE INDEX IF NOT EXISTS runs_android ON runs (android_version, started);
+CREATE INDEX IF NOT EXISTS runs_serial ON runs (serial, started);
+CREATE INDEX IF NOT EXISTS runs_crash ON runs (crash);
+'''
+
+RUN_FIELDS = ['campaign', 'apk', 'package', 'serial', 'android_version',
+        'run', 'verdict', 'failure', 'started', 'duration', 'uis', 'ssis',
+        'crash', 'recoveries', 'ssi_rate', 'ssi_guided']
+
+# A line of AndroidRuntime in the brief or threadtime format of logcat
+RUNTIME_PATTERN = re.compile(r'.*AndroidRuntime\s*(\(\s*\d+\))?:\s?(.*)$')
+EXCEPTION_PATTERN = re.compile(r'^(Caused by: )?([\w.$]+(Exception|Error))')
+
+class ResultsDB:
+    '''
+    SQLite database of the results of all runs
+
+    Runs added are kept in memory and written in one transaction once
+    conf.RESULTS_BATCH_SIZE of them are waiting, or on flush() and close().
+    A callback given with a run (e.g., checking it off in the Checkpoint)
+    is called once the run is written, so that a crash cannot leave a run
+    checked off but never written.
+    '''
+
+    def __init__(self, path: str = None):
+        self._path = path or conf.RESULTS_DB_PATH
+        os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+        self._lock = Lock()
+        self._pending = []
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+        # Databases written before a column was added to runs
+        columns = [row[1] for row in
+                self._conn.execute('PRAGMA table_info(runs)')]
+        for field in RUN_FIELDS:
+            if field not in columns:
+                self._conn.execute('ALTER TABLE runs ADD COLUMN %s %s' 
+                        %(field, _column_type(field)))
+
+    def add_run(self, record: dict, app_version: str = None, 
+                written: callable = None) -> None:
+        '''
+        Add a run (see RUN_FIELDS) of an APK on a device, calling written()
+        once it is in the database
+        '''
+        with self._lock:
+            self._pending.append((record, app_version, written))
+            if len(self._pending) >= conf.RESULTS_BATCH_SIZE:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def query(self, sql: str, params: tuple = ()) -> list:
+        '''
+        Run a query, after writing the runs waiting
+        '''
+        with self._lock:
+            self._flush()
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        callbacks = [written for r, version, written in pending if written]
+        pending = [(r, version) for r, version, written in pending]
+        with self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO devices VALUES '
+                    '(?, ?)', set((r['serial'], r.get('android_version'))
+                    for r, version in pending))
+            self._conn.executemany('INSERT OR REPLACE INTO apks VALUES '
+                    '(?, ?, ?)', set((r['apk'], r.get('package'), version)
+                    for r, version in pending))
+            self._conn.executemany('INSERT OR REPLACE INTO runs (%s) VALUES '
+                    '(%s)' %(', '.join(RUN_FIELDS),
+                    ', '.join('?' * len(RUN_FIELDS))),
+                    [[r.get(field) for field in RUN_FIELDS]
+                    for r, version in pending])
+        for written in callbacks:
+            written()
+
+
+def _column_type(field: str) -> str:
+    '''
+    Get the type of a column of runs in SCHEMA
+    '''
+    match = re.search(r'^\s+%s (\w+)' %(field), 
+            SCHEMA[SCHEMA.index('TABLE IF NOT EXISTS runs'):], re.M)
+    return match.group(1) if match else ''
+
+
+def crash_signature(logcat: str, pkg_name: str = None) -> str:
+    '''
+    Get the signature of the first crash in a logcat dump: the exception,
+    and the first frame of the app (or the first frame) without the line
+
+    e.g., java.lang.NullPointerException at com.example.MainActivity.onClick
+    '''
+    exception, frame, in_crash = None, None, False
+    for line in logcat.splitlines():
+        match = RUNTIME_PATTERN.match(line)
+        if match is None:
+            continue
+        message = match.group(2).strip()
+        if message.startswith('FATAL EXCEPTION'):
+            if in_crash:
+                break
+            in_crash = True
+            continue
+        if not in_crash:
+            continue
+        exc_match = EXCEPTION_PATTERN.match(message)
+        if exc_match and exception is None:
+            exception = exc_match.group(2)
+        elif message.startswith('at '):
+            at = message[3:].split('(')[0]
+            if frame is None or (pkg_name and at.startswith(pkg_name)
+                    and not frame.startswith(pkg_name)):
+                frame = at
+    if exception is None:
+        return None
+    return exception + (' at ' + frame if frame else '')
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import re
+from time import time
+from functools import lru_cache
+from subprocess import Popen, PIPE, DEVNULL
+from threading import Thread, Lock
+
+# Local packages
+import src.config as conf
+import src.adb_utils as adb
+
+
+encoding="utf-8"
+
+# System service interaction (binder transaction) log pattern (API 27)
+PATTERN = re.compile(r"""^.*(?P<transaction>B[A-Z]_TRANSACTION):\s+\[Interface\stoken\]\s+(?P<class>.+)\s+\[code\]\s+(?P<code>[a-zz\d]+)\s*$""",re.VERBOSE)
+PREFILTER = '_TRANSACTION:'
+
+def parse_ssi(line: str) -> tuple:
+    '''
+    Get (transaction, interface, code) from a logcat line or None
+    '''
+    # The pattern matches from the last transaction on, so the time and IDs
+    # before it are dropped and the rest, repeated a lot, is parsed once
+    i = line.rfind(PREFILTER)
+    if i < 2:
+        return None
+    return _parse_tail(line[i - 2:].strip())
+
+
+@lru_cache(maxsize=4096)
+def _parse_tail(tail: str) -> tuple:
+    match = PATTERN.match(tail)
+    if match == None:
+        return None
+    return (match.group('transaction'), match.group('class'),
+            match.group('code'))
+
+
+class SsiMonitor:
+    '''
+    Stream logcat of a device and attribute system service interactions
+    (SSIs) of the app seen for the first time to the action performed
+    before them
+
+    Lines of other processes are dropped by their PID (the third field of
+    the threadtime format), so update_pids() once the app is relaunched.
+    '''
+
+    def __init__(self, d_serial: str, pkg_name: str):
+        self._d_serial = d_serial
+        self._pkg_name = pkg_name
+        self._pids = set()      # PIDs of the app
+        self._lock = Lock()
+        self._action = None     # Node of the last action
+        self._seen = set()      # SSIs seen in the run
+        self._gains = {}        # {node: # of new SSIs after its action}
+        self._started = time()
+        self._proc = None
+        self._thread = None
+
+    def start(self) -> None:
+        '''
+        Start streaming logcat
+        '''
+        self.update_pids()
+        command = [conf.ADB, '-s', self._d_serial, 'logcat',
+                    '-v', 'threadtime']
+        self._proc = Popen(command, stdout=PIPE, stderr=DEVNULL)
+        self._thread = Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''
+        Stop streaming logcat
+        '''
+        if self._proc and self._proc.poll() is None:
+            self._proc.terminate()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def update_pids(self) -> None:
+        '''
+        Get PIDs of the app again (e.g., it was relaunched)
+        '''
+        pids = adb.get_pids(self._d_serial, self._pkg_name)
+        with self._lock:
+            self._pids = pids
+
+    def mark_action(self, node: str) -> None:
+        '''
+        Attribute SSIs seen from now on to the given node
+        '''
+        with self._lock:
+            self._action = node
+
+    def get_gains(self) -> dict:
+        with self._lock:
+            return dict(self._gains)
+
+    def get_seen(self) -> set:
+        with self._lock:
+            return set(self._seen)
+
+    def get_rate(self) -> float:
+        '''
+        New SSIs per minute since the monitor started
+        '''
+        minutes = (time() - self._started) / 60
+        return len(self._seen) / minutes if minutes > 0 else 0
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _read(self) -> None:
+        for line in self._proc.stdout:
+            line = line.decode(encoding, 'ignore')
+            ssi = parse_ssi(line)
+            if ssi is None:
+                continue
+            fields = line.split(None, 3)
+            with self._lock:
+                if len(fields) < 3 or fields[2] not in self._pids or \
+                        ssi in self._seen:
+                    continue
+                self._seen.add(ssi)
+                if self._action is not None:
+                    self._gains[self._action] = \
+                            self._gains.get(self._action, 0) + 1
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3.7
+'''
+@author: Chang Min Park (cpark22@buffalo.edu)
+'''
+
+import os
+import json
+from time import time
+from threading import Thread, Lock, Event
+
+# Local packages
+import src.config as conf
+
+
+# Kinds of events
+ELEMENT = 'element'     # A node visited
+ACTION = 'action'       # An action performed on a UI, and how long it took
+STATE = 'state'         # The state on foreground changed
+PHASE = 'phase'         # The run moved on to testing or cleaning
+VERDICT = 'verdict'     # Result of the run (see DeviceDriver._write_log)
+
+class TraceWriter:
+    '''
+    Trace of a run written as JSON Lines, buffered in memory
+
+    Events are written in batches of conf.TRACE_BATCH_SIZE, and every
+    conf.TRACE_FLUSH_INTERVAL seconds by a timer thread of the process
+    adding them (runs are forked processes), and phases and verdicts are
+    written right away. Each batch is appended with a single write, so a
+    run killed (e.g., terminated on timeout) loses the events of at most
+    the last interval and leaves at most one partial line, which
+    read_trace() skips.
+
+    Nodes of element events are written to the uis_traversed log as well,
+    one per line, as scripts/log_parser.py reads them.
+    '''
+
+    def __init__(self, path: str, traversed_path: str = None):
+        self._path = path
+        self._traversed_path = traversed_path
+        self._lock = Lock()
+        self._events = []
+        self._flushed = time()
+        self._pid = None        # Process the timer runs in
+        self._closed = Event()
+
+    def event(self, kind: str, **fields) -> None:
+        '''
+        Add an event of the given kind
+        '''
+        if self._pid != os.getpid():
+            self._start_timer()
+        fields['time'] = round(time(), 3)
+        fields['kind'] = kind
+        with self._lock:
+            self._events.append(fields)
+            if kind in [PHASE, VERDICT] or \
+                    len(self._events) >= conf.TRACE_BATCH_SIZE or \
+                    time() - self._flushed >= conf.TRACE_FLUSH_INTERVAL:
+                self._flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def close(self) -> None:
+        '''
+        Stop the timer and write the events left
+        '''
+        self._closed.set()
+        self.flush()
+
+    # ----------------- #
+    #   Local Methods   #
+    # ----------------- #
+    def _start_timer(self) -> None:
+        '''
+        Start flushing from a thread of this process; a lock held by the
+        thread of the parent when it forked would never be released, and
+        events inherited from it are written by the parent
+        '''
+        if self._pid is not None:
+            self._events = []
+        self._pid = os.getpid()
+        self._lock = Lock()
+        self._closed = Event()
+        Thread(target=self._run_timer, args=(self._closed,),
+                daemon=True).start()
+
+    def _run_timer(self, closed: Event) -> None:
+        while not closed.wait(conf.TRACE_FLUSH_INTERVAL):
+            self.flush()
+
+    def _flush(self) -> None:
+        self._flushed = time()
+        if not self._events:
+            return
+        events, self._events = self._events, []
+        with open(self._path, 'a', encoding='utf8') as f:
+            f.write(''.join(json.dumps(event) + '\n' for event in events))
+        nodes = [event['node'] for event in events
+                if event['kind'] == ELEMENT]
+        if self._traversed_path and nodes:
+            with open(self._traversed_path, 'a', encoding='utf8') as f:
+                f.write(''.join(node + '\n' for node in nodes))
+
+
+def read_trace(path: str, kinds: list = None) -> list:
+    '''
+    Read events of a trace, skipping a line cut by a crash
+    '''
+    events = []
+    if not os.path.exists(path):
+        return events
+    with open(path, 'r', encoding='utf8') as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if kinds is None or event['kind'] in kinds:
+                events.append(event)
+    return events
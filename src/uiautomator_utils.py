@@ -3,8 +3,12 @@
 @author: Chang Min Park (cpark22@buffalo.edu)
 '''
 
+import re
+import hashlib
 from xml.etree import ElementTree as ET
 
+SIGNATURE_LENGTH = 10       # Hex digits kept from the signature hash
+
 def get_current_tree(xml: str) -> ET.Element:
     '''
     Get current UI tree from xml
@@ -17,7 +21,7 @@ def get_clickable_list(tree: ET.Element) -> list:
     From UI trees, find clickable UIs and return
     '''
     ui_dics = []
-    for node in tree.iter("node"):
+    for node, ancestors, in_scroll in _iter_with_ancestors(tree):
         if node.attrib['clickable'] == "false":
             continue
 
@@ -42,5 +46,119 @@ def get_clickable_list(tree: ET.Element) -> list:
             "className": node.attrib['class'],
             "text": node.attrib['text'],
             "contentDescription": node.attrib['content-desc'],
-            "bounds": node.attrib['bounds']})    
+            "bounds": node.attrib['bounds'],
+            "checkable": node.attrib.get('checkable') == "true",
+            "longClickable": node.attrib.get('long-clickable') == "true",
+            "scrollable": node.attrib.get('scrollable') == "true",
+            "inScrollable": in_scroll,
+            "ancestorPath": _hash(ancestors)})    
     return ui_dics
+
+def normalize_text(text: str) -> str:
+    '''
+    Normalize text so that counters, times and spacing do not change it
+    '''
+    text = re.sub(r'\d+', '#', text.strip().lower())
+    return re.sub(r'\s+', ' ', text)
+
+def get_signature(ui: dict) -> str:
+    '''
+    Get a signature of the UI that does not depend on its list position
+    '''
+    return _signature_prefix(ui) + _hash([_signature_key(ui)])
+
+def assign_signatures(ui_dics: list, stats: dict = None) -> list:
+    '''
+    Pair each UI with its signature, keeping one UI per signature
+
+    UIs with the same attributes (e.g., identical rows of a list) are the
+    same widget to test, so only the top-left one of them is kept; none of
+    them gets an identity from its position in the dump. Different UIs
+    whose short signatures collide get signatures of their full hashes.
+
+    :param stats: counts of 'duplicates' and 'collisions' are added to it
+    '''
+    by_signature = {}   # {signature: {key: UI}}
+    n_uis = 0
+    for ui in sorted(ui_dics, key=lambda ui: _top_left(ui['bounds'])):
+        key = _signature_key(ui)
+        by_signature.setdefault(_signature_prefix(ui) + _hash([key]), {}) \
+                .setdefault(key, ui)
+        n_uis += 1
+
+    signed, n_collisions = [], 0
+    for signature, uis in by_signature.items():
+        if len(uis) == 1:
+            signed.append((signature, next(iter(uis.values()))))
+            continue
+        n_collisions += len(uis) - 1
+        for key, ui in uis.items():
+            signed.append((_signature_prefix(ui) + _hash([key], None), ui))
+    if stats is not None:
+        stats['duplicates'] = stats.get('duplicates', 0) + n_uis - len(signed)
+        stats['collisions'] = stats.get('collisions', 0) + n_collisions
+    return signed
+
+def parse_bounds(bounds: str) -> tuple:
+    '''
+    Get (left, top, right, bottom) from bounds like "[0,10][20,30]"
+    '''
+    nums = [int(num) for num in re.findall(r'-?\d+', bounds)]
+    return tuple(nums) if len(nums) == 4 else (0, 0, 0, 0)
+
+def get_state_hash(ui_dics: list, level: str) -> str:
+    '''
+    Hash the actionable part of a screen at the given abstraction level
+
+     - structure: which kinds of UIs are where (class, ID, ancestors)
+     - content: the same plus normalized text and content description
+
+    UIs inside a scrollable container are left out, as which of them are
+    dumped depends on how far it is scrolled; the container itself counts.
+    '''
+    stable = [ui for ui in ui_dics if not ui.get('inScrollable')]
+    if level == "content":
+        keys = set(get_signature(ui) for ui in stable)
+    else:
+        keys = set('%s|%s|%s' %(ui['className'], ui['resourceId'],
+                ui.get('ancestorPath', '')) for ui in stable)
+    return _hash(sorted(keys))
+
+# ----------------- #
+#   Local Methods   #
+# ----------------- #
+def _iter_with_ancestors(tree: ET.Element, ancestors: tuple=(),
+        in_scroll: bool=False):
+    '''
+    Iterate UI nodes with the class and resource ID of their ancestors, and
+    whether any of them is scrollable
+    '''
+    for child in tree:
+        if child.tag == "node":
+            yield child, ancestors, in_scroll
+            path = ancestors + ((child.attrib.get('class', '') + '#' \
+                    + child.attrib.get('resource-id', '')),)
+            scroll = in_scroll or child.attrib.get('scrollable') == "true"
+        else:
+            path, scroll = ancestors, in_scroll
+        yield from _iter_with_ancestors(child, path, scroll)
+
+def _hash(items, length: int = SIGNATURE_LENGTH) -> str:
+    return hashlib.md5('/'.join(items).encode('utf-8', 'ignore')) \
+            .hexdigest()[:length]
+
+def _signature_key(ui: dict) -> str:
+    return '|'.join([ui['resourceId'], ui['className'],
+            normalize_text(ui['text']),
+            normalize_text(ui['contentDescription']),
+            ui.get('ancestorPath', '')])
+
+def _signature_prefix(ui: dict) -> str:
+    return ui['className'].split('.')[-1].lower() + '_'
+
+def _top_left(bounds: str) -> tuple:
+    '''
+    Get (top, left) from bounds in the form of "[left,top][right,bottom]"
+    '''
+    left, top, right, bottom = parse_bounds(bounds)
+    return (top, left)